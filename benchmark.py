@@ -0,0 +1,722 @@
+#!/usr/bin/env python3
+"""
+Benchmarks du service de transcription Whisper
+Appelle directement les fonctions de server.py (pas besoin de lancer l'API)
+
+Utilisation:
+    python3 benchmark.py ttfs --audio-url https://example.com/podcast.mp3 --model base
+    python3 benchmark.py monitor --lines 200000
+    python3 benchmark.py memory --hours 1 5 20
+    python3 benchmark.py vad --ratios 0.2 0.5 0.8 --minutes 10
+    python3 benchmark.py load --scenarios burst mixed --concurrency 1 2 4 auto --rtf 0.02
+    python3 benchmark.py quality --audio data/extrait.mp3 --reference data/extrait.txt --model base --repeat 3
+"""
+
+import argparse
+import functools
+import http.server
+import json
+import math
+import os
+import random
+import re
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+
+import server
+
+
+def print_table(headers, rows):
+    """Affiche un tableau aligné"""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(cell).ljust(w) for cell, w in zip(row, widths)))
+
+
+def bench_time_to_first_segment(args):
+    """Compare le temps avant le premier segment: téléchargement complet vs pipeline en flux"""
+    print(f"⏱️  Time-to-first-segment sur {args.audio_url[:80]}...")
+    rows = []
+    for label, streaming in [("téléchargement puis whisper-cli", False), ("flux HTTP -> ffmpeg -> moteur", True)]:
+        first_segments = []
+        totals = []
+        for run in range(args.runs):
+            start = time.time()
+            result = server.run_whisper_transcription(
+                args.audio_url,
+                args.language,
+                args.model,
+                "txt",
+                0.005,
+                0.40,
+                None,
+                server.logger,
+                streaming=streaming,
+            )
+            totals.append(time.time() - start)
+            if result.get("time_to_first_segment") is not None:
+                first_segments.append(result["time_to_first_segment"])
+            print(f"   {label} #{run + 1}: premier segment {result.get('time_to_first_segment')}s, total {totals[-1]:.1f}s")
+        rows.append([
+            label,
+            f"{statistics.median(first_segments):.1f}s" if first_segments else "n/a",
+            f"{statistics.median(totals):.1f}s",
+        ])
+    print()
+    print_table(["Chemin", "Premier segment (médiane)", "Total (médiane)"], rows)
+
+
+# Sortie whisper-cli représentative: segments sur stdout, journaux et progression sur stderr
+SAMPLE_STDOUT_LINES = [
+    "[00:12:03.120 --> 00:12:07.940]   Et c'est là que tout a commencé pour nous.",
+    "[01:02:33.000 --> 01:02:35.480]   Oui.",
+]
+SAMPLE_STDERR_LINES = [
+    "whisper_print_progress_callback: progress =  42%",
+    "whisper_model_load: loading model from 'models/ggml-base.bin'",
+    "whisper_full_with_state: processing 2048 samples",
+    "ggml_metal_init: warning: skipping kernel",
+    "whisper_init_state: compute buffer (encode) =   85.66 MB",
+]
+
+
+def legacy_line_cost(stream, line):
+    """Analyse ligne par ligne de l'ancienne boucle de monitoring (pour comparaison)"""
+    line_content = line.strip()
+    if stream == "stdout":
+        if any(keyword in line_content.lower() for keyword in ["error", "warning", "progress"]):
+            pass
+        if any(keyword in line_content.lower() for keyword in ["progress", "segment", "frame"]):
+            pass
+        return re.search(r"(\d+)%", line_content)
+    if any(keyword in line_content.lower() for keyword in ["error", "warning", "failed"]):
+        pass
+    if "error" in line_content.lower():
+        return None
+    if any(keyword in line_content.lower() for keyword in ["loading", "processing"]):
+        return "loading" in line_content.lower()
+    return None
+
+
+def legacy_monitor_drift(cmd, interval):
+    """Ancienne boucle: readline bloquant sur stdout puis stderr, minuterie vérifiée entre deux lectures"""
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+    start = time.time()
+    next_fire = start + interval
+    fires = []
+    while True:
+        stdout_line = process.stdout.readline()
+        stderr_line = process.stderr.readline()
+        now = time.time()
+        if now >= next_fire:
+            fires.append(now - next_fire)
+            next_fire = now + interval
+        if not stdout_line and not stderr_line and process.poll() is not None:
+            break
+    return fires, time.time() - start
+
+
+def selector_monitor_drift(cmd, interval):
+    """Nouvelle boucle: monitor_process lit les deux flux et déclenche la minuterie à l'heure"""
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    start = time.time()
+    fires = []
+    expected = [start + interval]
+
+    def on_timer(now):
+        fires.append(now - expected[0])
+        expected[0] = now + interval
+
+    server.monitor_process(process, lambda stream, line: None, [(interval, on_timer)])
+    process.wait()
+    return fires, time.time() - start
+
+
+def bench_monitor(args):
+    """Coût CPU par ligne de l'analyse de sortie et régularité des minuteries quand stdout se tait"""
+    stdout_sample = [("stdout", line) for line in SAMPLE_STDOUT_LINES]
+    stderr_sample = [("stderr", line) for line in SAMPLE_STDERR_LINES]
+    sample = stdout_sample * 4 + stderr_sample  # whisper-cli écrit surtout des segments
+    lines = [sample[i % len(sample)] for i in range(args.lines)]
+
+    rows = []
+    for label, parse in [("any()/lower()/re.search", legacy_line_cost), ("classify_whisper_line", server.classify_whisper_line)]:
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            for stream, line in lines:
+                parse(stream, line)
+            timings.append(time.perf_counter() - start)
+        per_line = statistics.median(timings) / len(lines) * 1e6
+        rows.append([label, f"{per_line:.2f}µs", f"{len(lines) / statistics.median(timings):,.0f}"])
+    print(f"🔍 Analyse de {len(lines)} lignes ({args.runs} passes)")
+    print_table(["Analyse", "Coût par ligne", "Lignes/s"], rows)
+
+    # Processus qui n'écrit que sur stderr: l'ancienne boucle reste bloquée sur stdout.readline()
+    child = [
+        sys.executable, "-c",
+        "import sys, time\n"
+        f"for i in range({int(args.quiet_seconds * 20)}):\n"
+        "    sys.stderr.write(f'whisper_full: processing {i}\\n'); sys.stderr.flush(); time.sleep(0.05)\n",
+    ]
+    rows = []
+    for label, run in [("readline bloquant", legacy_monitor_drift), ("selectors", selector_monitor_drift)]:
+        fires, total = run(child, args.interval)
+        expected = int(total / args.interval)
+        drift = f"{max(fires) * 1000:.0f}ms" if fires else "n/a"
+        rows.append([label, f"{len(fires)}/{expected}", drift])
+    print()
+    print(f"⏲️  Minuterie de {args.interval}s, stdout silencieux pendant {args.quiet_seconds}s")
+    print_table(["Boucle", "Déclenchements", "Retard max"], rows)
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def run_memory_scenario(audio_url, legacy=False):
+    """Exécuté dans un processus dédié: transcrit avec le faux whisper-cli et affiche le pic de RSS"""
+    if legacy:
+        # Ancien fonctionnement: toutes les lignes en listes, puis jointes et reformatées en mémoire
+        audio_path = os.path.join(tempfile.mkdtemp(), "audio.wav")
+        with open(audio_path, "wb") as f:
+            f.write(server.requests.get(audio_url).content)
+        cmd = server.build_whisper_cmd(server.WHISPER_PATH, server.MODEL_PATH, audio_path, "fr", "srt")
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+        stdout_lines = [line.strip() for line in process.stdout]
+        stderr_lines = [line.strip() for line in process.stderr]
+        process.wait()
+        result = subprocess.CompletedProcess(cmd, process.returncode, "\n".join(stdout_lines), "\n".join(stderr_lines))
+        segments = [server.parse_segment_line(line) for line in result.stdout.splitlines()]
+        transcription = server.format_segments([seg for seg in segments if seg], "srt")
+        with open(os.path.join(os.path.dirname(audio_path), "out.srt"), "w", encoding="utf-8") as f:
+            f.write(transcription)
+        size = len(transcription.encode("utf-8"))
+    else:
+        task_id = str(uuid.uuid4())
+        server.store_create_task({
+            "task_id": task_id, "status": "processing", "progress": 0,
+            "created_at": server.datetime.now().isoformat(), "params": {},
+        })
+        result = server.run_whisper_transcription(
+            audio_url, "fr", "base", "srt", 0.005, 0.40, None, server.logger, task_id=task_id,
+        )
+        size = os.path.getsize(result["transcription_path"])
+        os.unlink(result["transcription_path"])
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"peak_rss_mb": round(peak_mb, 1), "transcript_bytes": size}))
+
+
+def bench_memory(args):
+    """Pic de RSS du processus serveur selon la longueur de la transcription"""
+    from fake_whisper_cli import install_fake_whisper
+
+    work_dir = tempfile.mkdtemp(prefix="whisper_bench_memory_")
+    whisper_path = install_fake_whisper(os.path.join(work_dir, "whisper.cpp"))
+    with wave.open(os.path.join(work_dir, "audio.wav"), "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(16000)
+        audio.writeframes(b"\x00\x00" * 16000)
+    handler = functools.partial(QuietHandler, directory=work_dir)
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    audio_url = f"http://127.0.0.1:{httpd.server_address[1]}/audio.wav"
+
+    print(f"🧠 Pic de RSS pour {', '.join(str(h) for h in args.hours)}h d'audio "
+          f"(segments de {args.segment}s, {args.words} mots)")
+    rows = []
+    for hours in args.hours:
+        row = [f"{hours}h", f"{int(hours * 3600 / args.segment)}"]
+        for legacy in [True, False]:
+            env = dict(
+                os.environ,
+                WHISPER_PATH=whisper_path,
+                WHISPER_STATE_DIR=os.path.join(work_dir, f"state_{hours}_{legacy}"),
+                WHISPER_ENGINE="cli",
+                CACHE_MAX_SIZE_MB="0",
+                FAKE_WHISPER_DURATION=str(hours * 3600),
+                FAKE_WHISPER_SEGMENT=str(args.segment),
+                FAKE_WHISPER_WORDS=str(args.words),
+                FAKE_WHISPER_DELAY="0",
+            )
+            code = f"import benchmark; benchmark.run_memory_scenario({audio_url!r}, legacy={legacy})"
+            output = subprocess.run(
+                [sys.executable, "-c", code], env=env, capture_output=True, text=True,
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+            )
+            lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+            if not lines:
+                raise Exception(f"Scénario {hours}h en échec: {output.stderr[-2000:]}")
+            measure = json.loads(lines[-1])
+            if legacy:
+                row.append(f"{measure['transcript_bytes'] / 1024 / 1024:.1f}MB")
+            row.append(f"{measure['peak_rss_mb']:.0f}MB")
+        rows.append(row)
+    httpd.shutdown()
+    print_table(["Audio", "Segments", "Transcription", "Listes en mémoire", "Segments sur disque"], rows)
+
+
+def synthesize_program(path, minutes, speech_ratio, seed=0):
+    """WAV 16kHz mono: parole synthétique, fond musical et silences, dans la proportion demandée.
+
+    La parole est un bruit modulé en syllabes (150-300ms) séparées de courtes pauses, la musique un
+    accord tenu. Renvoie les intervalles de parole réels (début, fin) en secondes.
+    """
+    rng = random.Random(seed)
+    rate, step = 16000, 160  # Blocs de 10ms
+    levels = [0.0, 0.02, 0.05, 0.1, 0.2, 0.3]
+    noise = [
+        [b"".join(int(rng.gauss(0, 1) * level * 8000).to_bytes(2, "little", signed=True) for _ in range(step))
+         for _ in range(20)]
+        for level in levels
+    ]
+    chord = b"".join(
+        int(3000 * sum(math.sin(2 * math.pi * f * i / rate) for f in (220, 277, 330))).to_bytes(2, "little", signed=True)
+        for i in range(rate)
+    )
+    hiss = noise[1]
+
+    speech = []
+    total_blocks = int(minutes * 60 * 100)
+    position = 0
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        while position < total_blocks:
+            length = min(rng.randint(500, 2000), total_blocks - position)  # Passages de 5 à 20s
+            frames = []
+            if rng.random() < speech_ratio:
+                speech.append((position / 100, (position + length) / 100))
+                while len(frames) < length:
+                    syllable = rng.randint(15, 30)
+                    for i in range(syllable):
+                        level = 1 + int(4 * math.sin(math.pi * i / syllable))
+                        frames.append(rng.choice(noise[level]))
+                    frames.extend(rng.choice(hiss) for _ in range(rng.randint(5, 15)))
+            elif rng.random() < 0.5:
+                frames = [chord[(i % 100) * step * 2:(i % 100 + 1) * step * 2] for i in range(length)]
+            else:
+                frames = [rng.choice(hiss) for _ in range(length)]
+            wav_file.writeframes(b"".join(frames[:length]))
+            position += length
+    return speech
+
+
+def overlap_duration(intervals, others):
+    """Durée commune de deux listes d'intervalles triés"""
+    total = 0.0
+    for start, end in intervals:
+        for other_start, other_end in others:
+            total += max(0.0, min(end, other_end) - max(start, other_start))
+    return total
+
+
+def time_whisper(audio_path, model):
+    """Durée d'une transcription whisper-cli du fichier"""
+    cmd = server.build_whisper_cmd(
+        server.WHISPER_PATH, f"{server.WHISPER_PATH}/models/ggml-{model}.bin", audio_path, "fr", "txt"
+    )
+    start = time.time()
+    subprocess.run(cmd, capture_output=True, cwd=server.WHISPER_PATH, check=True)
+    return time.time() - start
+
+
+def bench_vad(args):
+    """Part d'audio envoyée au moteur avec et sans VAD, sur des programmes synthétiques"""
+    print(f"🎙️  VAD sur {args.minutes} min d'audio synthétique (parole, musique, silence), "
+          f"énergie calculée avec {'numpy' if server.numpy is not None else 'audioop'}")
+    work_dir = tempfile.mkdtemp(prefix="whisper_bench_vad_")
+    rows = []
+    try:
+        for ratio in args.ratios:
+            source = os.path.join(work_dir, f"program_{ratio}.wav")
+            trimmed = os.path.join(work_dir, f"speech_{ratio}.wav")
+            speech = synthesize_program(source, args.minutes, ratio)
+            duration = args.minutes * 60
+
+            start = time.time()
+            intervals = server.detect_speech(source)
+            vad_time = time.time() - start
+            with wave.open(source, "rb") as decoded:
+                server.write_pcm_intervals(
+                    lambda size: decoded.readframes(size // 2), trimmed, server.to_pcm_intervals(intervals)
+                )
+            kept = sum(end - start for start, end in intervals)
+            true_speech = sum(end - start for start, end in speech)
+            found = overlap_duration(intervals, speech)
+            row = [
+                f"{ratio:.0%}",
+                f"{true_speech / duration:.0%}",
+                f"{kept / duration:.0%}",
+                f"{found / true_speech:.1%}" if true_speech else "-",
+                f"{(kept - found) / (duration - true_speech):.1%}" if duration > true_speech else "-",
+                f"{vad_time:.2f}s",
+                f"-{1 - kept / duration:.0%}",
+            ]
+            if args.model:
+                full, vad = time_whisper(source, args.model), time_whisper(trimmed, args.model)
+                row.append(f"{full:.1f}s -> {vad:.1f}s")
+            rows.append(row)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    headers = ["Parole visée", "Parole réelle", "Audio gardé", "Parole gardée", "Non-parole gardée",
+               "Durée VAD", "Calcul moteur"]
+    if args.model:
+        headers.append(f"whisper-cli {args.model}")
+    print_table(headers, rows)
+
+
+LOAD_SCENARIOS = ["burst", "sustained", "mixed"]
+
+
+def write_stub_audio(path, seconds):
+    """WAV 8 bits à 1kHz: durée réaliste pour le faux whisper-cli, quelques Ko par minute à servir"""
+    with wave.open(path, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(1)
+        audio.setframerate(1000)
+        audio.writeframes(b"\x80" * 1000 * int(seconds))
+
+
+def run_load_server(port, output_dir):
+    """Exécuté dans un processus dédié: l'API complète (file, workers, prefetch) sur 127.0.0.1:port"""
+    import logging
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server.logger.setLevel(logging.WARNING)
+    server.OUTPUT_DIR = output_dir
+    server.start_background_services()
+    server.app.run(host="127.0.0.1", port=port, threaded=True, use_reloader=False)
+
+
+def sample_rss(process):
+    """RSS du serveur seul et du serveur avec ses processus whisper (octets)"""
+    try:
+        own = process.memory_info().rss
+    except server.psutil.NoSuchProcess:
+        return 0, 0
+    total = own
+    for child in process.children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except server.psutil.NoSuchProcess:
+            pass
+    return own, total
+
+
+def build_load_schedule(scenario, args, rng):
+    """Arrivées (secondes depuis le début, "short" ou "long") d'un scénario de charge"""
+    if scenario == "burst":
+        return [(0.0, "short") for _ in range(args.jobs)]
+    schedule = []
+    arrival = 0.0
+    for _ in range(args.jobs):
+        kind = "long" if scenario == "mixed" and rng.random() < args.long_ratio else "short"
+        schedule.append((arrival, kind))
+        arrival += rng.expovariate(args.rate / 60)  # Arrivées poissonniennes, rate tâches/minute
+    return schedule
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(fraction * len(ordered))) - 1)]
+
+
+def run_load_scenario(scenario, concurrency, args, audio_urls, env, work_dir):
+    """Lance le serveur avec cette concurrence, soumet le scénario et mesure latences, débit et RSS"""
+    port = 18000 + random.randint(0, 999)
+    state_dir = os.path.join(work_dir, f"state_{scenario}_{concurrency}")
+    code = f"import benchmark; benchmark.run_load_server({port}, {os.path.join(state_dir, 'output')!r})"
+    process = subprocess.Popen(
+        [sys.executable, "-c", code],
+        env=dict(env, WHISPER_STATE_DIR=state_dir, MAX_CONCURRENT_TRANSCRIPTIONS=str(concurrency)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    session = server.requests.Session()
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                session.get(f"{base_url}/health", timeout=1)
+                break
+            except server.requests.RequestException:
+                if time.time() > deadline or process.poll() is not None:
+                    raise Exception(f"Serveur de benchmark non démarré (port {port})")
+                time.sleep(0.2)
+
+        watched = server.psutil.Process(process.pid)
+        peak = {"own": 0, "total": 0}
+        sampling = threading.Event()
+
+        def sampler():
+            while not sampling.wait(0.2):
+                own, total = sample_rss(watched)
+                peak["own"], peak["total"] = max(peak["own"], own), max(peak["total"], total)
+
+        threading.Thread(target=sampler, daemon=True).start()
+
+        schedule = build_load_schedule(scenario, args, random.Random(args.seed))
+        submitted = {}  # task_id -> heure de soumission
+        latencies = []
+        errors = 0
+        start = time.time()
+        pending = list(schedule)
+        counters = {"short": 0, "long": 0}
+        while pending or submitted:
+            now = time.time()
+            while pending and pending[0][0] <= now - start:
+                _, kind = pending.pop(0)
+                counters[kind] += 1
+                # URL unique par tâche: ni cache ni déduplication entre les soumissions
+                audio_url = f"{audio_urls[kind]}?job={kind}-{counters[kind]}"
+                response = session.post(f"{base_url}/transcribe-async", json={
+                    "audio_url": audio_url, "language": "fr", "model": "base", "output_format": "srt",
+                }, timeout=30)
+                submitted[response.json()["task_id"]] = time.time()
+            for task_id, submitted_at in list(submitted.items()):
+                status = session.get(f"{base_url}/transcription-status/{task_id}", timeout=30).json()
+                if status["status"] in server.FINAL_STATUSES:
+                    latencies.append(time.time() - submitted_at)
+                    errors += status["status"] == "error"
+                    del submitted[task_id]
+            if time.time() - start > args.timeout:
+                raise Exception(f"Scénario {scenario} non terminé après {args.timeout}s")
+            time.sleep(0.1)
+        elapsed = time.time() - start
+        sampling.set()
+    finally:
+        process.terminate()
+        process.wait()
+
+    return [
+        scenario,
+        concurrency,
+        len(latencies),
+        errors,
+        f"{statistics.median(latencies):.1f}s",
+        f"{percentile(latencies, 0.95):.1f}s",
+        f"{max(latencies):.1f}s",
+        f"{len(latencies) * 3600 / elapsed:.0f}",
+        f"{peak['own'] / 1024 / 1024:.0f}MB",
+        f"{peak['total'] / 1024 / 1024:.0f}MB",
+    ]
+
+
+def bench_load(args):
+    """Scénarios de charge contre l'API complète, moteur remplacé par le faux whisper-cli"""
+    from fake_whisper_cli import install_fake_whisper
+
+    work_dir = tempfile.mkdtemp(prefix="whisper_bench_load_")
+    whisper_path = install_fake_whisper(os.path.join(work_dir, "whisper.cpp"))
+    www = os.path.join(work_dir, "www")
+    os.makedirs(www)
+    write_stub_audio(os.path.join(www, "short.wav"), args.short)
+    write_stub_audio(os.path.join(www, "long.wav"), args.long)
+    handler = functools.partial(QuietHandler, directory=www)
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    audio_base = f"http://127.0.0.1:{httpd.server_address[1]}"
+    audio_urls = {"short": f"{audio_base}/short.wav", "long": f"{audio_base}/long.wav"}
+    env = dict(
+        os.environ,
+        WHISPER_PATH=whisper_path,
+        WHISPER_ENGINE="cli",
+        CACHE_MAX_SIZE_MB="0",
+        AUDIO_PREPROCESSING="true" if args.preprocess else "false",
+        FAKE_WHISPER_RTF=str(args.rtf),
+        FAKE_WHISPER_LOAD=str(args.load_time),
+        FAKE_WHISPER_MEMORY_MB=str(args.model_memory),
+        FAKE_WHISPER_WORDS="12",
+    )
+
+    print(f"🏋️  Charge: audio de {args.short:.0f}s (long: {args.long:.0f}s, {args.long_ratio:.0%} en mixte), "
+          f"RTF {args.rtf}, chargement {args.load_time}s, {args.model_memory}MB par moteur, "
+          f"{args.jobs} tâches par scénario ({args.rate}/min hors rafale)")
+    rows = []
+    try:
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                rows.append(run_load_scenario(scenario, concurrency, args, audio_urls, env, work_dir))
+                print(f"   {scenario} x{concurrency}: p50 {rows[-1][4]}, p95 {rows[-1][5]}, {rows[-1][7]} tâches/h")
+    finally:
+        httpd.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print()
+    print_table(["Scénario", "Concurrence", "Tâches", "Erreurs", "p50", "p95", "Max", "Tâches/h",
+                 "RSS serveur", "RSS + whisper"], rows)
+
+
+WORD_RE = re.compile(r"\w+(?:'\w+)?")
+
+
+def normalize_words(text):
+    """Mots en minuscules, sans ponctuation ni horodatages: base du calcul du WER"""
+    return WORD_RE.findall(re.sub(r"\[[^\]]*-->[^\]]*\]", " ", text).lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """(substitutions + suppressions + insertions) / mots de la référence, distance d'édition par mots"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / max(len(reference), 1)
+
+
+def wav_format(path):
+    """(canaux, octets par échantillon, fréquence) d'un WAV, None pour un autre format"""
+    try:
+        with wave.open(path, "rb") as audio:
+            return audio.getnchannels(), audio.getsampwidth(), audio.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+def run_quality_profile(audio_path, model_path, language, quality):
+    """Transcrit le fichier avec un profil: (durée, texte)"""
+    decoding = server.resolve_decoding_options(quality)
+    cmd = server.build_whisper_cmd(
+        server.WHISPER_PATH, model_path, audio_path, language, "txt",
+        threads=max(1, server.CPU_THREADS_BUDGET // decoding.get("processors", 1)), decoding=decoding,
+    )
+    start = time.time()
+    completed = subprocess.run(cmd, capture_output=True, text=True, cwd=server.WHISPER_PATH)
+    elapsed = time.time() - start
+    if completed.returncode != 0:
+        raise Exception(f"whisper-cli a échoué avec le profil {quality}: {completed.stderr[-2000:]}")
+    segments = [server.parse_segment_line(line) for line in completed.stdout.splitlines() if line.startswith("[")]
+    return elapsed, " ".join(segment["text"] for segment in segments if segment)
+
+
+def bench_quality(args):
+    """Vitesse et WER de chaque profil de qualité sur un fichier local"""
+    model_path = f"{server.WHISPER_PATH}/models/ggml-{args.model}.bin"
+    work_dir = tempfile.mkdtemp(prefix="whisper_bench_quality_")
+    try:
+        # whisper-cli lit du WAV 16kHz mono: conversion préalable, hors des durées mesurées
+        audio_path = args.audio
+        if wav_format(audio_path) != (1, 2, 16000):
+            audio_path = os.path.join(work_dir, "fixture.wav")
+            subprocess.run(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", args.audio,
+                 "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le", audio_path],
+                check=True, capture_output=True,
+            )
+        with wave.open(audio_path, "rb") as audio:
+            duration = audio.getnframes() / audio.getframerate()
+
+        profiles = args.profiles or list(server.QUALITY_PROFILES)
+        print(f"🎚️  Profils {', '.join(profiles)} sur {duration:.0f}s d'audio, modèle {args.model}, "
+              f"{server.CPU_THREADS_BUDGET} threads")
+        transcripts, times = {}, {}
+        for quality in profiles:
+            runs = [run_quality_profile(audio_path, model_path, args.language, quality) for _ in range(args.repeat)]
+            times[quality] = statistics.median(elapsed for elapsed, _ in runs)
+            transcripts[quality] = runs[-1][1]
+            print(f"   {quality}: {times[quality]:.1f}s")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.reference:
+        with open(args.reference, encoding="utf-8") as f:
+            reference, reference_name = normalize_words(f.read()), os.path.basename(args.reference)
+    else:
+        # Sans transcription de référence: écart au profil le plus lent (le plus exhaustif)
+        reference_name = max(times, key=times.get)
+        reference = normalize_words(transcripts[reference_name])
+    rows = []
+    for quality in profiles:
+        hypothesis = normalize_words(transcripts[quality])
+        options = server.resolve_decoding_options(quality)
+        rows.append([
+            quality,
+            " ".join(f"{name}={value}" for name, value in options.items()),
+            f"{times[quality]:.1f}s",
+            f"{times[quality] / duration:.3f}",
+            f"x{duration / times[quality]:.1f}",
+            f"{word_error_rate(reference, hypothesis):.1%}",
+            len(hypothesis),
+        ])
+    print()
+    print_table(["Profil", "Options", "Durée", "RTF", "Temps réel", f"WER ({reference_name})", "Mots"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks du service Whisper")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ttfs = subparsers.add_parser("ttfs", help="Temps avant le premier segment, avec et sans streaming")
+    ttfs.add_argument("--audio-url", required=True)
+    ttfs.add_argument("--model", default="base")
+    ttfs.add_argument("--language", default="fr")
+    ttfs.add_argument("--runs", type=int, default=1)
+    ttfs.set_defaults(func=bench_time_to_first_segment)
+
+    monitor = subparsers.add_parser("monitor", help="Coût par ligne du monitoring et dérive des minuteries")
+    monitor.add_argument("--lines", type=int, default=200000)
+    monitor.add_argument("--runs", type=int, default=3)
+    monitor.add_argument("--interval", type=float, default=0.5)
+    monitor.add_argument("--quiet-seconds", type=float, default=3.0)
+    monitor.set_defaults(func=bench_monitor)
+
+    memory = subparsers.add_parser("memory", help="Pic de RSS selon la longueur de la transcription")
+    memory.add_argument("--hours", type=float, nargs="+", default=[1, 5, 20])
+    memory.add_argument("--segment", type=float, default=3.0)
+    memory.add_argument("--words", type=int, default=8)
+    memory.set_defaults(func=bench_memory)
+
+    vad = subparsers.add_parser("vad", help="Audio envoyé au moteur avec la détection de parole")
+    vad.add_argument("--ratios", type=float, nargs="+", default=[0.2, 0.5, 0.8])
+    vad.add_argument("--minutes", type=float, default=10)
+    vad.add_argument("--model", help="Chronométrer aussi whisper-cli avec ce modèle (avant/après VAD)")
+    vad.set_defaults(func=bench_vad)
+
+    load = subparsers.add_parser("load", help="Latences, débit et RSS sous charge, par concurrence")
+    load.add_argument("--scenarios", nargs="+", choices=LOAD_SCENARIOS, default=LOAD_SCENARIOS)
+    load.add_argument("--concurrency", type=lambda value: value if value == "auto" else int(value), nargs="+",
+                      default=[1, 2, 4], help="Valeurs de MAX_CONCURRENT_TRANSCRIPTIONS (nombre ou auto)")
+    load.add_argument("--jobs", type=int, default=20, help="Tâches par scénario")
+    load.add_argument("--rate", type=float, default=30, help="Arrivées par minute (sustained, mixed)")
+    load.add_argument("--short", type=float, default=60, help="Durée de l'audio court (secondes)")
+    load.add_argument("--long", type=float, default=900, help="Durée de l'audio long (secondes)")
+    load.add_argument("--long-ratio", type=float, default=0.2, help="Part d'audio long dans le scénario mixed")
+    load.add_argument("--rtf", type=float, default=0.02, help="Facteur temps réel du faux moteur")
+    load.add_argument("--load-time", type=float, default=0.5, help="Chargement du modèle simulé (secondes)")
+    load.add_argument("--model-memory", type=float, default=150, help="Mémoire d'un moteur simulé (MB)")
+    load.add_argument("--preprocess", action="store_true", help="Activer le prétraitement ffmpeg (ffmpeg requis)")
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--timeout", type=float, default=1800, help="Durée maximale d'un scénario (secondes)")
+    load.set_defaults(func=bench_load)
+
+    quality = subparsers.add_parser("quality", help="Vitesse et WER des profils de qualité sur un fichier local")
+    quality.add_argument("--audio", required=True, help="Fichier audio de référence (tout format lu par ffmpeg)")
+    quality.add_argument("--reference", help="Transcription exacte (texte); sinon écart au profil le plus lent")
+    quality.add_argument("--profiles", nargs="+", help="Profils à comparer (défaut: tous)")
+    quality.add_argument("--model", default="base")
+    quality.add_argument("--language", default="fr")
+    quality.add_argument("--repeat", type=int, default=1, help="Exécutions par profil (durée médiane)")
+    quality.set_defaults(func=bench_quality)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
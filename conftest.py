@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Fixtures partagées des tests: le module server est importé une seule fois, puis chaque test reçoit son propre
+état (base SQLite, dossiers de travail, transcriptions) dans tmp_path, ses réglages via monkeypatch et, s'il
+le demande, un faux whisper-cli
+"""
+
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import wave
+
+import pytest
+
+from fake_whisper_cli import install_fake_whisper
+
+# Avant le premier import de server (par les modules de test, pas ici: ses logs iraient dans la capture de
+# pytest, fermée avant la sortie): ses chemins par défaut ne pointent jamais sur /var/log/whisper
+SESSION_DIR = tempfile.mkdtemp(prefix="whisper_tests_")
+os.environ["WHISPER_STATE_DIR"] = os.path.join(SESSION_DIR, "state")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Chemins de server dérivés de STATE_DIR à l'import, remplacés pour chaque test
+STATE_PATHS = {
+    "TASK_DB_PATH": "tasks.db",
+    "CACHE_DIR": "cache",
+    "SEGMENTS_DIR": "segments",
+    "WORK_DIR": "work",
+    "PROFILE_DIR": "profiles",
+    "UPLOAD_DIR": "uploads",
+}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SESSION_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    """Base des tâches, cache, segments et transcriptions propres au test (restaurés ensuite)"""
+    import server
+    state = tmp_path / "state"
+    monkeypatch.setattr(server, "STATE_DIR", str(state))
+    for name, relative_path in STATE_PATHS.items():
+        monkeypatch.setattr(server, name, str(state / relative_path))
+    monkeypatch.setattr(server, "OUTPUT_DIR", str(tmp_path / "output"))
+    return state
+
+
+@pytest.fixture
+def client():
+    import server
+    return server.app.test_client()
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """settings(NOM=valeur, ...): remplace des réglages du module server pour la durée du test"""
+    import server
+    def configure(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(server, name, value)
+    return configure
+
+
+@pytest.fixture
+def fake_whisper(tmp_path, monkeypatch):
+    """Faux whisper.cpp (modèles tiny et base), moteur cli sans prétraitement ni cache.
+
+    Renvoie le fichier où le faux whisper-cli ajoute chaque ligne de commande reçue.
+    """
+    import server
+    whisper_path = install_fake_whisper(str(tmp_path / "whisper.cpp"), models=("tiny", "base"))
+    args_log = str(tmp_path / "whisper_args.log")
+    monkeypatch.setattr(server, "WHISPER_PATH", whisper_path)
+    monkeypatch.setattr(server, "WHISPER_ENGINE", "cli")
+    monkeypatch.setattr(server, "AUDIO_PREPROCESSING", False)
+    monkeypatch.setattr(server, "CACHE_MAX_BYTES", 0)
+    monkeypatch.setenv("FAKE_WHISPER_DELAY", "0")
+    monkeypatch.setenv("FAKE_WHISPER_ARGS_LOG", args_log)
+    return args_log
+
+
+def make_wav(seconds):
+    """WAV 16kHz mono 16 bits de silence"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(16000)
+        audio.writeframes(b"\x00\x00" * 16000 * seconds)
+    return buffer.getvalue()
+
+
+def upload_wav(seconds, filename="episode.wav"):
+    """Fichier téléversé prêt pour create_queued_task: il ne peut pas être retéléchargé"""
+    import server
+    upload = server.UploadSpoolFile(filename)
+    upload.write(make_wav(seconds))
+    upload.close()
+    return upload.as_audio()
+
+
+def wait_for(task_id, timeout=60):
+    """Attend qu'une tâche atteigne un statut final et la renvoie"""
+    import server
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        task = server.get_task(task_id)
+        if task["status"] in server.FINAL_STATUSES:
+            return task
+        time.sleep(0.1)
+    raise AssertionError(f"Tâche {task_id} non terminée après {timeout}s")
+
+
+@contextlib.contextmanager
+def held_queue(timeout=10):
+    """Workers tenus à l'écart de la file: ceux qui ont déjà une place la rendent, les autres attendent"""
+    import server
+    with server.CONCURRENCY_CONDITION:
+        assert server.CONCURRENCY_CONDITION.wait_for(lambda: not server.CONCURRENCY["active"], timeout), \
+            "Worker encore occupé par une tâche"
+        yield
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Faux whisper-cli pour les tests (pas de modèle ni de whisper.cpp nécessaires)
+
+Lit un fichier WAV et écrit un segment toutes les FAKE_WHISPER_SEGMENT secondes d'audio sur stdout,
+au format de whisper-cli, en respectant --offset-t. Le texte d'un segment ne dépend que de sa position:
+une transcription reprise doit donc être identique à une transcription d'un seul tenant.
+
+Variables d'environnement:
+    FAKE_WHISPER_SEGMENT  durée d'un segment en secondes (défaut: 5)
+    FAKE_WHISPER_DELAY    pause entre deux segments en secondes (défaut: 0.05)
+    FAKE_WHISPER_ARGS_LOG fichier où ajouter la ligne de commande reçue (pour vérifier les options)
+    FAKE_WHISPER_DURATION durée d'audio simulée en secondes, au lieu de celle du fichier WAV
+    FAKE_WHISPER_WORDS    mots ajoutés à chaque segment, pour une densité de texte réaliste (défaut: 0)
+    FAKE_WHISPER_RTF      facteur temps réel simulé (secondes de calcul par seconde d'audio), remplace
+                          FAKE_WHISPER_DELAY: un segment de 5s arrive après 5 * RTF secondes
+    FAKE_WHISPER_LOAD     durée du chargement du modèle simulé en secondes (défaut: 0)
+    FAKE_WHISPER_MEMORY_MB mémoire occupée pendant la transcription, comme les poids d'un modèle (défaut: 0)
+    FAKE_WHISPER_CRASH_ONCE fichier témoin: s'il n'existe pas, il est créé et le processus s'arrête en erreur
+                          (code 1) après FAKE_WHISPER_CRASH_AFTER segments (défaut: 3), une seule fois
+
+install_fake_whisper(path) crée un faux dossier whisper.cpp utilisable comme WHISPER_PATH.
+"""
+
+import os
+import sys
+import time
+import wave
+
+FILLER_WORDS = "alors on se retrouve cette semaine pour parler du film et de sa musique".split()
+
+
+def format_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{milliseconds:03d}"
+
+
+def install_fake_whisper(whisper_path, models=("base",)):
+    """Crée build/bin/whisper-cli (ce script) et des modèles vides dans whisper_path"""
+    os.makedirs(os.path.join(whisper_path, "build", "bin"), exist_ok=True)
+    os.makedirs(os.path.join(whisper_path, "models"), exist_ok=True)
+    for model in models:
+        open(os.path.join(whisper_path, "models", f"ggml-{model}.bin"), "wb").close()
+    cli_path = os.path.join(whisper_path, "build", "bin", "whisper-cli")
+    with open(cli_path, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{os.path.abspath(__file__)}" "$@"\n')
+    os.chmod(cli_path, 0o755)
+    return whisper_path
+
+
+def main(args):
+    if os.environ.get("FAKE_WHISPER_ARGS_LOG"):
+        with open(os.environ["FAKE_WHISPER_ARGS_LOG"], "a") as f:
+            f.write(" ".join(args) + "\n")
+
+    audio_path = args[args.index("-f") + 1]
+    offset = int(args[args.index("--offset-t") + 1]) / 1000 if "--offset-t" in args else 0.0
+    segment_duration = float(os.environ.get("FAKE_WHISPER_SEGMENT", "5"))
+    delay = float(os.environ.get("FAKE_WHISPER_DELAY", "0.05"))
+    if os.environ.get("FAKE_WHISPER_RTF"):
+        delay = segment_duration * float(os.environ["FAKE_WHISPER_RTF"])
+    words = int(os.environ.get("FAKE_WHISPER_WORDS", "0"))
+    filler = " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(words))
+
+    if os.environ.get("FAKE_WHISPER_DURATION"):
+        duration = float(os.environ["FAKE_WHISPER_DURATION"])
+    else:
+        with wave.open(audio_path, "rb") as audio:
+            duration = audio.getnframes() / audio.getframerate()
+
+    sys.stderr.write(f"whisper_init_from_file: loading model from '{args[args.index('-m') + 1]}'\n")
+    sys.stderr.flush()
+    # Poids du modèle: pages réellement écrites pour apparaître dans le RSS
+    weights = bytearray(int(float(os.environ.get("FAKE_WHISPER_MEMORY_MB", "0")) * 1024 * 1024))
+    for page in range(0, len(weights), 4096):
+        weights[page] = 1
+    time.sleep(float(os.environ.get("FAKE_WHISPER_LOAD", "0")))
+    sys.stderr.write("whisper_model_load: model size = %7.2f MB\n" % (len(weights) / 1024 / 1024))
+    sys.stderr.write(f"main: processing '{audio_path}' ({duration:.1f} sec), offset {offset:.1f} sec\n")
+    sys.stderr.flush()
+
+    crash_marker = os.environ.get("FAKE_WHISPER_CRASH_ONCE")
+    crash_after = int(os.environ.get("FAKE_WHISPER_CRASH_AFTER", "3"))
+    if crash_marker and os.path.exists(crash_marker):
+        crash_marker = None
+
+    # Les segments commencent sur la grille de FAKE_WHISPER_SEGMENT secondes, à partir de l'offset
+    index = int(offset // segment_duration)
+    printed = 0
+    while index * segment_duration < duration:
+        if crash_marker and printed >= crash_after:
+            open(crash_marker, "w").close()
+            sys.stderr.write("whisper_full: failed to process audio\n")
+            return 1
+        start = index * segment_duration
+        end = min(start + segment_duration, duration)
+        if delay:
+            time.sleep(delay)
+        text = f"Segment numéro {index}. {filler}".strip()
+        print(f"[{format_timestamp(start)} --> {format_timestamp(end)}]   {text}", flush=True)
+        index += 1
+        printed += 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
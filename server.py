@@ -12,21 +12,43 @@ import tempfile
 import subprocess
 import requests
 import logging
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
 from flask_cors import CORS
 from datetime import datetime
 import uuid
-from flask import send_from_directory
+from flask import send_file, send_from_directory
 import shutil
 import threading
 import re
+import wave
+import hashlib
+import array
+import gzip
+import mimetypes
+import bisect
+import contextlib
+import cProfile
+import io
+import pstats
+import itertools
+import math
 import psutil  # Pour surveiller les ressources système
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 try:
     from pydub.utils import mediainfo
 except ImportError:
     mediainfo = None
+try:
+    import numpy  # Énergie des trames de la VAD (repli en Python pur sans numpy)
+except ImportError:
+    numpy = None
+try:
+    import zstandard  # Optionnel: variantes .zst des transcriptions
+except ImportError:
+    zstandard = None
 import urllib.parse
 
 # Configuration du logging
@@ -43,8 +65,11 @@ app = Flask(__name__)
 CORS(app, origins=["*"])
 
 # Configuration
-# Détection automatique du mode (Docker vs Local)
-if os.path.exists("/opt/whisper.cpp"):
+# WHISPER_PATH explicite, sinon détection automatique du mode (Docker vs Local)
+if os.environ.get("WHISPER_PATH"):
+    WHISPER_PATH = os.environ["WHISPER_PATH"]
+    print(f"🔧 WHISPER_PATH: {WHISPER_PATH}")
+elif os.path.exists("/opt/whisper.cpp"):
     # Mode Docker
     WHISPER_PATH = "/opt/whisper.cpp"
     print("🐳 Mode Docker détecté")
@@ -56,24 +81,51 @@ else:
 MODEL_PATH = f"{WHISPER_PATH}/models/ggml-base.bin"
 MAX_FILE_SIZE = 150 * 1024 * 1024  # 150MB max
 
-# Dictionnaire global pour stocker l'état des tâches asynchrones
-ASYNC_TASKS = {}
+# Dossier des transcriptions produites et état persistant du service
+OUTPUT_DIR = "/var/log/whisper"
+STATE_DIR = os.environ.get("WHISPER_STATE_DIR", os.path.join(OUTPUT_DIR, "state"))
+# Base SQLite (mode WAL) partagée par tous les workers gunicorn: tâches et file d'attente
+TASK_DB_PATH = os.path.join(STATE_DIR, "tasks.db")
 
-# Compteur global pour les transcriptions actives
-ACTIVE_TRANSCRIPTIONS = 0
-MAX_CONCURRENT_TRANSCRIPTIONS = 1
+# File d'attente des transcriptions: tâches "pending" de la base, triées par priorité puis arrivée
+# Priorité de 0 (la plus urgente) à 9, FIFO à priorité égale
+DEFAULT_PRIORITY = 5
+TASK_QUEUE_CONDITION = threading.Condition()
+QUEUE_POLL_INTERVAL = 2  # Les autres processus ne peuvent pas nous réveiller: on relit la base
+QUEUE_WORKERS = []
+DEFAULT_TASK_DURATION_ESTIMATE = 600  # 10 min tant qu'aucune tâche n'est terminée
+
+# Statuts d'une tâche qui n'est ni en attente ni terminée
+FINAL_STATUSES = ["completed", "error"]
+
+# Processus whisper-cli lancés par ce processus, arrêtés proprement sur SIGTERM
+RUNNING_PROCESSES = set()
 
 # Configuration pour éviter les kills par Coolify
 import signal
 import atexit
+import sys
+import json
+import sqlite3
+import selectors
+from collections import deque
 
 def signal_handler(signum, frame):
     """Gestionnaire de signal pour arrêt gracieux"""
     logger.warning(f"[SYSTEM] Signal {signum} reçu, arrêt gracieux en cours...")
-    # Sauvegarder l'état des tâches en cours
-    for task_id, task in ASYNC_TASKS.items():
-        if task.get("status") == "processing":
-            logger.info(f"[SYSTEM] Sauvegarde de la tâche {task_id} avant arrêt")
+    # Remettre en file les tâches de ce processus pour qu'elles reprennent après redémarrage
+    for process in list(RUNNING_PROCESSES):
+        try:
+            process.terminate()
+        except Exception:
+            pass
+    stop_engine_servers()
+    try:
+        requeued = requeue_tasks_of_worker(os.getpid())
+        for task_id in requeued:
+            logger.info(f"[SYSTEM] Tâche {task_id} sauvegardée et remise en file avant arrêt")
+    except Exception as e:
+        logger.error(f"[SYSTEM] Impossible de sauvegarder les tâches en cours: {e}")
     sys.exit(0)
 
 # Enregistrer les gestionnaires de signal
@@ -83,9 +135,13 @@ signal.signal(signal.SIGINT, signal_handler)
 def cleanup_on_exit():
     """Nettoyage à la sortie"""
     logger.info("[SYSTEM] Nettoyage à la sortie...")
-    for task_id, task in ASYNC_TASKS.items():
-        if task.get("status") == "processing":
-            logger.warning(f"[SYSTEM] Tâche {task_id} encore en cours à la sortie")
+    stop_engine_servers()
+    try:
+        for task in list_tasks_in_store():
+            if task["status"] not in FINAL_STATUSES + ["pending"] and task.get("worker_pid") == os.getpid():
+                logger.warning(f"[SYSTEM] Tâche {task['task_id']} encore en cours à la sortie")
+    except Exception:
+        pass
 
 atexit.register(cleanup_on_exit)
 
@@ -102,6 +158,505 @@ if not logger.hasHandlers():
     logging.basicConfig(level=logging.INFO)
 
 
+# === STOCKAGE PERSISTANT DES TÂCHES (SQLite WAL) ===
+TASK_COLUMNS = [
+    "task_id",
+    "status",
+    "progress",
+    "priority",
+    "created_at",
+    "queued_at",
+    "started_at",
+    "finished_at",
+    "duration",
+    "sync",
+    "params",
+    "result",
+    "info",
+    "worker_pid",
+    "worker_started",
+    "attempts",
+    "batch_id",
+]
+JSON_COLUMNS = ["params", "result", "info"]
+
+_db_local = threading.local()
+_db_schema_lock = threading.Lock()
+_db_schema_ready = set()
+
+
+def get_db():
+    """Connexion SQLite propre au thread courant (autocommit, WAL), rouverte si TASK_DB_PATH change (tests)"""
+    conn = getattr(_db_local, "conn", None)
+    if conn is not None:
+        if _db_local.path == TASK_DB_PATH:
+            return conn
+        conn.close()
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    conn = sqlite3.connect(TASK_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    with _db_schema_lock:
+        if TASK_DB_PATH not in _db_schema_ready:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    progress INTEGER NOT NULL DEFAULT 0,
+                    priority INTEGER NOT NULL DEFAULT 5,
+                    created_at TEXT NOT NULL,
+                    queued_at REAL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    duration REAL,
+                    sync INTEGER NOT NULL DEFAULT 0,
+                    params TEXT,
+                    result TEXT,
+                    info TEXT,
+                    worker_pid INTEGER,
+                    worker_started REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    batch_id TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_queue ON tasks (status, priority, queued_at);
+                CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_at);
+                CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (status, finished_at);
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    cache_key TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    metadata TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries (last_access);
+                CREATE TABLE IF NOT EXISTS cache_urls (
+                    audio_url TEXT PRIMARY KEY,
+                    audio_hash TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS metrics (
+                    name TEXT NOT NULL,
+                    labels TEXT NOT NULL,
+                    le REAL NOT NULL DEFAULT 0,
+                    value REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (name, labels, le)
+                );
+                """
+            )
+            # Bases créées par une version précédente: colonnes ajoutées depuis
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column, definition in [("attempts", "INTEGER NOT NULL DEFAULT 0"), ("batch_id", "TEXT")]:
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} {definition}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_batch ON tasks (batch_id)")
+            _db_schema_ready.add(TASK_DB_PATH)
+    _db_local.conn = conn
+    _db_local.path = TASK_DB_PATH
+    return conn
+
+
+def row_to_task(row):
+    """Convertit une ligne SQLite en dictionnaire de tâche"""
+    task = dict(row)
+    for column in JSON_COLUMNS:
+        if task.get(column) is not None:
+            task[column] = json.loads(task[column])
+    task["sync"] = bool(task.get("sync"))
+    # Les champs additionnels (info) sont exposés au même niveau que les colonnes
+    task.update(task.pop("info", None) or {})
+    return task
+
+
+def store_create_task(task):
+    """Insère une nouvelle tâche dans la base"""
+    values = {column: task.get(column) for column in TASK_COLUMNS if column in task}
+    for column in JSON_COLUMNS:
+        if column in values:
+            values[column] = json.dumps(values[column])
+    columns = ", ".join(values)
+    placeholders = ", ".join("?" for _ in values)
+    get_db().execute(
+        f"INSERT INTO tasks ({columns}) VALUES ({placeholders})", list(values.values())
+    )
+
+
+def get_task(task_id):
+    """Lit une tâche, None si inconnue"""
+    if not task_id:
+        return None
+    row = get_db().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+    return row_to_task(row) if row else None
+
+
+def update_task(task_id, **fields):
+    """Met à jour une tâche; les champs hors colonnes sont fusionnés dans info"""
+    if not task_id or not fields:
+        return
+    conn = get_db()
+    columns = {k: v for k, v in fields.items() if k in TASK_COLUMNS and k != "info"}
+    extra = {k: v for k, v in fields.items() if k not in TASK_COLUMNS}
+    for column in JSON_COLUMNS:
+        if column in columns:
+            columns[column] = json.dumps(columns[column])
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if extra:
+            row = conn.execute("SELECT info FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return
+            info = json.loads(row["info"]) if row["info"] else {}
+            info.update(extra)
+            columns["info"] = json.dumps(info)
+        if columns:
+            assignments = ", ".join(f"{column} = ?" for column in columns)
+            conn.execute(
+                f"UPDATE tasks SET {assignments} WHERE task_id = ?",
+                list(columns.values()) + [task_id],
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def delete_task(task_id):
+    """Supprime une tâche de la base, ses segments publiés et son dossier de travail"""
+    get_db().execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+    reset_task_segments(task_id)
+    remove_task_work_dir(task_id)
+    try:
+        os.unlink(get_profile_path(task_id))
+    except OSError:
+        pass
+
+
+def list_tasks_in_store():
+    """Toutes les tâches, des plus anciennes aux plus récentes"""
+    rows = get_db().execute("SELECT * FROM tasks ORDER BY created_at").fetchall()
+    return [row_to_task(row) for row in rows]
+
+
+def count_tasks(statuses=None, exclude=None):
+    """Compte les tâches ayant (ou n'ayant pas) certains statuts"""
+    if statuses:
+        query = f"SELECT COUNT(*) FROM tasks WHERE status IN ({', '.join('?' for _ in statuses)})"
+        args = statuses
+    else:
+        query = f"SELECT COUNT(*) FROM tasks WHERE status NOT IN ({', '.join('?' for _ in exclude)})"
+        args = exclude
+    return get_db().execute(query, args).fetchone()[0]
+
+
+def get_active_transcriptions():
+    """Nombre de transcriptions en cours, tous processus confondus"""
+    return count_tasks(exclude=FINAL_STATUSES + ["pending"])
+
+
+def get_process_identity(pid=None):
+    """(pid, date de démarrage) identifiant un processus de façon unique malgré la réutilisation des PID"""
+    process = psutil.Process(pid or os.getpid())
+    return process.pid, round(process.create_time(), 2)
+
+
+def is_worker_alive(pid, started):
+    """Vrai si le processus propriétaire d'une tâche tourne toujours"""
+    if not pid:
+        return False
+    try:
+        return get_process_identity(pid)[1] == started
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+
+
+def claim_next_task():
+    """Réserve atomiquement la prochaine tâche de la file pour ce processus"""
+    conn = get_db()
+    pid, started = get_process_identity()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT task_id, queued_at, attempts FROM tasks WHERE status = 'pending' "
+            "ORDER BY priority, queued_at, rowid LIMIT 1"
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE tasks SET status = 'processing', worker_pid = ?, worker_started = ?, "
+            "started_at = ?, attempts = attempts + 1 WHERE task_id = ?",
+            (pid, started, datetime.now().isoformat(), row["task_id"]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    # Première prise seulement: une reprise garde son heure d'arrivée d'origine
+    if not row["attempts"] and row["queued_at"]:
+        observe_metric("whisper_queue_wait_seconds", time.time() - row["queued_at"])
+    return row["task_id"]
+
+
+def unclaim_task(task_id):
+    """Rend à la file une tâche réservée mais pas démarrée, sans compter de tentative"""
+    get_db().execute(
+        "UPDATE tasks SET status = 'pending', worker_pid = NULL, worker_started = NULL, started_at = NULL, "
+        "attempts = attempts - 1 WHERE task_id = ? AND status = 'processing'",
+        (task_id,),
+    )
+
+
+def requeue_task(task_id):
+    """Remet une tâche interrompue en file, à sa place d'origine"""
+    update_task(
+        task_id,
+        status="pending",
+        progress=0,
+        worker_pid=None,
+        worker_started=None,
+        started_at=None,
+    )
+
+
+def requeue_tasks_of_worker(pid):
+    """Remet en file les tâches en cours d'un processus (arrêt gracieux)"""
+    rows = get_db().execute(
+        f"SELECT task_id, sync FROM tasks WHERE worker_pid = ? AND status NOT IN "
+        f"({', '.join('?' for _ in FINAL_STATUSES)}, 'pending')",
+        [pid] + FINAL_STATUSES,
+    ).fetchall()
+    requeued = []
+    for row in rows:
+        if row["sync"]:
+            # Le client HTTP synchrone attend sur ce processus: inutile de relancer
+            update_task(row["task_id"], status="error", progress=100,
+                        result="Transcription interrompue par un redémarrage du service")
+        else:
+            requeue_task(row["task_id"])
+            requeued.append(row["task_id"])
+    return requeued
+
+
+def requeue_interrupted_tasks():
+    """Au démarrage: remet en file les tâches dont le processus propriétaire a disparu"""
+    rows = get_db().execute(
+        f"SELECT task_id, sync, worker_pid, worker_started FROM tasks WHERE status NOT IN "
+        f"({', '.join('?' for _ in FINAL_STATUSES)}, 'pending')",
+        FINAL_STATUSES,
+    ).fetchall()
+    requeued = []
+    for row in rows:
+        if is_worker_alive(row["worker_pid"], row["worker_started"]):
+            continue
+        if row["sync"]:
+            update_task(row["task_id"], status="error", progress=100,
+                        result="Transcription interrompue par un redémarrage du service")
+            logger.warning(f"[STORE] Tâche synchrone {row['task_id']} interrompue, marquée en erreur")
+        else:
+            requeue_task(row["task_id"])
+            requeued.append(row["task_id"])
+            logger.info(f"[STORE] Tâche interrompue {row['task_id']} remise en file")
+    return requeued
+
+
+# === CACHE DES TRANSCRIPTIONS (empreinte de l'audio + paramètres de décodage) ===
+CACHE_DIR = os.environ.get("TRANSCRIPTION_CACHE_DIR", os.path.join(STATE_DIR, "cache"))
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_SIZE_MB", "2048")) * 1024 * 1024  # 0 = cache désactivé
+CACHE_KEY_PARAMS = [
+    "model", "language", "output_format", "word_thold", "no_speech_thold", "prompt", "chunking", "streaming",
+]
+
+
+def build_cache_key(audio_hash, params):
+    """Clé de cache: SHA-256 de l'audio et des paramètres qui influencent le texte produit"""
+    key_params = {
+        "audio_hash": audio_hash,
+        "model": params.get("model"),
+        "language": params.get("language"),
+        "output_format": str(params.get("output_format", "txt")).lower(),
+        "word_thold": float(params.get("word_thold", 0.005)),
+        "no_speech_thold": float(params.get("no_speech_thold", 0.40)),
+        "prompt": params.get("prompt") or None,
+        "preprocessing": get_preprocessing_signature(),
+        "vad": bool(params.get("vad")),
+        "decoding": get_decoding_signature(resolve_decoding_options(params.get("quality"), params.get("decoding"))),
+        "segmentation": get_segmentation_signature(params),
+    }
+    payload = json.dumps(key_params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def increment_cache_stat(name):
+    """Incrémente un compteur du cache (partagé entre processus)"""
+    get_db().execute(
+        "INSERT INTO cache_stats (name, value) VALUES (?, 1) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,),
+    )
+
+
+def remember_audio_hash(audio_url, audio_hash):
+    """Mémorise l'empreinte de l'audio servi par une URL"""
+    get_db().execute(
+        "INSERT OR REPLACE INTO cache_urls (audio_url, audio_hash, updated_at) VALUES (?, ?, ?)",
+        (audio_url, audio_hash, time.time()),
+    )
+
+
+def lookup_audio_hash(audio_url):
+    """Empreinte déjà connue pour cette URL exacte, None sinon"""
+    row = get_db().execute(
+        "SELECT audio_hash FROM cache_urls WHERE audio_url = ?", (audio_url,)
+    ).fetchone()
+    return row["audio_hash"] if row else None
+
+
+def cache_contains(cache_key):
+    """Vrai si une entrée existe pour cette clé (sans la lire ni compter de succès)"""
+    if CACHE_MAX_BYTES <= 0:
+        return False
+    row = get_db().execute("SELECT 1 FROM cache_entries WHERE cache_key = ?", (cache_key,)).fetchone()
+    return row is not None
+
+
+def cache_get(cache_key):
+    """Résultat en cache pour une clé (met à jour l'ordre LRU), None si absent.
+
+    La transcription est copiée de fichier à fichier (transcription_path), servie comme un rendu neuf:
+    le texte n'est jamais chargé en mémoire et l'entrée reste en place si la copie est déplacée ou supprimée.
+    """
+    if CACHE_MAX_BYTES <= 0:
+        return None
+    conn = get_db()
+    row = conn.execute(
+        "SELECT path, metadata FROM cache_entries WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+    if row is None:
+        return None
+    os.makedirs(STATE_DIR, exist_ok=True)
+    transcription_path = os.path.join(STATE_DIR, f"transcription_cache_{uuid.uuid4().hex}.txt")
+    try:
+        shutil.copyfile(row["path"], transcription_path)
+    except OSError:
+        conn.execute("DELETE FROM cache_entries WHERE cache_key = ?", (cache_key,))
+        return None
+    conn.execute(
+        "UPDATE cache_entries SET last_access = ?, hits = hits + 1 WHERE cache_key = ?",
+        (time.time(), cache_key),
+    )
+    result = json.loads(row["metadata"]) if row["metadata"] else {}
+    result["transcription_path"] = transcription_path
+    result["cached"] = True
+    return result
+
+
+def cache_put(cache_key, result):
+    """Enregistre une transcription réussie puis applique la limite de taille"""
+    if CACHE_MAX_BYTES <= 0 or not (result.get("transcription") or result.get("transcription_path")):
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{cache_key}.txt")
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if result.get("transcription_path"):
+        shutil.copyfile(result["transcription_path"], temp_path)
+    else:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(result["transcription"])
+    os.replace(temp_path, path)
+    metadata = {k: v for k, v in result.items() if k not in ["transcription", "transcription_path", "cached"]}
+    now = time.time()
+    get_db().execute(
+        "INSERT OR REPLACE INTO cache_entries (cache_key, path, size, metadata, created_at, last_access) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (cache_key, path, os.path.getsize(path), json.dumps(metadata), now, now),
+    )
+    evict_cache()
+
+
+def evict_cache():
+    """Supprime les entrées les moins récemment utilisées au-delà de CACHE_MAX_BYTES"""
+    conn = get_db()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+    while total > CACHE_MAX_BYTES:
+        rows = conn.execute(
+            "SELECT cache_key, path, size FROM cache_entries ORDER BY last_access LIMIT 20"
+        ).fetchall()
+        if not rows:
+            break
+        for row in rows:
+            if total <= CACHE_MAX_BYTES:
+                break
+            conn.execute("DELETE FROM cache_entries WHERE cache_key = ?", (row["cache_key"],))
+            try:
+                os.remove(row["path"])
+            except OSError:
+                pass
+            total -= row["size"]
+            increment_cache_stat("evictions")
+            logger.info(f"[CACHE] Entrée {row['cache_key'][:12]} évincée ({row['size']} octets)")
+
+
+def get_cached_transcription(audio_hash, params):
+    """Transcription en cache pour cet audio et ces paramètres (compte les succès)"""
+    try:
+        result = cache_get(build_cache_key(audio_hash, params))
+    except Exception as e:
+        logger.warning(f"[CACHE] Lecture impossible: {e}")
+        return None
+    if result:
+        increment_cache_stat("hits")
+        logger.info(f"[CACHE] Succès pour l'audio {audio_hash[:12]}")
+    return result
+
+
+def lookup_cached_result_for_url(params):
+    """Réponse immédiate si cette URL a déjà été téléchargée et transcrite avec ces paramètres"""
+    if CACHE_MAX_BYTES <= 0:
+        return None
+    audio_hash = lookup_audio_hash(params["audio_url"])
+    if not audio_hash:
+        return None
+    return get_cached_transcription(audio_hash, params)
+
+
+def has_cached_result_for_url(params):
+    """Vrai si cette URL déjà vue a un résultat en cache pour ces paramètres (sans le servir)"""
+    if CACHE_MAX_BYTES <= 0:
+        return False
+    audio_hash = lookup_audio_hash(params["audio_url"])
+    return bool(audio_hash) and cache_contains(build_cache_key(audio_hash, params))
+
+
+def get_cache_stats():
+    """Compteurs du cache pour l'endpoint /cache/stats"""
+    conn = get_db()
+    stats = {row["name"]: row["value"] for row in conn.execute("SELECT name, value FROM cache_stats")}
+    entries, size = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+    ).fetchone()
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "evictions": stats.get("evictions", 0),
+        "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+        "entries": entries,
+        "size_bytes": size,
+        "max_size_bytes": CACHE_MAX_BYTES,
+    }
+
+
 def log_system_resources():
     """Log les ressources système pour debug"""
     try:
@@ -114,21 +669,627 @@ def log_system_resources():
 
 def update_task_progress(task_id, progress, status=None):
     """Fonction utilitaire pour mettre à jour la progression d'une tâche"""
-    if task_id and task_id in ASYNC_TASKS:
-        old_progress = ASYNC_TASKS[task_id].get("progress", 0)
-        old_status = ASYNC_TASKS[task_id].get("status", "")
-        
-        ASYNC_TASKS[task_id]["progress"] = progress
+    task = get_task(task_id)
+    if task:
+        old_progress = task.get("progress", 0)
+        old_status = task.get("status", "")
+
+        # Éviter les écritures inutiles (appelé à chaque bloc pendant le téléchargement)
+        if progress == old_progress and (not status or status == old_status):
+            return
+
+        fields = {"progress": progress}
         if status:
-            ASYNC_TASKS[task_id]["status"] = status
+            fields["status"] = status
+        update_task(task_id, **fields)
         
         # Ne logger que les changements significatifs (tous les 10% ou changement de status)
         if (progress - old_progress >= 10) or (status and status != old_status):
             logger.info(
-                f"[ASYNC] Tâche {task_id} : Progression {progress}% - Status: {ASYNC_TASKS[task_id]['status']}"
+                f"[ASYNC] Tâche {task_id} : Progression {progress}% - Status: {status or old_status}"
             )
 
 
+def report_audio_progress(task_id, audio_processed, audio_duration, transcribe_start, audio_start=0.0):
+    """Progression réelle d'après la position dans l'audio (fin du dernier segment émis).
+
+    Enregistre le pourcentage d'audio traité, le facteur temps réel (secondes de calcul par
+    seconde d'audio) et l'heure de fin prévue, ramenés sur l'échelle 25-90% de la tâche.
+    audio_start est la position de départ d'une reprise, exclue du calcul du facteur temps réel.
+    """
+    if not task_id or not audio_duration or audio_processed <= audio_start:
+        return
+    fraction = min(audio_processed / audio_duration, 1.0)
+    now = time.time()
+    realtime_factor = (now - transcribe_start) / (audio_processed - audio_start)
+    eta = (audio_duration - audio_processed) * realtime_factor
+    update_task(
+        task_id,
+        progress=int(25 + fraction * 65),
+        audio_processed=round(audio_processed, 1),
+        percent_done=round(fraction * 100, 1),
+        realtime_factor=round(realtime_factor, 3),
+        eta_at=now + max(eta, 0),
+    )
+
+
+# === MÉTRIQUES PROMETHEUS (/metrics) ===
+# Compteurs et histogrammes dans la base SQLite (partagés entre les workers gunicorn), jauges
+# (file, processus whisper, cache, système) calculées à chaque lecture. Format texte Prometheus
+METRICS = {
+    # nom: (type, aide, bornes des histogrammes)
+    "whisper_download_seconds": (
+        "histogram", "Durée des téléchargements d'audio",
+        [0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600],
+    ),
+    "whisper_queue_wait_seconds": (
+        "histogram", "Attente dans la file avant le premier traitement",
+        [1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200, 14400],
+    ),
+    "whisper_transcription_realtime_factor": (
+        "histogram", "Secondes de transcription par seconde d'audio, par modèle",
+        [0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5],
+    ),
+    "whisper_output_bytes": (
+        "histogram", "Taille des transcriptions produites, par format",
+        [1024, 4096, 16384, 65536, 262144, 1048576, 4194304],
+    ),
+    "whisper_tasks_total": ("counter", "Tâches sorties d'un worker, par statut", None),
+}
+ENGINE_PROCESS_NAMES = ("whisper-cli", "whisper-server")
+_engine_processes = {}  # pid -> psutil.Process (cpu_percent mesuré entre deux lectures)
+
+
+def format_metric_labels(labels):
+    """Étiquettes Prometheus triées: cle="valeur", guillemets et antislashs échappés"""
+    escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in labels.items()}
+    return ",".join(f'{key}="{value}"' for key, value in sorted(escaped.items()))
+
+
+def format_metric_value(value):
+    if math.isinf(value):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def increment_metric(name, value=1, **labels):
+    """Incrémente un compteur (partagé entre processus)"""
+    try:
+        get_db().execute(
+            "INSERT INTO metrics (name, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(name, labels, le) DO UPDATE SET value = value + excluded.value",
+            (name, format_metric_labels(labels), value),
+        )
+    except Exception as e:
+        logger.warning(f"[METRICS] Écriture de {name} impossible: {e}")
+
+
+def observe_metric(name, value, **labels):
+    """Ajoute une observation à un histogramme de METRICS"""
+    if value is None or value < 0:
+        return
+    label_text = format_metric_labels(labels)
+    rows = [(f"{name}_bucket", label_text, le, 1) for le in METRICS[name][2] + [math.inf] if value <= le]
+    rows += [(f"{name}_sum", label_text, 0, value), (f"{name}_count", label_text, 0, 1)]
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        # Toutes les bornes existent dès la première observation (histogramme cumulatif complet)
+        conn.executemany(
+            "INSERT OR IGNORE INTO metrics (name, labels, le, value) VALUES (?, ?, ?, 0)",
+            [(f"{name}_bucket", label_text, le) for le in METRICS[name][2] + [math.inf]],
+        )
+        conn.executemany(
+            "INSERT INTO metrics (name, labels, le, value) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(name, labels, le) DO UPDATE SET value = value + excluded.value",
+            rows,
+        )
+        conn.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.warning(f"[METRICS] Écriture de {name} impossible: {e}")
+
+
+def observe_transcription(result, model, output_format):
+    """Facteur temps réel et taille de sortie d'une transcription terminée (hors cache)"""
+    inference = (result.get("timings") or {}).get("inference")
+    if result.get("audio_duration") and inference is not None:
+        observe_metric("whisper_transcription_realtime_factor", inference / result["audio_duration"], model=model)
+        record_realtime_factor(model, inference / result["audio_duration"])
+    if result.get("transcription_path") and os.path.exists(result["transcription_path"]):
+        size = os.path.getsize(result["transcription_path"])
+    else:
+        size = len((result.get("transcription") or "").encode("utf-8"))
+    observe_metric("whisper_output_bytes", size, format=output_format)
+
+
+def get_engine_process_usage():
+    """Mémoire et CPU des processus whisper-cli et whisper-server de la machine, par nom"""
+    usage = {name: {"count": 0, "rss": 0, "cpu": 0.0} for name in ENGINE_PROCESS_NAMES}
+    seen = set()
+    for process in psutil.process_iter(["name"]):
+        name = process.info["name"]
+        if name not in ENGINE_PROCESS_NAMES:
+            continue
+        # Même objet d'une lecture à l'autre: cpu_percent mesure depuis la lecture précédente
+        process = _engine_processes.setdefault(process.pid, process)
+        seen.add(process.pid)
+        try:
+            usage[name]["rss"] += process.memory_info().rss
+            usage[name]["cpu"] += process.cpu_percent(interval=None)
+            usage[name]["count"] += 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    for pid in set(_engine_processes) - seen:
+        del _engine_processes[pid]
+    return usage
+
+
+def render_metrics():
+    """Toutes les métriques au format texte Prometheus"""
+    lines = []
+
+    def add(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}{suffix}{label_text} {format_metric_value(value)}")
+
+    conn = get_db()
+    for name, (kind, help_text, _) in METRICS.items():
+        samples = []
+        if kind == "histogram":
+            rows = conn.execute(
+                "SELECT name, labels, le, value FROM metrics WHERE name IN (?, ?, ?) "
+                "ORDER BY labels, name != ?, le, name",
+                (f"{name}_bucket", f"{name}_sum", f"{name}_count", f"{name}_bucket"),
+            ).fetchall()
+            for row in rows:
+                labels = row["labels"]
+                if row["name"].endswith("_bucket"):
+                    labels = ",".join(filter(None, [labels, f'le="{format_metric_value(row["le"])}"']))
+                samples.append((row["name"][len(name):], labels, row["value"]))
+        else:
+            for row in conn.execute("SELECT labels, value FROM metrics WHERE name = ? ORDER BY labels", (name,)):
+                samples.append(("", row["labels"], row["value"]))
+        add(name, kind, help_text, samples)
+
+    # File d'attente: tâches en attente et en cours (tous processus)
+    counts = {"queued": 0, "active": 0}
+    for row in conn.execute(
+        f"SELECT status, COUNT(*) AS n FROM tasks WHERE status NOT IN ({', '.join('?' for _ in FINAL_STATUSES)}) "
+        "GROUP BY status",
+        FINAL_STATUSES,
+    ):
+        counts["queued" if row["status"] == "pending" else "active"] += row["n"]
+    add("whisper_jobs", "gauge", "Tâches en attente (queued) et en cours (active)",
+        [("", f'state="{state}"', count) for state, count in counts.items()])
+
+    concurrency = get_concurrency_status()
+    add("whisper_concurrency_target", "gauge", "Transcriptions simultanées visées par le contrôleur",
+        [("", "", concurrency["target"])])
+    add("whisper_engine_threads", "gauge", "Threads CPU donnés à chaque transcription",
+        [("", "", concurrency["threads_per_transcription"])])
+
+    usage = get_engine_process_usage()
+    add("whisper_engine_processes", "gauge", "Processus whisper en cours",
+        [("", f'process="{name}"', values["count"]) for name, values in usage.items()])
+    add("whisper_engine_rss_bytes", "gauge", "Mémoire résidente des processus whisper",
+        [("", f'process="{name}"', values["rss"]) for name, values in usage.items()])
+    add("whisper_engine_cpu_percent", "gauge", "CPU des processus whisper depuis la lecture précédente",
+        [("", f'process="{name}"', values["cpu"]) for name, values in usage.items()])
+
+    cache = get_cache_stats()
+    for key in ("hits", "misses", "evictions"):
+        add(f"whisper_cache_{key}_total", "counter", f"Cache des transcriptions: {key}", [("", "", cache[key])])
+    add("whisper_cache_hit_ratio", "gauge", "Part des transcriptions servies par le cache",
+        [("", "", cache["hit_rate"] or 0)])
+    add("whisper_cache_size_bytes", "gauge", "Taille du cache des transcriptions", [("", "", cache["size_bytes"])])
+
+    memory = psutil.virtual_memory()
+    add("whisper_system_memory_used_bytes", "gauge", "Mémoire utilisée sur la machine", [("", "", memory.used)])
+    add("whisper_system_cpu_percent", "gauge", "CPU de la machine depuis la lecture précédente",
+        [("", "", psutil.cpu_percent(interval=None))])
+    return "\n".join(lines) + "\n"
+
+
+# === SEGMENTS PARTIELS: PUBLIÉS AU FIL DE LA TRANSCRIPTION ===
+# Un fichier JSON Lines par tâche, lisible par tous les workers pendant que la transcription avance
+SEGMENTS_DIR = os.path.join(STATE_DIR, "segments")
+STREAM_POLL_INTERVAL = 1.0  # Relecture du fichier de segments par /transcription-stream
+STREAM_KEEPALIVE_INTERVAL = 15  # Commentaire SSE pour garder la connexion ouverte
+
+
+def get_segments_path(task_id):
+    return os.path.join(SEGMENTS_DIR, f"{task_id}.jsonl")
+
+
+def reset_task_segments(task_id):
+    """Vide les segments publiés d'une tâche (nouvelle exécution).
+
+    Les segments déjà publiés changent de génération: un flux /transcription-stream ouvert repart du début
+    du nouveau fichier au lieu de continuer à sa position dans l'ancien.
+    """
+    if not task_id:
+        return
+    try:
+        os.unlink(get_segments_path(task_id))
+    except OSError:
+        return
+    update_task(task_id, segments_generation=get_segments_generation(task_id) + 1)
+
+
+def get_segments_generation(task_id):
+    """Génération du fichier de segments d'une tâche, incrémentée à chaque remise à zéro"""
+    task = get_task(task_id)
+    return (task or {}).get("segments_generation", 0)
+
+
+def dump_segment(seg):
+    """Ligne JSON Lines d'un segment"""
+    return json.dumps({"start": round(seg["start"], 3), "end": round(seg["end"], 3), "text": seg["text"]}, ensure_ascii=False) + "\n"
+
+
+def append_task_segments(task_id, segments):
+    """Ajoute des segments terminés au fichier de la tâche"""
+    if not task_id or not segments:
+        return
+    os.makedirs(SEGMENTS_DIR, exist_ok=True)
+    lines = "".join(dump_segment(seg) for seg in segments)
+    with open(get_segments_path(task_id), "a", encoding="utf-8") as f:
+        f.write(lines)
+
+
+def read_task_segments(task_id, position=0, max_bytes=1024 * 1024):
+    """Segments publiés depuis l'octet position: (segments, nouvelle position).
+
+    Lit au plus max_bytes par appel. Une ligne en cours d'écriture (sans retour à la ligne)
+    est laissée pour la lecture suivante.
+    """
+    try:
+        with open(get_segments_path(task_id), "rb") as f:
+            f.seek(position)
+            data = f.read(max_bytes)
+    except OSError:
+        return [], position
+    complete = data[:data.rfind(b"\n") + 1]
+    try:
+        segments = [json.loads(line) for line in complete.splitlines() if line.strip()]
+    except ValueError:
+        # Position au milieu d'une ligne: le fichier a été remplacé depuis la lecture précédente
+        return [], position
+    return segments, position + len(complete)
+
+
+def iter_segments_file(path):
+    """Parcourt un fichier JSON Lines de segments un par un"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+    except FileNotFoundError:
+        return
+
+
+def iter_task_segments(task_id):
+    """Parcourt les segments publiés d'une tâche un par un, depuis le disque"""
+    return iter_segments_file(get_segments_path(task_id))
+
+
+def take_transcription(result):
+    """Texte d'un résultat, chargé depuis transcription_path si le rendu a été écrit sur disque"""
+    path = result.pop("transcription_path", None)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            result["transcription"] = f.read()
+        os.unlink(path)
+    return result.get("transcription", "")
+
+
+def render_task_transcription(segments_id, output_format, task_id=None):
+    """Rendu txt, srt ou vtt des segments publiés, écrit sur disque segment par segment.
+
+    Tâche de la file: le résultat désigne le fichier (transcription_path). Appel direct: le texte est
+    renvoyé tel quel et les segments temporaires supprimés.
+    """
+    os.makedirs(STATE_DIR, exist_ok=True)
+    transcription_path = os.path.join(STATE_DIR, f"transcription_{segments_id}.{output_format}")
+    write_segments_file(iter_task_segments(segments_id), transcription_path, output_format)
+    result = {"transcription_path": transcription_path}
+    if not task_id:
+        take_transcription(result)
+        reset_task_segments(segments_id)
+    return result
+
+
+def new_stitch_state():
+    """Assemblage des morceaux d'une tâche: morceaux et segments publiés, derniers segments gardés"""
+    return {"chunks": 0, "segments": 0, "tail": deque(maxlen=10)}
+
+
+def publish_chunk_segments(segments_id, chunks, chunk_files, stitch, timeline=None):
+    """Publie dans l'ordre les segments des morceaux terminés consécutifs.
+
+    chunk_files[i] vaut None tant que le morceau i n'est pas transcrit, puis le fichier JSON Lines
+    de ses segments, relu segment par segment et supprimé une fois publié. stitch (new_stitch_state)
+    suit l'assemblage d'un appel à l'autre. Les segments publiés sont ramenés aux horodatages
+    d'origine (audio prétraité).
+    """
+    while stitch["chunks"] < len(chunks) and chunk_files[stitch["chunks"]] is not None:
+        chunk = chunks[stitch["chunks"]]
+        os.makedirs(SEGMENTS_DIR, exist_ok=True)
+        with open(get_segments_path(segments_id), "a", encoding="utf-8") as f:
+            for segment in stitch_chunk_segments(chunk, iter_segments_file(chunk_files[chunk["index"]]), stitch["tail"]):
+                f.write(dump_segment(remap_segments([segment], timeline)[0]))
+                stitch["segments"] += 1
+        try:
+            os.unlink(chunk_files[chunk["index"]])
+        except OSError:
+            pass
+        stitch["chunks"] += 1
+    return stitch["segments"]
+
+
+# === POINTS DE REPRISE: AUDIO ET SEGMENTS CONSERVÉS POUR LES LONGUES TRANSCRIPTIONS ===
+# L'audio téléchargé reste dans un dossier par tâche jusqu'à la fin de la transcription; les
+# segments publiés servent de point de reprise (position = fin du dernier segment)
+WORK_DIR = os.path.join(STATE_DIR, "work")
+MAX_TASK_ATTEMPTS = int(os.environ.get("MAX_TASK_ATTEMPTS", "3"))
+
+
+def get_task_work_dir(task_id):
+    return os.path.join(WORK_DIR, task_id)
+
+
+def save_checkpoint(task_id, **fields):
+    """Enregistre l'audio téléchargé d'une tâche (écriture atomique)"""
+    path = os.path.join(get_task_work_dir(task_id), "checkpoint.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(fields, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_checkpoint(task_id):
+    """Point de reprise d'une tâche: audio déjà téléchargé et segments terminés, None sinon"""
+    if not task_id:
+        return None
+    try:
+        with open(os.path.join(get_task_work_dir(task_id), "checkpoint.json")) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(checkpoint.get("audio_path", "")):
+        return None
+    checkpoint["segments"] = 0
+    checkpoint["offset"] = 0.0
+    for segment in iter_task_segments(task_id):
+        checkpoint["segments"] += 1
+        checkpoint["offset"] = segment["end"]
+    return checkpoint
+
+
+def remove_task_work_dir(task_id):
+    if task_id:
+        shutil.rmtree(get_task_work_dir(task_id), ignore_errors=True)
+
+
+def cleanup_task_work_dirs():
+    """Supprime les dossiers de travail des tâches terminées ou disparues"""
+    if not os.path.exists(WORK_DIR):
+        return
+    for task_id in os.listdir(WORK_DIR):
+        task = get_task(task_id)
+        if not task or task["status"] in FINAL_STATUSES:
+            remove_task_work_dir(task_id)
+
+
+class TranscriptionTimeoutError(Exception):
+    """Transcription au-delà de MAX_TRANSCRIPTION_TIME: pas de reprise"""
+
+
+def retry_from_checkpoint(task_id, error):
+    """Remet en file une tâche échouée qui a un point de reprise, dans la limite de MAX_TASK_ATTEMPTS.
+
+    Le statut "error" n'est écrit par l'appelant qu'après un refus: un client qui suit la tâche ne voit pas
+    d'erreur passagère avant la reprise.
+    """
+    task = get_task(task_id)
+    checkpoint = load_checkpoint(task_id)
+    if isinstance(error, TranscriptionTimeoutError):
+        return False
+    if not task or not checkpoint or task.get("attempts", 0) >= MAX_TASK_ATTEMPTS:
+        return False
+    logger.warning(
+        f"[CHECKPOINT] Tâche {task_id} interrompue ({error}), reprise à {checkpoint['offset']:.0f}s "
+        f"(tentative {task['attempts'] + 1}/{MAX_TASK_ATTEMPTS})"
+    )
+    requeue_task(task_id)
+    notify_queue_workers()
+    return True
+
+
+# === FICHIERS DE TRANSCRIPTION: variantes précompressées écrites une fois, servies par nginx ===
+# Variantes .gz (et .zst si le module zstandard est installé) écrites à côté du fichier, au-delà de cette taille
+TRANSCRIPTION_COMPRESS_MIN_SIZE = int(os.environ.get("TRANSCRIPTION_COMPRESS_MIN_SIZE", "1024"))
+# Content-Encoding -> extension, par ordre de préférence quand le client accepte les deux
+TRANSCRIPTION_ENCODINGS = {"zstd": ".zst", "gzip": ".gz"}
+
+
+def write_compressed_variants(path):
+    """Écrit path.gz et path.zst, chacun via un fichier temporaire renommé: jamais de variante tronquée servie.
+
+    Une variante qui ne gagne rien sur l'original n'est pas gardée. Un échec n'affecte pas la transcription.
+    """
+    for encoding, extension in TRANSCRIPTION_ENCODINGS.items():
+        variant_path = path + extension
+        if os.path.exists(variant_path):
+            os.remove(variant_path)
+        if os.path.getsize(path) < TRANSCRIPTION_COMPRESS_MIN_SIZE or (encoding == "zstd" and zstandard is None):
+            continue
+        temp_path = f"{variant_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(path, "rb") as src, open(temp_path, "wb") as dst:
+                if encoding == "zstd":
+                    zstandard.ZstdCompressor(level=19).copy_stream(src, dst)
+                else:
+                    with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=9, mtime=0) as compressed:
+                        shutil.copyfileobj(src, compressed)
+            if os.path.getsize(temp_path) < os.path.getsize(path):
+                os.replace(temp_path, variant_path)
+        except Exception as e:
+            logger.warning(f"[FILES] Variante {encoding} de {os.path.basename(path)} non écrite: {e}")
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def select_transcription_variant(path, accept_encoding):
+    """(Content-Encoding, chemin) du fichier à servir: variante précompressée acceptée par le client, sinon l'original.
+
+    Une variante plus ancienne que l'original (fichier réécrit entre-temps) est ignorée.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    mtime = os.path.getmtime(path)
+    for encoding, extension in TRANSCRIPTION_ENCODINGS.items():
+        if accepted.get(encoding, accepted.get("*", 0.0)) <= 0:
+            continue
+        variant_path = path + extension
+        if os.path.exists(variant_path) and os.path.getmtime(variant_path) >= mtime:
+            return encoding, variant_path
+    return None, path
+
+
+def save_transcription_file(task_id, audio_url, output_format, result):
+    """Écrit la transcription dans OUTPUT_DIR et remplace le texte par son URL dans le résultat.
+
+    Un rendu déjà écrit sur disque (transcription_path) est déplacé sans être relu.
+    """
+    transcription = result.get("transcription", "")
+    rendered_path = result.pop("transcription_path", None)
+    if not transcription and not rendered_path:
+        return
+    # Créer un nom de fichier basé sur l'URL et le task_id
+    audio_filename = os.path.basename(urllib.parse.urlparse(audio_url).path) or "audio"
+    audio_base = os.path.splitext(audio_filename)[0]
+    transcription_id = task_id
+    output_dir = OUTPUT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(
+        output_dir, f"{audio_base}__{transcription_id}.{output_format}"
+    )
+
+    if rendered_path:
+        shutil.move(rendered_path, output_path)
+    else:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(transcription)
+    write_compressed_variants(output_path)
+
+    # Construire l'URL de téléchargement
+    transcription_url = f"/transcriptions/{audio_base}__{transcription_id}.{output_format}"
+
+    # Modifier le résultat pour inclure l'URL du fichier
+    result["transcription_url"] = transcription_url
+    result["transcription_file"] = f"{audio_base}__{transcription_id}.{output_format}"
+    # Supprimer la transcription du résultat pour éviter de la retourner directement
+    result.pop("transcription", None)
+
+
+# === TRANSCRIPTION EN DEUX PASSES: brouillon rapide puis affinage par le modèle demandé ===
+# Avec "draft" (true ou nom de modèle), une tâche asynchrone produit d'abord un brouillon avec un petit modèle,
+# disponible aussitôt dans le statut, puis retourne dans la file pour la passe complète qui le remplace
+DEFAULT_DRAFT_MODEL = os.environ.get("DRAFT_MODEL", "base")
+DRAFT_QUALITY = os.environ.get("DRAFT_QUALITY", "fast-preview")
+# L'affinage repasse derrière les brouillons des autres tâches de même priorité
+REFINE_PRIORITY_OFFSET = int(os.environ.get("REFINE_PRIORITY_OFFSET", "1"))
+
+
+def resolve_draft_model(draft, model):
+    """Modèle du brouillon demandé par "draft", None sans brouillon (ou si c'est déjà le modèle demandé)"""
+    value = str(draft).strip().lower() if draft is not None else ""
+    if draft is False or value in ("", "0", "false", "no", "off"):
+        return None
+    draft_model = DEFAULT_DRAFT_MODEL if draft is True or value in ("1", "true", "yes", "on") else str(draft)
+    return None if draft_model == model else draft_model
+
+
+def queue_refinement(task_id):
+    """Remet en file une tâche dont le brouillon est prêt, pour la passe du modèle demandé.
+
+    L'audio (et son prétraitement) reste dans le dossier de travail: l'affinage repart du point de
+    reprise, sans nouveau téléchargement, mais avec des segments vides. Les flux /transcription-stream
+    ouverts reçoivent un événement "reset" avant les segments de l'affinage.
+    """
+    task = get_task(task_id)
+    # Phase écrite avant la remise à zéro: l'événement "reset" annonce déjà l'affinage
+    update_task(task_id, phase="refine")
+    reset_task_segments(task_id)
+    update_task(
+        task_id,
+        status="pending",
+        progress=0,
+        worker_pid=None,
+        worker_started=None,
+        started_at=None,
+        attempts=0,
+        queued_at=time.time(),
+        priority=min(9, task.get("priority", DEFAULT_PRIORITY) + REFINE_PRIORITY_OFFSET),
+    )
+    notify_queue_workers()
+    prefetch_queue()
+
+
+def run_draft_pass(task_id, draft_model, audio_url, language, output_format, word_thold, no_speech_thold,
+                   prompt, chunking, streaming, vad):
+    """Brouillon d'une tâche: petit modèle, profil rapide, audio gardé pour l'affinage.
+
+    Renvoie False si le brouillon a échoué: la tâche continue directement avec la passe complète.
+    """
+    update_task(task_id, phase="draft")
+    logger.info(f"[DRAFT] Tâche {task_id} : brouillon avec le modèle {draft_model}")
+    try:
+        draft = run_whisper_transcription(
+            audio_url,
+            language,
+            draft_model,
+            output_format,
+            word_thold,
+            no_speech_thold,
+            prompt,
+            logger,
+            task_id=task_id,
+            chunking=chunking,
+            streaming=streaming,
+            vad=vad,
+            quality=DRAFT_QUALITY,
+            keep_audio=True,
+        )
+        if not draft.get("success"):
+            raise Exception(draft.get("error", "Erreur inconnue"))
+    except Exception as e:
+        logger.warning(f"[DRAFT] Tâche {task_id} : brouillon impossible, passe complète directe : {e}")
+        update_task(task_id, phase="refine", draft={"error": str(e)})
+        return False
+    save_transcription_file(f"{task_id}-draft", audio_url, output_format, draft)
+    update_task(task_id, draft=draft)
+    logger.info(f"[DRAFT] Tâche {task_id} : brouillon prêt en {draft['processing_time']:.1f}s, affinage en file")
+    queue_refinement(task_id)
+    return True
+
+
 # Fonction worker pour la transcription asynchrone
 def async_transcription_worker(
     task_id,
@@ -139,81 +1300,678 @@ def async_transcription_worker(
     word_thold=0.005,
     no_speech_thold=0.40,
     prompt=None,
+    chunking=None,
+    streaming=None,
+    vad=None,
+    profile=None,
+    quality=None,
+    decoding=None,
+    draft=None,
 ):
-    global ACTIVE_TRANSCRIPTIONS
     try:
         logger.info(
             f"[ASYNC] Tâche {task_id} : Démarrage de la transcription asynchrone"
         )
         update_task_progress(task_id, 5, "processing")
 
+        # Première passe d'une tâche en deux passes, sauf si le résultat final est déjà en cache
+        task = get_task(task_id)
+        draft_model = resolve_draft_model(draft, model) if task.get("phase") != "refine" else None
+        if draft_model and not has_cached_result_for_url(task["params"]):
+            if run_draft_pass(task_id, draft_model, audio_url, language, output_format, word_thold,
+                              no_speech_thold, prompt, chunking, streaming, vad):
+                return
+
         try:
             logger.info(
                 f"[ASYNC] Tâche {task_id} : Appel à run_whisper_transcription..."
             )
-            result = run_whisper_transcription(
-                audio_url,
-                language,
-                model,
-                output_format,
-                word_thold,
-                no_speech_thold,
-                prompt,
-                logger,
-                task_id=task_id,
-            )
-            logger.info(f"[ASYNC] Tâche {task_id} : run_whisper_transcription terminé")
+            with profile_task(task_id, is_profiling_requested(profile)) as profile_summary:
+                result = run_whisper_transcription(
+                    audio_url,
+                    language,
+                    model,
+                    output_format,
+                    word_thold,
+                    no_speech_thold,
+                    prompt,
+                    logger,
+                    task_id=task_id,
+                    chunking=chunking,
+                    streaming=streaming,
+                    vad=vad,
+                    quality=quality,
+                    decoding=decoding,
+                )
+                logger.info(f"[ASYNC] Tâche {task_id} : run_whisper_transcription terminé")
+
+                if result.get("success"):
+                    # Créer un fichier de transcription comme dans l'endpoint /transcribe/file
+                    save_transcription_file(task_id, audio_url, output_format, result)
 
             if result.get("success"):
-                # Créer un fichier de transcription comme dans l'endpoint /transcribe/file
-                transcription = result.get("transcription", "")
-                if transcription:
-                    # Créer un nom de fichier basé sur l'URL et le task_id
-                    audio_filename = os.path.basename(urllib.parse.urlparse(audio_url).path) or "audio"
-                    audio_base = os.path.splitext(audio_filename)[0]
-                    transcription_id = task_id
-                    output_dir = "/var/log/whisper"
-                    os.makedirs(output_dir, exist_ok=True)
-                    output_path = os.path.join(
-                        output_dir, f"{audio_base}__{transcription_id}.{output_format}"
-                    )
-                    
-                    with open(output_path, "w", encoding="utf-8") as f:
-                        f.write(transcription)
-                    
-                    # Construire l'URL de téléchargement
-                    transcription_url = f"/transcriptions/{audio_base}__{transcription_id}.{output_format}"
-                    
-                    # Modifier le résultat pour inclure l'URL du fichier
-                    result["transcription_url"] = transcription_url
-                    result["transcription_file"] = f"{audio_base}__{transcription_id}.{output_format}"
-                    # Supprimer la transcription du résultat pour éviter de la retourner directement
-                    result.pop("transcription", None)
-                
+                if profile_summary:
+                    result["profile"] = profile_summary
+                update_task(task_id, result=result)
                 update_task_progress(task_id, 100, "completed")
-                ASYNC_TASKS[task_id]["result"] = result
             else:
+                update_task(task_id, result=result.get("error", "Erreur inconnue"))
                 update_task_progress(task_id, 100, "error")
-                ASYNC_TASKS[task_id]["result"] = result.get("error", "Erreur inconnue")
 
         except Exception as e:
             logger.error(
                 f"[ASYNC] Tâche {task_id} : Exception dans run_whisper_transcription : {e}"
             )
+            if retry_from_checkpoint(task_id, e):
+                return
+            update_task(task_id, result=str(e))
             update_task_progress(task_id, 100, "error")
-            ASYNC_TASKS[task_id]["result"] = str(e)
 
     except Exception as e:
         logger.error(f"[ASYNC] Tâche {task_id} : Erreur générale : {e}")
+        update_task(task_id, result=str(e))
         update_task_progress(task_id, 100, "error")
-        ASYNC_TASKS[task_id]["result"] = str(e)
     finally:
         logger.info(f"[ASYNC] Tâche {task_id} : Thread terminé")
-        ACTIVE_TRANSCRIPTIONS -= 1
+
+
+# === PROFILAGE DES TÂCHES (cProfile, sur demande) ===
+# Avec "profile": true dans la requête (ou PROFILE_TASKS=true pour toutes), le travail Python du
+# thread de la tâche est profilé; le fichier pstats reste disponible sur /transcription-profile
+PROFILE_TASKS = os.environ.get("PROFILE_TASKS", "false").lower() == "true"
+PROFILE_DIR = os.path.join(STATE_DIR, "profiles")
+PROFILE_TOP_FUNCTIONS = 15
+
+
+def get_profile_path(task_id):
+    return os.path.join(PROFILE_DIR, f"{task_id}.prof")
+
+
+def summarize_profile(profiler):
+    """Fonctions les plus coûteuses (temps cumulé), pour le résultat et le statut"""
+    stats = pstats.Stats(profiler)
+    top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+    return {
+        "total_seconds": round(stats.total_tt, 3),
+        "calls": stats.total_calls,
+        "top": [
+            {
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "own_seconds": round(own, 3),
+                "cumulative_seconds": round(cumulative, 3),
+            }
+            for (filename, line, name), (_, calls, own, cumulative, _) in top
+        ],
+    }
+
+
+@contextlib.contextmanager
+def profile_task(task_id, enabled):
+    """Profile le bloc si enabled; le dictionnaire produit est rempli en sortie (résumé + URL)"""
+    profile = {}
+    if not enabled:
+        yield profile
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Python 3.12+: un seul profileur actif par processus, une autre tâche profilée le tient déjà
+        logger.warning(f"[PROFILE] Tâche {task_id} transcrite sans profil: {e}")
+        yield profile
+        return
+    try:
+        yield profile
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(get_profile_path(task_id))
+            profile.update(summarize_profile(profiler), url=f"/transcription-profile/{task_id}")
+            update_task(task_id, profile=profile)
+            logger.info(f"[PROFILE] Tâche {task_id}: {profile['total_seconds']}s de Python profilées")
+        except Exception as e:
+            logger.warning(f"[PROFILE] Profil de la tâche {task_id} non enregistré: {e}")
+
+
+def is_profiling_requested(value):
+    return PROFILE_TASKS if value is None else str(value).lower() in ("1", "true", "yes", "on")
+
+
+# === CONCURRENCE ADAPTATIVE: nombre de transcriptions et threads selon la marge CPU et mémoire ===
+# Nombre fixe (défaut: 1), par processus: sous gunicorn, chaque worker en lance autant. Avec "auto", le
+# contrôleur choisit entre 1 et EFFECTIVE_CPU_COUNT // MIN_ENGINE_THREADS transcriptions simultanées
+CONCURRENCY_SETTING = os.environ.get("MAX_CONCURRENT_TRANSCRIPTIONS", "1").strip().lower()
+MIN_ENGINE_THREADS = int(os.environ.get("MIN_ENGINE_THREADS", "2"))  # En dessous, whisper.cpp perd plus qu'il ne gagne
+CONCURRENCY_ADJUST_INTERVAL = int(os.environ.get("CONCURRENCY_ADJUST_INTERVAL", "15"))
+CPU_SATURATION_TARGET = float(os.environ.get("CPU_SATURATION_TARGET", "85"))  # % des cœurs effectifs
+MEMORY_RESERVE_MB = int(os.environ.get("MEMORY_RESERVE_MB", "512"))  # Marge gardée libre avant le OOM killer
+MEMORY_RESERVATION_TTL = 60  # Modèle d'une tâche admise pas encore chargé: son estimation est réservée
+RTF_SMOOTHING = 0.3  # Moyenne mobile exponentielle des facteurs temps réel
+RTF_MAX_AGE = 1800  # Mesures plus anciennes oubliées: le contrôleur peut réessayer un niveau écarté
+THROUGHPUT_TOLERANCE = 0.95  # Un niveau de plus doit faire mieux que 95% du débit du niveau inférieur
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def read_cgroup_file(*names):
+    """Contenu du premier fichier cgroup lisible (v2 puis v1), None hors conteneur"""
+    for name in names:
+        try:
+            with open(os.path.join(CGROUP_ROOT, name)) as f:
+                return f.read().strip()
+        except OSError:
+            continue
+    return None
+
+
+def get_effective_cpu_count():
+    """Cœurs réellement utilisables: affinité du processus, bornée par le quota CPU du conteneur"""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    quota = read_cgroup_file("cpu.max")
+    if quota:
+        limit, period = (quota.split() + ["100000"])[:2]
+    else:
+        limit = read_cgroup_file("cpu/cpu.cfs_quota_us", "cpu,cpuacct/cpu.cfs_quota_us")
+        period = read_cgroup_file("cpu/cpu.cfs_period_us", "cpu,cpuacct/cpu.cfs_period_us")
+    if limit and period and limit not in ("max", "-1"):
+        count = min(count, max(1, math.ceil(int(limit) / int(period))))
+    return count
+
+
+def parse_concurrency_setting(value, cpu_count):
+    """(adaptatif, maximum de transcriptions) d'après MAX_CONCURRENT_TRANSCRIPTIONS; invalide: 1, signalé"""
+    if value == "auto":
+        return True, max(1, cpu_count // max(1, MIN_ENGINE_THREADS))
+    if value.isdigit() and int(value) >= 1:
+        return False, int(value)
+    logger.warning(
+        f"[CONCURRENCY] MAX_CONCURRENT_TRANSCRIPTIONS invalide ({value!r}, attendu: auto ou un entier >= 1): "
+        f"une transcription à la fois"
+    )
+    return False, 1
+
+
+EFFECTIVE_CPU_COUNT = get_effective_cpu_count()
+ADAPTIVE_CONCURRENCY, MAX_CONCURRENT_TRANSCRIPTIONS = parse_concurrency_setting(CONCURRENCY_SETTING, EFFECTIVE_CPU_COUNT)
+
+CONCURRENCY_CONDITION = threading.Condition()
+CONCURRENCY = {
+    "target": 1 if ADAPTIVE_CONCURRENCY else MAX_CONCURRENT_TRANSCRIPTIONS,
+    "active": 0,
+    "reservations": {},  # task_id -> (mémoire estimée en MB, heure d'admission)
+    "rtf": {},  # (modèle, concurrence) -> (facteur temps réel lissé, heure de mesure)
+    "last_model": None,
+    "reason": "démarrage",
+    "cpu_percent": None,
+    "memory_headroom_mb": None,
+}
+_worker_context = threading.local()  # Concurrence sous laquelle la tâche du worker a été admise
+_cpu_sample = {}
+
+
+def get_cpu_saturation():
+    """Part des cœurs effectifs utilisée depuis la lecture précédente (%), cgroup si disponible"""
+    stat = read_cgroup_file("cpu.stat")
+    usage_us = None
+    if stat:
+        usage_us = next((int(line.split()[1]) for line in stat.splitlines() if line.startswith("usage_usec")), None)
+    else:
+        usage_ns = read_cgroup_file("cpuacct/cpuacct.usage", "cpu,cpuacct/cpuacct.usage")
+        usage_us = int(usage_ns) // 1000 if usage_ns else None
+    if usage_us is None:
+        # Hors conteneur: charge de la machine entière
+        return psutil.cpu_percent(interval=None)
+    now = time.time()
+    previous = _cpu_sample.get("cgroup")
+    _cpu_sample["cgroup"] = (now, usage_us)
+    if not previous or now <= previous[0]:
+        return None
+    return (usage_us - previous[1]) / 1e6 / (now - previous[0]) / EFFECTIVE_CPU_COUNT * 100
+
+
+def get_memory_limit_mb():
+    """Mémoire totale utilisable: celle de la machine, bornée par la limite du conteneur"""
+    total = psutil.virtual_memory().total / 1024 / 1024
+    limit = read_cgroup_file("memory.max", "memory/memory.limit_in_bytes")
+    if limit and limit != "max" and int(limit) < 2 ** 60:
+        total = min(total, int(limit) / 1024 / 1024)
+    return total
+
+
+def get_memory_headroom_mb():
+    """Mémoire encore utilisable avant le OOM killer: disponible sur la machine, bornée par la limite du conteneur"""
+    headroom = psutil.virtual_memory().available / 1024 / 1024
+    limit = read_cgroup_file("memory.max", "memory/memory.limit_in_bytes")
+    usage = read_cgroup_file("memory.current", "memory/memory.usage_in_bytes")
+    if limit and usage and limit != "max" and int(limit) < 2 ** 60:
+        # Le cache de pages inactif est récupérable avant un OOM: seul le reste compte
+        stat = read_cgroup_file("memory.stat", "memory/memory.stat") or ""
+        inactive = next(
+            (int(line.split()[1]) for line in stat.splitlines()
+             if line.split()[0] in ("inactive_file", "total_inactive_file")),
+            0,
+        )
+        headroom = min(headroom, (int(limit) - int(usage) + inactive) / 1024 / 1024)
+    return headroom
+
+
+def estimate_task_memory_mb(task):
+    """Mémoire d'une transcription: le modèle demandé (ou celui de repli) chargé par whisper-cli"""
+    model_path = f"{WHISPER_PATH}/models/ggml-{(task or {}).get('params', {}).get('model', 'base')}.bin"
+    if not os.path.exists(model_path):
+        model_path = MODEL_PATH
+    return estimate_model_memory_mb(model_path)
+
+
+def get_task_cpu_budget():
+    """Threads CPU d'une transcription: les cœurs partagés entre les transcriptions visées"""
+    return max(1, CPU_THREADS_BUDGET // max(1, CONCURRENCY["target"]))
+
+
+def acquire_transcription_slot():
+    """Bloque tant que la concurrence visée est atteinte, puis réserve une place"""
+    with CONCURRENCY_CONDITION:
+        while CONCURRENCY["active"] >= CONCURRENCY["target"]:
+            CONCURRENCY_CONDITION.wait(timeout=QUEUE_POLL_INTERVAL)
+        CONCURRENCY["active"] += 1
+        _worker_context.concurrency = CONCURRENCY["target"]
+
+
+def release_transcription_slot(task_id=None):
+    with CONCURRENCY_CONDITION:
+        CONCURRENCY["active"] -= 1
+        CONCURRENCY["reservations"].pop(task_id, None)
+        _worker_context.concurrency = None
+        CONCURRENCY_CONDITION.notify_all()
+
+
+def admit_task_memory(task_id):
+    """Garde mémoire: la tâche ne démarre que si son modèle tient dans la marge restante.
+
+    Les tâches admises depuis moins de MEMORY_RESERVATION_TTL n'ont pas encore chargé leur modèle:
+    leur estimation est déduite de la marge mesurée. Seule transcription en cours: toujours admise.
+    """
+    needed_mb = estimate_task_memory_mb(get_task(task_id))
+    with CONCURRENCY_CONDITION:
+        now = time.time()
+        reservations = CONCURRENCY["reservations"]
+        for other_id, (_, admitted_at) in list(reservations.items()):
+            if now - admitted_at > MEMORY_RESERVATION_TTL:
+                del reservations[other_id]
+        headroom_mb = get_memory_headroom_mb() - sum(mb for mb, _ in reservations.values())
+        if needed_mb > headroom_mb - MEMORY_RESERVE_MB and CONCURRENCY["active"] > 1:
+            logger.warning(
+                f"[CONCURRENCY] Tâche {task_id} retenue: {needed_mb}MB requis, {headroom_mb:.0f}MB de marge "
+                f"(réserve {MEMORY_RESERVE_MB}MB, {CONCURRENCY['active'] - 1} transcription(s) en cours)"
+            )
+            return False
+        reservations[task_id] = (needed_mb, now)
+        return True
+
+
+def record_realtime_factor(model, realtime_factor):
+    """Facteur temps réel d'une transcription, rattaché à la concurrence sous laquelle elle a tourné"""
+    concurrency = getattr(_worker_context, "concurrency", None)
+    if not concurrency:
+        return
+    with CONCURRENCY_CONDITION:
+        key = (model, concurrency)
+        previous = CONCURRENCY["rtf"].get(key)
+        if previous and time.time() - previous[1] < RTF_MAX_AGE:
+            realtime_factor = previous[0] + RTF_SMOOTHING * (realtime_factor - previous[0])
+        CONCURRENCY["rtf"][key] = (realtime_factor, time.time())
+        CONCURRENCY["last_model"] = model
+
+
+def get_throughput(model, concurrency):
+    """Secondes d'audio transcrites par seconde à ce niveau de concurrence, None sans mesure récente"""
+    measure = CONCURRENCY["rtf"].get((model, concurrency))
+    if not measure or time.time() - measure[1] > RTF_MAX_AGE or measure[0] <= 0:
+        return None
+    return concurrency / measure[0]
+
+
+def adjust_concurrency():
+    """Un pas du contrôleur: recule sous pression mémoire ou si le débit baisse, avance si le CPU a de la marge"""
+    cpu = get_cpu_saturation()
+    headroom_mb = get_memory_headroom_mb()
+    pending = get_queue_length()
+    with CONCURRENCY_CONDITION:
+        target = CONCURRENCY["target"]
+        model = CONCURRENCY["last_model"]
+        current = get_throughput(model, target)
+        lower = get_throughput(model, target - 1)
+        upper = get_throughput(model, target + 1)
+        largest_mb = max([mb for mb, _ in CONCURRENCY["reservations"].values()] or [estimate_task_memory_mb(None)])
+        CONCURRENCY["cpu_percent"] = None if cpu is None else round(cpu, 1)
+        CONCURRENCY["memory_headroom_mb"] = int(headroom_mb)
+
+        new_target, reason = target, CONCURRENCY["reason"]
+        if headroom_mb < MEMORY_RESERVE_MB and target > 1:
+            new_target, reason = target - 1, f"mémoire ({headroom_mb:.0f}MB de marge)"
+        elif current and lower and current < lower * THROUGHPUT_TOLERANCE:
+            new_target, reason = target - 1, f"débit en baisse ({current:.1f} contre {lower:.1f}s d'audio/s)"
+        elif (
+            target < MAX_CONCURRENT_TRANSCRIPTIONS
+            and pending > 0
+            and CONCURRENCY["active"] >= target
+            and cpu is not None and cpu < CPU_SATURATION_TARGET
+            and headroom_mb - MEMORY_RESERVE_MB >= largest_mb
+            and not (upper and current and upper < current * (2 - THROUGHPUT_TOLERANCE))
+        ):
+            new_target, reason = target + 1, f"CPU à {cpu:.0f}%, {pending} tâche(s) en attente"
+
+        if new_target != target:
+            CONCURRENCY["target"], CONCURRENCY["reason"] = new_target, reason
+            CONCURRENCY_CONDITION.notify_all()
+            logger.info(
+                f"[CONCURRENCY] {target} -> {new_target} transcription(s) simultanée(s), "
+                f"{get_task_cpu_budget()} threads chacune: {reason}"
+            )
+
+
+def concurrency_controller_loop():
+    logger.info(
+        f"[CONCURRENCY] Contrôleur démarré: 1 à {MAX_CONCURRENT_TRANSCRIPTIONS} transcriptions, "
+        f"{EFFECTIVE_CPU_COUNT} cœurs effectifs, réserve mémoire {MEMORY_RESERVE_MB}MB"
+    )
+    get_cpu_saturation()  # Première lecture: référence de la mesure suivante
+    while True:
+        time.sleep(CONCURRENCY_ADJUST_INTERVAL)
+        try:
+            adjust_concurrency()
+        except Exception as e:
+            logger.warning(f"[CONCURRENCY] Ajustement impossible: {e}")
+
+
+def get_concurrency_status():
+    """État du contrôleur pour /tasks et /metrics"""
+    with CONCURRENCY_CONDITION:
+        return {
+            "mode": "auto" if ADAPTIVE_CONCURRENCY else "fixed",
+            "target": CONCURRENCY["target"],
+            "active": CONCURRENCY["active"],
+            "max": MAX_CONCURRENT_TRANSCRIPTIONS,
+            "threads_per_transcription": get_task_cpu_budget(),
+            "cpu_percent": CONCURRENCY["cpu_percent"],
+            "memory_headroom_mb": CONCURRENCY["memory_headroom_mb"],
+            "reason": CONCURRENCY["reason"],
+            "realtime_factors": {
+                f"{model}@{concurrency}": round(rtf, 4)
+                for (model, concurrency), (rtf, _) in sorted(CONCURRENCY["rtf"].items())
+            },
+        }
+
+
+# === FILE D'ATTENTE ET POOL DE WORKERS ===
+def notify_queue_workers():
+    """Réveille les workers locaux quand une tâche arrive dans la file"""
+    with TASK_QUEUE_CONDITION:
+        TASK_QUEUE_CONDITION.notify_all()
+
+
+def get_queue_position(task_id):
+    """Position (1 = prochaine) d'une tâche dans la file, None si absente"""
+    row = get_db().execute(
+        "SELECT rowid, priority, queued_at FROM tasks WHERE task_id = ? AND status = 'pending'",
+        (task_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return get_db().execute(
+        "SELECT COUNT(*) FROM tasks WHERE status = 'pending' AND (priority < ? "
+        "OR (priority = ? AND (queued_at < ? OR (queued_at = ? AND rowid <= ?))))",
+        (row["priority"], row["priority"], row["queued_at"], row["queued_at"], row["rowid"]),
+    ).fetchone()[0]
+
+
+def get_queue_length():
+    """Nombre de tâches en attente, tous processus confondus"""
+    return count_tasks(statuses=["pending"])
+
+
+def get_average_task_duration():
+    """Durée moyenne des 20 dernières transcriptions terminées (secondes)"""
+    row = get_db().execute(
+        "SELECT AVG(duration) FROM (SELECT duration FROM tasks WHERE status = 'completed' "
+        "AND duration IS NOT NULL ORDER BY finished_at DESC LIMIT 20)"
+    ).fetchone()
+    if row[0] is None:
+        return DEFAULT_TASK_DURATION_ESTIMATE
+    return row[0]
+
+
+def estimate_queue_eta(queue_position):
+    """Estime le délai avant la fin d'une tâche en attente à la position donnée"""
+    workers = max(CONCURRENCY["target"], 1)
+    # La tâche démarre après (position - 1) // workers vagues, puis dure une moyenne
+    waves = (queue_position - 1) // workers + 1
+    return int(waves * get_average_task_duration())
+
+
+def run_queued_task(task_id):
+    """Exécute une tâche sortie de la file (synchrone ou asynchrone)"""
+    task = get_task(task_id)
+    if not task:
+        logger.warning(f"[QUEUE] Tâche {task_id} introuvable, ignorée")
+        return
+    params = task["params"]
+    # Préparer les tâches suivantes pendant celle-ci
+    prefetch_queue()
+
+    if not task.get("sync"):
+        async_transcription_worker(task_id, **params)
+        return
+
+    # Tâche synchrone: le résultat est conservé pour l'endpoint /transcribe, le texte reste dans son fichier
+    try:
+        with profile_task(task_id, is_profiling_requested(params.get("profile"))) as profile_summary:
+            result = run_whisper_transcription(
+                params["audio_url"],
+                params["language"],
+                params["model"],
+                params["output_format"],
+                params["word_thold"],
+                params["no_speech_thold"],
+                params["prompt"],
+                logger,
+                task_id=task_id,
+                chunking=params.get("chunking"),
+                streaming=params.get("streaming"),
+                vad=params.get("vad"),
+                quality=params.get("quality"),
+                decoding=params.get("decoding"),
+            )
+        if profile_summary:
+            result["profile"] = profile_summary
+        update_task(task_id, result=result)
+        update_task_progress(task_id, 100, "completed")
+    except Exception as e:
+        logger.error(f"[QUEUE] Tâche synchrone {task_id} : {e}")
+        if retry_from_checkpoint(task_id, e):
+            return
+        update_task(task_id, result=str(e))
+        update_task_progress(task_id, 100, "error")
+
+
+def queue_worker_loop(worker_index):
+    """Boucle d'un worker: consomme la file par priorité puis ordre d'arrivée"""
+    logger.info(f"[QUEUE] Worker {worker_index} démarré (PID {os.getpid()})")
+    while True:
+        # Au-delà de la concurrence visée par le contrôleur, le worker attend sans rien réserver
+        acquire_transcription_slot()
+        try:
+            task_id = claim_next_task()
+        except Exception as e:
+            logger.error(f"[QUEUE] Worker {worker_index} : lecture de la file impossible : {e}")
+            task_id = None
+        if task_id is None:
+            release_transcription_slot()
+            with TASK_QUEUE_CONDITION:
+                TASK_QUEUE_CONDITION.wait(timeout=QUEUE_POLL_INTERVAL)
+            continue
+        if not admit_task_memory(task_id):
+            # Pas assez de marge mémoire: la tâche garde sa place, on attend la fin d'une autre
+            unclaim_task(task_id)
+            release_transcription_slot(task_id)
+            with CONCURRENCY_CONDITION:
+                CONCURRENCY_CONDITION.wait(timeout=QUEUE_POLL_INTERVAL)
+            continue
+
+        start = time.time()
+        try:
+            run_queued_task(task_id)
+        except Exception as e:
+            logger.error(f"[QUEUE] Worker {worker_index} : erreur sur la tâche {task_id} : {e}")
+            update_task(task_id, result=str(e))
+            update_task_progress(task_id, 100, "error")
+        finally:
+            release_transcription_slot(task_id)
+            task = get_task(task_id)
+            # Brouillon terminé ou reprise: la tâche est de retour dans la file, sa durée (base de l'ETA)
+            # n'est enregistrée qu'à la fin de la dernière passe
+            if task and task["status"] in FINAL_STATUSES:
+                update_task(
+                    task_id,
+                    finished_at=datetime.now().isoformat(),
+                    duration=time.time() - start,
+                )
+                increment_metric("whisper_tasks_total", status=task["status"])
+
+
+def start_queue_workers():
+    """Démarre le pool de workers (idempotent)"""
+    with TASK_QUEUE_CONDITION:
+        while len(QUEUE_WORKERS) < MAX_CONCURRENT_TRANSCRIPTIONS:
+            worker = threading.Thread(
+                target=queue_worker_loop,
+                args=(len(QUEUE_WORKERS),),
+                name=f"whisper-worker-{len(QUEUE_WORKERS)}",
+            )
+            worker.daemon = True
+            worker.start()
+            QUEUE_WORKERS.append(worker)
+
+
+_background_services_started = False
+_background_services_lock = threading.Lock()
+
+
+def start_background_services():
+    """Au démarrage du processus: reprise des tâches interrompues puis pool de workers"""
+    global _background_services_started
+    with _background_services_lock:
+        if _background_services_started:
+            return
+        _background_services_started = True
+    requeued = requeue_interrupted_tasks()
+    if requeued:
+        logger.info(f"[STORE] {len(requeued)} tâche(s) interrompue(s) remise(s) en file")
+    cleanup_task_work_dirs()
+    cleanup_stale_uploads()
+    start_queue_workers()
+    if ADAPTIVE_CONCURRENCY:
+        controller = threading.Thread(target=concurrency_controller_loop, name="concurrency-controller")
+        controller.daemon = True
+        controller.start()
+    if PRELOAD_MODELS and WHISPER_ENGINE != "cli":
+        preloader = threading.Thread(target=preload_models, name="model-preloader")
+        preloader.daemon = True
+        preloader.start()
+
+
+def parse_priority(value):
+    """Valide le champ priority d'une requête (0-9)"""
+    if value is None:
+        return DEFAULT_PRIORITY
+    priority = int(value)
+    if not 0 <= priority <= 9:
+        raise ValueError("priority doit être compris entre 0 et 9")
+    return priority
+
+
+def create_queued_task(params, priority, sync=False, batch_id=None, audio=None, notify=True):
+    """Crée une tâche en attente et la place dans la file.
+
+    audio: fichier déjà sur disque (téléversement, voir UploadSpoolFile.as_audio), placé en point de
+    reprise de la tâche avant qu'elle n'entre dans la file
+    notify: False pour un lot, qui réveille les workers et lance la préparation anticipée une seule fois
+    """
+    task_id = str(uuid.uuid4())
+    if audio:
+        os.makedirs(get_task_work_dir(task_id), exist_ok=True)
+        audio_path = os.path.join(get_task_work_dir(task_id), os.path.basename(audio["audio_path"]))
+        os.replace(audio["audio_path"], audio_path)
+        save_checkpoint(task_id, **dict(audio, audio_url=params["audio_url"], audio_path=audio_path))
+    store_create_task(
+        {
+            "task_id": task_id,
+            "status": "pending",
+            "result": None,
+            "progress": 0,
+            "created_at": datetime.now().isoformat(),
+            "queued_at": time.time(),
+            "priority": priority,
+            "params": params,
+            "sync": int(sync),
+            "batch_id": batch_id,
+        }
+    )
+    logger.info(f"[QUEUE] Tâche {task_id} en file (priorité {priority}, {get_queue_length()} en attente)")
+    start_background_services()
+    if notify:
+        notify_queue_workers()
+        prefetch_queue()
+    return task_id
+
+
+def create_completed_task(params, priority, result, batch_id=None):
+    """Enregistre une tâche déjà terminée (résultat servi par le cache)"""
+    task_id = str(uuid.uuid4())
+    save_transcription_file(task_id, params["audio_url"], params["output_format"], result)
+    now = datetime.now().isoformat()
+    store_create_task(
+        {
+            "task_id": task_id,
+            "status": "completed",
+            "result": result,
+            "progress": 100,
+            "created_at": now,
+            "started_at": now,
+            "finished_at": now,
+            "priority": priority,
+            "params": params,
+            "batch_id": batch_id,
+        }
+    )
+    return task_id
+
+
+def get_queue_info(task_id, task):
+    """Position dans la file et ETA (secondes) pour une tâche"""
+    info = {}
+    if task["status"] == "pending":
+        position = get_queue_position(task_id)
+        if position is not None:
+            info["queue_position"] = position
+            info["eta_seconds"] = estimate_queue_eta(position)
+    elif task["status"] not in FINAL_STATUSES and task.get("eta_at"):
+        # ETA mesurée sur la position atteinte dans l'audio
+        info["eta_seconds"] = max(int(task["eta_at"] - time.time()), 0)
+    elif task["status"] not in FINAL_STATUSES and task.get("started_at"):
+        elapsed = (datetime.now() - datetime.fromisoformat(task["started_at"])).total_seconds()
+        info["eta_seconds"] = max(int(get_average_task_duration() - elapsed), 0)
+    if "eta_seconds" in info:
+        info["estimated_completion"] = datetime.fromtimestamp(time.time() + info["eta_seconds"]).isoformat()
+    return info
 
 
 # Fonction utilitaire pour nettoyer les fichiers de plus de 24h
-def cleanup_old_transcriptions(output_dir="/var/log/whisper", max_age_hours=24):
+def cleanup_old_transcriptions(output_dir=OUTPUT_DIR, max_age_hours=24):
     now = time.time()
     if not os.path.exists(output_dir):
         return
@@ -228,41 +1986,1969 @@ def cleanup_old_transcriptions(output_dir="/var/log/whisper", max_age_hours=24):
                     logger.warning(f"Impossible de supprimer {file_path}: {e}")
 
 
-# Fonction utilitaire pour construire la commande whisper-cli
-def build_whisper_cmd(
-    whisper_path,
-    model_path,
-    temp_file_path,
+# === PROFILS VITESSE / QUALITÉ: options de décodage de whisper.cpp ===
+# threads (défaut: part des cœurs donnée par le contrôleur de concurrence), processors (-p: découpe l'audio
+# entre plusieurs décodeurs d'un même processus), beam_size / best_of (-bs / -bo, 1 = glouton),
+# temperature / temperature_inc (-tp / -tpi, 0 = pas de nouvel essai à température plus haute quand un
+# segment échoue), max_context (-mc, 0 = segments décodés sans le texte précédent), flash_attn (-fa)
+DECODING_OPTIONS = {
+    "threads": int,
+    "processors": int,
+    "beam_size": int,
+    "best_of": int,
+    "temperature": float,
+    "temperature_inc": float,
+    "max_context": int,
+    "flash_attn": bool,
+}
+# Options sans effet sur le texte produit: hors de la clé de cache
+DECODING_PERFORMANCE_OPTIONS = ["threads", "flash_attn"]
+QUALITY_PROFILES = {
+    # Aperçu rapide: décodage glouton sans repli, deux décodeurs en parallèle
+    "fast-preview": {"processors": 2, "beam_size": 1, "best_of": 1, "temperature_inc": 0.0, "max_context": 0,
+                     "flash_attn": True},
+    # Réglages par défaut de whisper-cli: ligne de commande inchangée
+    "balanced": {},
+    # Archivage: recherche plus large, repli en température sur les segments difficiles
+    "archival": {"beam_size": 8, "best_of": 8, "temperature_inc": 0.2},
+}
+# Profils ajoutés ou remplacés par configuration, ex: {"premium": {"beam_size": 6, "best_of": 6}}
+QUALITY_PROFILES.update(json.loads(os.environ.get("QUALITY_PROFILES", "{}")))
+DEFAULT_QUALITY = os.environ.get("DEFAULT_QUALITY", "balanced")
+
+
+def resolve_decoding_options(quality=None, overrides=None):
+    """Options de décodage d'une requête: profil nommé puis options explicites. ValueError si invalides"""
+    quality = quality or DEFAULT_QUALITY
+    if quality not in QUALITY_PROFILES:
+        raise ValueError(f"quality invalide, valeurs possibles: {', '.join(QUALITY_PROFILES)}")
+    if overrides is not None and not isinstance(overrides, dict):
+        raise ValueError("decoding doit être un objet")
+    options = {}
+    for name, value in dict(QUALITY_PROFILES[quality], **(overrides or {})).items():
+        if name not in DECODING_OPTIONS:
+            raise ValueError(f"Option de décodage inconnue: {name} ({', '.join(DECODING_OPTIONS)})")
+        if value is None:
+            continue
+        try:
+            if DECODING_OPTIONS[name] is bool:
+                value = value if isinstance(value, bool) else str(value).lower() in ("1", "true", "yes", "on")
+            else:
+                value = DECODING_OPTIONS[name](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Option de décodage {name} invalide: {value!r}")
+        if DECODING_OPTIONS[name] is int and value < (0 if name == "max_context" else 1):
+            raise ValueError(f"Option de décodage {name} invalide: {value}")
+        options[name] = value
+    return options
+
+
+def get_decoding_signature(options):
+    """Options de décodage qui changent le texte produit (clé de cache)"""
+    return {name: value for name, value in sorted(options.items()) if name not in DECODING_PERFORMANCE_OPTIONS}
+
+
+# Fonction utilitaire pour construire la commande whisper-cli
+def build_whisper_cmd(
+    whisper_path,
+    model_path,
+    temp_file_path,
+    language,
+    output_format,
+    no_timestamps=False,
+    word_thold=0.005,
+    no_speech_thold=0.40,
+    prompt=None,
+    threads=None,
+    offset=None,
+    decoding=None,
+):
+    decoding = decoding or {}
+    cmd = [
+        f"{whisper_path}/build/bin/whisper-cli",
+        "-m",
+        model_path,
+        "-f",
+        temp_file_path,
+        "-l",
+        language,
+        f"-o{output_format}",
+        "--word-thold",
+        str(word_thold),
+        "--no-speech-thold",
+        str(no_speech_thold),
+    ]
+    if prompt:
+        cmd.extend(["--prompt", prompt])
+    threads = decoding.get("threads") or threads
+    if threads:
+        cmd.extend(["-t", str(threads)])
+    for option, flag in (("processors", "-p"), ("beam_size", "-bs"), ("best_of", "-bo"), ("temperature", "-tp"),
+                         ("temperature_inc", "-tpi"), ("max_context", "-mc")):
+        if decoding.get(option) is not None:
+            cmd.extend([flag, str(decoding[option])])
+    if decoding.get("flash_attn"):
+        cmd.append("-fa")
+    if offset:
+        # Reprise: whisper-cli commence à cette position (ms) et garde des horodatages absolus
+        cmd.extend(["--offset-t", str(int(offset * 1000))])
+    if no_timestamps and output_format == "txt":
+        cmd.append("--no-timestamps")
+    return cmd
+
+
+# === TÉLÉCHARGEMENTS ET LOTS DE TRANSCRIPTIONS (/transcribe-batch) ===
+# Une session HTTP partagée (connexions réutilisées) pour tous les téléchargements d'audio. Les
+# tâches d'un lot sont ordonnées en alternant fichiers longs et courts
+BATCH_MAX_JOBS = int(os.environ.get("BATCH_MAX_JOBS", "500"))
+BATCH_DOWNLOAD_WORKERS = int(os.environ.get("BATCH_DOWNLOAD_WORKERS", "4"))
+DOWNLOAD_PARTS = int(os.environ.get("DOWNLOAD_PARTS", "4"))  # Parties parallèles si le serveur accepte Range
+DOWNLOAD_PART_MIN_SIZE = 8 * 1024 * 1024
+DOWNLOAD_RETRIES = int(os.environ.get("DOWNLOAD_RETRIES", "5"))
+DOWNLOAD_RETRY_DELAY = float(os.environ.get("DOWNLOAD_RETRY_DELAY", "1.0"))  # Doublé à chaque échec
+DOWNLOAD_TIMEOUT = (30, 120)  # Connexion, puis silence maximal pendant la lecture
+DOWNLOAD_MAX_CHUNK = 1024 * 1024
+DOWNLOAD_SESSION = requests.Session()
+for _scheme in ["http://", "https://"]:
+    DOWNLOAD_SESSION.mount(_scheme, requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=32))
+
+
+class FileTooLargeError(Exception):
+    """Fichier au-delà de MAX_FILE_SIZE: le téléchargement n'est pas retenté"""
+
+
+def read_adaptive(response, write):
+    """Copie le corps d'une réponse par blocs dont la taille suit le débit (64KB à DOWNLOAD_MAX_CHUNK)"""
+    chunk_size = DOWNLOAD_CHUNK_SIZE
+    while True:
+        started = time.time()
+        data = response.raw.read(chunk_size, decode_content=True)
+        if not data:
+            return
+        write(data)
+        # Bloc reçu en moins de 50ms: connexion rapide, blocs plus grands; plus de 500ms: plus petits
+        elapsed = time.time() - started
+        if elapsed < 0.05:
+            chunk_size = min(chunk_size * 2, DOWNLOAD_MAX_CHUNK)
+        elif elapsed > 0.5:
+            chunk_size = max(chunk_size // 2, DOWNLOAD_CHUNK_SIZE)
+
+
+def wait_before_retry(audio_url, state, error):
+    """Compte une nouvelle tentative et attend (délai doublé à chaque échec), lève l'erreur au-delà de DOWNLOAD_RETRIES"""
+    with state["lock"]:
+        state["retries"] += 1
+        retries = state["retries"]
+    if retries > DOWNLOAD_RETRIES:
+        raise error
+    delay = min(DOWNLOAD_RETRY_DELAY * 2 ** (retries - 1), 30)
+    logger.warning(f"[DOWNLOAD] {audio_url[:80]}: {error}, nouvelle tentative dans {delay:.0f}s ({retries}/{DOWNLOAD_RETRIES})")
+    time.sleep(delay)
+
+
+def open_download(audio_url, state):
+    """Requête GET de l'audio en flux, retentée avec délai croissant sur erreur réseau ou réponse 5xx"""
+    while True:
+        try:
+            response = DOWNLOAD_SESSION.get(audio_url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+            if response.status_code >= 500:
+                response.close()
+                raise Exception(f"Réponse {response.status_code}")
+        except Exception as e:
+            wait_before_retry(audio_url, state, e)
+            continue
+        response.raise_for_status()
+        return response
+
+
+def fetch_range(audio_url, path, start, end, state):
+    """Télécharge les octets [start, end] dans path à leur position, en reprenant après une coupure"""
+    position = start
+    with open(path, "r+b") as f:
+        while position <= end:
+            try:
+                with DOWNLOAD_SESSION.get(
+                    audio_url, headers={"Range": f"bytes={position}-{end}"}, stream=True, timeout=DOWNLOAD_TIMEOUT
+                ) as response:
+                    if response.status_code != 206:
+                        raise Exception(f"Réponse {response.status_code} à une requête Range")
+                    f.seek(position)
+
+                    def write(data):
+                        nonlocal position
+                        data = data[:end + 1 - position]
+                        f.write(data)
+                        position += len(data)
+                        state["on_data"](len(data))
+
+                    read_adaptive(response, write)
+                if position <= end:
+                    raise Exception(f"Connexion interrompue à {position - start}/{end + 1 - start} octets")
+            except Exception as e:
+                wait_before_retry(audio_url, state, e)
+
+
+def fetch_stream(audio_url, path, response, state, ranges_supported):
+    """Télécharge le corps d'une réponse dans path; reprise par Range si le serveur l'accepte, sinon depuis le début"""
+    total_size = int(response.headers.get("content-length", 0)) or None
+    position = 0
+    with open(path, "wb") as f:
+        while True:
+            try:
+                if response is None:
+                    headers = {"Range": f"bytes={position}-"} if position and ranges_supported else {}
+                    response = DOWNLOAD_SESSION.get(audio_url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
+                    response.raise_for_status()
+                    if response.status_code != 206 and position:
+                        # Le serveur renvoie tout le fichier: on repart de zéro
+                        f.seek(0)
+                        f.truncate()
+                        position = 0
+
+                def write(data):
+                    nonlocal position
+                    if position + len(data) > MAX_FILE_SIZE:
+                        raise FileTooLargeError("Fichier trop volumineux (max 150MB)")
+                    f.write(data)
+                    position += len(data)
+                    state["on_data"](len(data))
+
+                with response:
+                    read_adaptive(response, write)
+                if total_size and position < total_size:
+                    raise Exception(f"Connexion interrompue à {position}/{total_size} octets")
+                return position
+            except FileTooLargeError:
+                raise
+            except Exception as e:
+                response = None
+                wait_before_retry(audio_url, state, e)
+
+
+def download_audio(audio_url, work_dir=None, task_id=None):
+    """Télécharge l'audio dans work_dir: (chemin, taille, empreinte SHA-256, statistiques).
+
+    Connexions de DOWNLOAD_SESSION réutilisées, blocs de taille adaptative, reprise après coupure
+    (DOWNLOAD_RETRIES tentatives) et, si le serveur accepte les requêtes Range, téléchargement
+    en DOWNLOAD_PARTS parties parallèles. Avec task_id, la progression avance de 10 à 20%.
+    """
+    started = time.time()
+    with tempfile.NamedTemporaryFile(suffix=guess_audio_suffix(audio_url), delete=False, dir=work_dir) as temp_file:
+        path = temp_file.name
+    state = {"lock": threading.Lock(), "bytes": 0, "retries": 0, "last_report": 0.0}
+    try:
+        response = open_download(audio_url, state)
+        total_size = int(response.headers.get("content-length", 0)) or None
+        if total_size and total_size > MAX_FILE_SIZE:
+            response.close()
+            raise FileTooLargeError("Fichier trop volumineux (max 150MB)")
+        ranges_supported = response.headers.get("accept-ranges", "").lower() == "bytes"
+
+        def on_data(length):
+            with state["lock"]:
+                state["bytes"] += length
+                now = time.time()
+                report = total_size and task_id and now - state["last_report"] >= 1.0
+                if report:
+                    state["last_report"] = now
+            if report:
+                update_task_progress(task_id, int(10 + min(state["bytes"] / total_size, 1.0) * 10))  # 10-20%
+
+        state["on_data"] = on_data
+        parts = 1
+        if ranges_supported and total_size and DOWNLOAD_PARTS > 1 and total_size >= 2 * DOWNLOAD_PART_MIN_SIZE:
+            # Parties parallèles écrites directement à leur position dans le fichier
+            response.close()
+            parts = min(DOWNLOAD_PARTS, total_size // DOWNLOAD_PART_MIN_SIZE)
+            with open(path, "wb") as f:
+                f.truncate(total_size)
+            bounds = [total_size * i // parts for i in range(parts + 1)]
+            with ThreadPoolExecutor(max_workers=parts) as executor:
+                futures = [
+                    executor.submit(fetch_range, audio_url, path, bounds[i], bounds[i + 1] - 1, state)
+                    for i in range(parts)
+                ]
+                for future in futures:
+                    future.result()
+            file_size = total_size
+        else:
+            file_size = fetch_stream(audio_url, path, response, state, ranges_supported)
+
+        audio_sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(DOWNLOAD_MAX_CHUNK), b""):
+                audio_sha256.update(block)
+    except Exception:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        raise
+
+    elapsed = max(time.time() - started, 1e-6)
+    stats = {
+        "bytes": file_size,
+        "seconds": round(elapsed, 2),
+        "throughput_mbps": round(file_size * 8 / elapsed / 1e6, 1),
+        "parts": parts,
+        "retries": state["retries"],
+        "transferred_bytes": state["bytes"],  # Plus que bytes si des octets ont été retéléchargés
+    }
+    logger.info(
+        f"[DOWNLOAD] {file_size} octets en {elapsed:.1f}s ({stats['throughput_mbps']} Mbit/s, "
+        f"{parts} partie(s), {state['retries']} reprise(s))"
+    )
+    observe_metric("whisper_download_seconds", stats["seconds"])
+    return path, file_size, audio_sha256.hexdigest(), stats
+
+
+def probe_audio_sizes(audio_urls):
+    """Taille annoncée (Content-Length) de chaque URL, None si inconnue, en parallèle"""
+    def probe(audio_url):
+        try:
+            response = DOWNLOAD_SESSION.head(audio_url, allow_redirects=True, timeout=10)
+            return int(response.headers["content-length"]) if response.ok else None
+        except (requests.RequestException, KeyError, ValueError):
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, BATCH_DOWNLOAD_WORKERS)) as executor:
+        return list(executor.map(probe, audio_urls))
+
+
+def order_batch_jobs(sizes):
+    """Ordre de passage des tâches d'un lot: alternance du plus long et du plus court restant.
+
+    Les fichiers longs démarrent tôt (le lot finit au plus tôt sur plusieurs workers) et les
+    courts donnent des résultats au fil de l'eau. Taille inconnue: taille médiane du lot.
+    """
+    known = sorted(size for size in sizes if size)
+    default = known[len(known) // 2] if known else 0
+    remaining = sorted(range(len(sizes)), key=lambda i: sizes[i] or default, reverse=True)
+    order = []
+    while remaining:
+        order.append(remaining.pop(0))
+        if remaining:
+            order.append(remaining.pop())
+    return order
+
+
+def schedule_batch(batch_id, tasks, queued_at):
+    """Ordre de passage d'un lot déjà en file, calculé en arrière-plan: tailles sondées (HEAD) puis heures
+    d'arrivée des tâches encore en attente réécrites dans l'ordre d'order_batch_jobs.
+
+    tasks: [(task_id, audio_url)]. Sans réponse des serveurs, l'ordre de la requête est gardé.
+    """
+    sizes = probe_audio_sizes([audio_url for _, audio_url in tasks])
+    conn = get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for position, index in enumerate(order_batch_jobs(sizes)):
+            conn.execute(
+                "UPDATE tasks SET queued_at = ? WHERE task_id = ? AND status = 'pending'",
+                (queued_at + position * 1e-6, tasks[index][0]),
+            )
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        logger.warning(f"[BATCH] Lot {batch_id}: ordre de passage non modifié: {e}")
+        return
+    logger.info(f"[BATCH] Lot {batch_id}: ordre de passage fixé ({sum(1 for size in sizes if size)} taille(s) connue(s))")
+    # La préparation anticipée suit le nouvel ordre
+    prefetch_queue()
+
+
+def get_batch_status(batch_id):
+    """État agrégé d'un lot et de ses tâches (dans l'ordre de passage), None si inconnu"""
+    rows = get_db().execute(
+        "SELECT * FROM tasks WHERE batch_id = ? ORDER BY rowid", (batch_id,)
+    ).fetchall()
+    if not rows:
+        return None
+    tasks = [row_to_task(row) for row in rows]
+    counts = {}
+    for task in tasks:
+        counts[task["status"]] = counts.get(task["status"], 0) + 1
+    finished = sum(counts.get(status, 0) for status in FINAL_STATUSES)
+    if finished == len(tasks):
+        status = "completed" if counts.get("error", 0) == 0 else "completed_with_errors"
+    elif counts.get("pending", 0) == len(tasks):
+        status = "pending"
+    else:
+        status = "processing"
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "total": len(tasks),
+        "counts": counts,
+        "progress": int(sum(task.get("progress") or 0 for task in tasks) / len(tasks)),
+        "created_at": tasks[0].get("created_at"),
+        "tasks": [
+            {
+                "task_id": task["task_id"],
+                "audio_url": (task.get("params") or {}).get("audio_url"),
+                "status": task["status"],
+                "progress": task.get("progress", 0),
+                "status_url": f"/transcription-status/{task['task_id']}",
+            }
+            for task in tasks
+        ],
+    }
+
+
+# === PRÉPARATION ANTICIPÉE: SPOOL DES PROCHAINES TÂCHES DE LA FILE ===
+# Pendant qu'une tâche est transcrite, l'audio des PREFETCH_AHEAD suivantes est téléchargé et
+# prétraité dans leur dossier de travail (point de reprise sans segments): le moteur n'attend
+# pas le réseau entre deux tâches. Le spool (dossiers des tâches en attente) est limité à
+# SPOOL_MAX_SIZE_MB; au-delà, les tâches les plus loin dans la file sont retirées
+PREFETCH_AHEAD = int(os.environ.get("PREFETCH_AHEAD", "2"))  # 0 = désactivé
+PREFETCH_WORKERS = int(os.environ.get("PREFETCH_WORKERS", "2"))
+SPOOL_MAX_BYTES = int(os.environ.get("SPOOL_MAX_SIZE_MB", "2048")) * 1024 * 1024
+PREFETCH_WAIT_TIMEOUT = 1800  # Attente maximale d'une préparation en cours par un worker
+PREFETCH_LOCK_NAME = "prefetch.lock"
+_prefetch_submitted = set()
+_prefetch_lock = threading.Lock()
+_prefetch_pool = None
+
+
+def get_spool_usage():
+    """Dossiers de travail des tâches en attente, dans l'ordre de la file: [(task_id, octets, évinçable)]"""
+    rows = get_db().execute(
+        "SELECT task_id, attempts, params FROM tasks WHERE status = 'pending' ORDER BY priority, queued_at, rowid"
+    ).fetchall()
+    usage = []
+    for row in rows:
+        work_dir = get_task_work_dir(row["task_id"])
+        if os.path.isdir(work_dir):
+            size = sum(
+                os.path.getsize(os.path.join(work_dir, name))
+                for name in os.listdir(work_dir)
+                if os.path.isfile(os.path.join(work_dir, name))
+            )
+            # Tâches reprises après une panne et fichiers téléversés: l'audio n'est pas retéléchargeable
+            audio_url = json.loads(row["params"] or "{}").get("audio_url") or ""
+            usage.append((row["task_id"], size, not row["attempts"] and not is_uploaded_audio(audio_url)))
+    return usage
+
+
+def enforce_spool_budget():
+    """Retire du spool l'audio préparé des tâches les plus loin dans la file, au-delà du budget disque"""
+    usage = get_spool_usage()
+    total = sum(size for _, size, _ in usage)
+    for task_id, size, evictable in reversed(usage):
+        if total <= SPOOL_MAX_BYTES:
+            break
+        if not evictable or os.path.exists(os.path.join(get_task_work_dir(task_id), PREFETCH_LOCK_NAME)):
+            continue
+        remove_task_work_dir(task_id)
+        total -= size
+        logger.info(f"[PREFETCH] Audio de la tâche {task_id} retiré du spool ({size/1024/1024:.0f}MB, budget dépassé)")
+
+
+def prefetch_task_audio(task_id):
+    """Télécharge et prétraite l'audio d'une tâche en attente dans son dossier de travail"""
+    lock_path = os.path.join(get_task_work_dir(task_id), PREFETCH_LOCK_NAME)
+    locked = False
+    try:
+        task = get_task(task_id)
+        if not task or task["status"] != "pending" or load_checkpoint(task_id):
+            return
+        params = task["params"]
+        # Mode flux: le téléchargement fait partie de la transcription
+        if params.get("streaming") if params.get("streaming") is not None else DEFAULT_STREAMING:
+            return
+        os.makedirs(get_task_work_dir(task_id), exist_ok=True)
+        try:
+            # Verrou partagé entre processus: une seule préparation par tâche
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return
+        locked = True
+        os.write(lock_fd, str(os.getpid()).encode())
+        os.close(lock_fd)
+        if get_task(task_id)["status"] != "pending":
+            return  # Prise par un worker entre-temps: il télécharge lui-même
+
+        audio_url = params["audio_url"]
+        audio_path, file_size, audio_hash, download_stats = download_audio(audio_url, get_task_work_dir(task_id))
+        update_task(task_id, download=download_stats)
+        checkpoint = {"audio_url": audio_url, "audio_path": audio_path, "audio_hash": audio_hash, "file_size": file_size}
+        save_checkpoint(task_id, **checkpoint)
+        vad = DEFAULT_VAD if params.get("vad") is None else bool(params.get("vad"))
+        preprocessed = prepare_whisper_input(audio_path, probe_audio_duration(audio_path), vad=vad)
+        if preprocessed:
+            save_checkpoint(task_id, preprocessed=preprocessed, **checkpoint)
+        logger.info(
+            f"[PREFETCH] Tâche {task_id} prête d'avance: {file_size} bytes "
+            f"({download_stats['throughput_mbps']} Mbit/s){', prétraitée' if preprocessed else ''}"
+        )
+    except Exception as e:
+        logger.warning(f"[PREFETCH] Préparation anticipée impossible pour {task_id}: {e}")
+    finally:
+        if locked:
+            try:
+                os.unlink(lock_path)
+            except OSError:
+                pass
+        with _prefetch_lock:
+            _prefetch_submitted.discard(task_id)
+    enforce_spool_budget()
+
+
+def wait_for_prefetch(task_id):
+    """Attend la fin de la préparation anticipée d'une tâche, quel que soit le processus qui la fait"""
+    lock_path = os.path.join(get_task_work_dir(task_id), PREFETCH_LOCK_NAME)
+    deadline = time.time() + PREFETCH_WAIT_TIMEOUT
+    waiting = False
+    while os.path.exists(lock_path) and time.time() < deadline:
+        try:
+            with open(lock_path) as f:
+                pid = int(f.read() or 0)
+        except (OSError, ValueError):
+            pid = 0
+        if pid and not psutil.pid_exists(pid):
+            break  # Verrou laissé par un processus disparu
+        if not waiting:
+            logger.info(f"[PREFETCH] Tâche {task_id}: attente de la préparation anticipée")
+            waiting = True
+        time.sleep(0.5)
+
+
+def prefetch_queue():
+    """Lance la préparation des PREFETCH_AHEAD prochaines tâches de la file, dans la limite du spool"""
+    global _prefetch_pool
+    if PREFETCH_AHEAD <= 0:
+        return
+    rows = get_db().execute(
+        "SELECT task_id FROM tasks WHERE status = 'pending' ORDER BY priority, queued_at, rowid LIMIT ?",
+        (PREFETCH_AHEAD,),
+    ).fetchall()
+    with _prefetch_lock:
+        candidates = [
+            row["task_id"] for row in rows
+            if row["task_id"] not in _prefetch_submitted and not os.path.isdir(get_task_work_dir(row["task_id"]))
+        ]
+    if not candidates:
+        return
+    if sum(size for _, size, _ in get_spool_usage()) >= SPOOL_MAX_BYTES:
+        logger.info(f"[PREFETCH] Spool plein ({SPOOL_MAX_BYTES/1024/1024:.0f}MB), préparation anticipée suspendue")
+        return
+    with _prefetch_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=max(1, PREFETCH_WORKERS), thread_name_prefix="prefetch")
+        for task_id in candidates:
+            if task_id not in _prefetch_submitted:
+                _prefetch_submitted.add(task_id)
+                _prefetch_pool.submit(prefetch_task_audio, task_id)
+
+
+# === TÉLÉVERSEMENT DIRECT (/transcribe/file) ===
+# Le corps de la requête (multipart/form-data ou audio brut) est écrit par blocs dans le spool
+# pendant la réception, sans être gardé en mémoire, puis devient le point de reprise de la tâche:
+# le pipeline ne télécharge rien. MAX_FILE_SIZE est vérifié au fil de l'écriture
+UPLOAD_DIR = os.path.join(STATE_DIR, "uploads")
+UPLOAD_URL_PREFIX = "upload://"  # audio_url des tâches dont l'audio a été téléversé
+UPLOAD_FIELD = "audio_file"
+UPLOAD_FORM_MAX_SIZE = 64 * 1024  # Champs texte du formulaire (paramètres)
+
+
+def is_uploaded_audio(audio_url):
+    return audio_url.startswith(UPLOAD_URL_PREFIX)
+
+
+class UploadSpoolFile:
+    """Fichier téléversé écrit dans le spool au fil de la réception, avec sa taille et son SHA-256"""
+
+    def __init__(self, filename):
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        self.filename = secure_filename(filename or "") or "audio"
+        fd, self.path = tempfile.mkstemp(suffix=guess_audio_suffix(self.filename), dir=UPLOAD_DIR)
+        self.file = os.fdopen(fd, "wb", buffering=DOWNLOAD_MAX_CHUNK)
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > MAX_FILE_SIZE:
+            raise FileTooLargeError(f"Fichier trop volumineux (max {MAX_FILE_SIZE/1024/1024:.0f}MB)")
+        self.sha256.update(data)
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+    def discard(self):
+        self.file.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def as_audio(self):
+        """Audio prêt pour create_queued_task (voir save_checkpoint)"""
+        self.close()
+        return {"audio_path": self.path, "audio_hash": self.sha256.hexdigest(), "file_size": self.size}
+
+
+def receive_raw_upload(stream, filename):
+    """Corps de requête brut (application/octet-stream, audio/*) écrit dans le spool"""
+    upload = UploadSpoolFile(filename)
+    try:
+        for data in iter(lambda: stream.read(DOWNLOAD_MAX_CHUNK), b""):
+            upload.write(data)
+    except BaseException:
+        upload.discard()
+        raise
+    upload.close()
+    return upload
+
+
+def receive_multipart_upload(stream, boundary):
+    """Formulaire multipart lu par blocs: champs texte en mémoire, fichier UPLOAD_FIELD dans le spool.
+
+    Retourne (champs, UploadSpoolFile ou None); les autres fichiers du formulaire sont ignorés.
+    """
+    decoder = MultipartDecoder(boundary.encode("latin-1"))
+    fields = {}
+    upload = None
+    target = None  # Liste des blocs d'un champ texte, fichier du spool, ou None (partie ignorée)
+    try:
+        for data in itertools.chain(iter(lambda: stream.read(DOWNLOAD_MAX_CHUNK), b""), [None]):
+            decoder.receive_data(data)
+            event = decoder.next_event()
+            while not isinstance(event, (Epilogue, NeedData)):
+                if isinstance(event, File):
+                    target = None
+                    if event.name == UPLOAD_FIELD and upload is None:
+                        upload = target = UploadSpoolFile(event.filename)
+                elif isinstance(event, Field):
+                    name, target = event.name, []
+                elif isinstance(event, Data):
+                    if isinstance(target, list):
+                        target.append(event.data)
+                        if sum(map(len, target)) > UPLOAD_FORM_MAX_SIZE:
+                            raise ValueError(f"champ {name} trop long")
+                        if not event.more_data:
+                            fields[name] = b"".join(target).decode("utf-8", "replace")
+                    elif target is not None:
+                        target.write(event.data)
+                event = decoder.next_event()
+    except BaseException:
+        if upload:
+            upload.discard()
+        raise
+    if upload:
+        upload.close()
+    return fields, upload
+
+
+def cleanup_stale_uploads(max_age=3600):
+    """Supprime les téléversements interrompus (processus arrêté pendant la réception)"""
+    if not os.path.exists(UPLOAD_DIR):
+        return
+    for name in os.listdir(UPLOAD_DIR):
+        path = os.path.join(UPLOAD_DIR, name)
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+# === SEGMENTS: LECTURE DE LA SORTIE WHISPER ET RENDU TXT/SRT/VTT ===
+# Ligne de segment émise par whisper-cli: "[00:01:02.340 --> 00:01:05.120]   texte"
+SEGMENT_LINE_RE = re.compile(
+    r"^\[(\d+):(\d{2}):(\d{2})[.,](\d{3}) --> (\d+):(\d{2}):(\d{2})[.,](\d{3})\]\s*(.*)$"
+)
+
+
+def parse_segment_line(line):
+    """Extrait (début, fin, texte) d'une ligne de segment whisper-cli, None sinon"""
+    match = SEGMENT_LINE_RE.match(line.strip())
+    if not match:
+        return None
+    g = match.groups()
+    start = int(g[0]) * 3600 + int(g[1]) * 60 + int(g[2]) + int(g[3]) / 1000
+    end = int(g[4]) * 3600 + int(g[5]) * 60 + int(g[6]) + int(g[7]) / 1000
+    return {"start": start, "end": end, "text": g[8].strip()}
+
+
+def format_timestamp(seconds, separator="."):
+    """Formate des secondes en HH:MM:SS.mmm (séparateur "," pour le SRT)"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+
+def iter_formatted_segments(segments, output_format):
+    """Rendu txt, srt ou vtt morceau par morceau, pour un itérable de segments de toute taille"""
+    if output_format == "vtt":
+        yield "WEBVTT\n\n"
+    separator = "\n\n" if output_format in ["srt", "vtt"] else "\n"
+    for index, seg in enumerate(segments, start=1):
+        if index > 1:
+            yield separator
+        if output_format == "srt":
+            yield f"{index}\n{format_timestamp(seg['start'], ',')} --> {format_timestamp(seg['end'], ',')}\n{seg['text']}"
+        elif output_format == "vtt":
+            yield f"{format_timestamp(seg['start'])} --> {format_timestamp(seg['end'])}\n{seg['text']}"
+        else:
+            yield seg["text"]
+
+
+def format_segments(segments, output_format):
+    """Produit le contenu txt, srt ou vtt à partir d'une liste de segments"""
+    return "".join(iter_formatted_segments(segments, output_format)).strip()
+
+
+def write_segments_file(segments, path, output_format):
+    """Écrit le rendu txt, srt ou vtt dans un fichier sans construire le texte complet en mémoire"""
+    with open(path, "w", encoding="utf-8") as f:
+        for block in iter_formatted_segments(segments, output_format):
+            f.write(block)
+
+
+# === SURVEILLANCE NON BLOQUANTE DES PROCESSUS WHISPER ===
+# Motifs compilés une fois: chaque ligne de sortie ne coûte qu'un ou deux passages d'expression régulière
+WHISPER_PERCENT_RE = re.compile(r"(\d+)%")
+WHISPER_ALERT_RE = re.compile(r"error|warning|failed", re.IGNORECASE)
+WHISPER_STAGE_RE = re.compile(r"loading|processing", re.IGNORECASE)
+MONITOR_READ_SIZE = 65536
+OUTPUT_TAIL_LINES = 200  # Dernières lignes de log whisper-cli gardées pour les diagnostics
+
+
+def classify_whisper_line(stream, line):
+    """Classe une ligne de whisper-cli: (type, valeur) ou (None, None) si rien à faire.
+
+    Types: "segment" (stdout, valeur = segment), "percent" (valeur = pourcentage),
+    "error"/"warning" (stderr), "stage" (stderr, valeur = progression du chargement).
+    """
+    if stream == "stdout":
+        if line.startswith("["):
+            segment = parse_segment_line(line)
+            if segment:
+                return "segment", segment
+        match = WHISPER_PERCENT_RE.search(line)
+        return ("percent", int(match.group(1))) if match else (None, None)
+
+    alert = WHISPER_ALERT_RE.search(line)
+    if alert:
+        return ("error" if alert.group(0).lower() == "error" else "warning"), None
+    match = WHISPER_PERCENT_RE.search(line)
+    if match:
+        return "percent", int(match.group(1))
+    stage = WHISPER_STAGE_RE.search(line)
+    if stage:
+        return "stage", 30 if stage.group(0).lower() == "loading" else 35
+    return None, None
+
+
+def monitor_process(process, on_line, timers=(), tick=1.0):
+    """Lit stdout et stderr d'un processus sans blocage et déclenche les minuteries à l'heure.
+
+    on_line(stream, line) reçoit chaque ligne complète de "stdout" ou "stderr", quel que soit le
+    flux qui parle: un flux silencieux ne retarde plus l'autre. timers est une liste de
+    (intervalle en secondes, callback(now)); un callback qui renvoie True arrête la lecture.
+    Renvoie False si un callback a interrompu la lecture, True à la fermeture des deux flux.
+    """
+    selector = selectors.DefaultSelector()
+    pending = {}
+    for name, stream in (("stdout", process.stdout), ("stderr", process.stderr)):
+        if stream is None:
+            continue
+        os.set_blocking(stream.fileno(), False)
+        selector.register(stream.fileno(), selectors.EVENT_READ, name)
+        pending[name] = b""
+    deadlines = [time.time() + interval for interval, _ in timers]
+
+    try:
+        while selector.get_map():
+            now = time.time()
+            timeout = max(0.0, min([tick] + [deadline - now for deadline in deadlines]))
+            for key, _ in selector.select(timeout):
+                name = key.data
+                try:
+                    data = os.read(key.fd, MONITOR_READ_SIZE)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    selector.unregister(key.fd)
+                    if pending[name]:
+                        on_line(name, pending[name].decode("utf-8", errors="replace").rstrip("\r"))
+                    continue
+                lines = (pending[name] + data).split(b"\n")
+                pending[name] = lines.pop()
+                for line in lines:
+                    on_line(name, line.decode("utf-8", errors="replace").rstrip("\r"))
+
+            now = time.time()
+            for index, (interval, callback) in enumerate(timers):
+                if now >= deadlines[index]:
+                    deadlines[index] = now + interval
+                    if callback(now):
+                        return False
+        return True
+    finally:
+        selector.close()
+
+
+# === TRANSCRIPTION PARALLÈLE PAR MORCEAUX (fichiers longs) ===
+# Budget de threads CPU partagé entre les processus whisper-cli d'une même tâche
+CPU_THREADS_BUDGET = int(os.environ.get("CPU_THREADS_BUDGET", EFFECTIVE_CPU_COUNT))
+CHUNK_THREADS = int(os.environ.get("CHUNK_THREADS", "4"))  # Threads par processus whisper-cli
+CHUNK_DURATION = int(os.environ.get("CHUNK_DURATION", "600"))  # 10 min par morceau
+CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "15"))  # Marge de part et d'autre d'une coupure fixe
+CHUNKED_MIN_DURATION = int(os.environ.get("CHUNKED_MIN_DURATION", "1800"))  # Mode "auto": au-delà de 30 min
+DEFAULT_CHUNKING = os.environ.get("DEFAULT_CHUNKING", "none")
+CHUNKING_MODES = ["none", "auto", "fixed", "silence"]
+STITCH_TIME_TOLERANCE = 2.0  # Décalage max entre deux versions d'un même segment
+SILENCE_NOISE_DB = -35
+SILENCE_MIN_DURATION = 0.5
+SILENCE_SEARCH_WINDOW = 60  # Recherche d'un silence à ±60s de la coupure idéale
+SILENCE_LINE_RE = re.compile(r"silence_(start|end): (-?[\d.]+)")
+
+
+def probe_audio_duration(path):
+    """Durée de l'audio en secondes (pydub/ffprobe), None si inconnue"""
+    try:
+        if mediainfo:
+            duration = mediainfo(path).get("duration")
+        else:
+            duration = subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                 "-of", "default=noprint_wrappers=1:nokey=1", path],
+                capture_output=True, text=True, timeout=120,
+            ).stdout.strip()
+        return float(duration) if duration else None
+    except Exception as e:
+        logger.warning(f"[CHUNK] Durée audio inconnue pour {path}: {e}")
+        return None
+
+
+def detect_silences(path, min_duration=SILENCE_MIN_DURATION):
+    """Liste des silences (début, fin) détectés par ffmpeg silencedetect.
+
+    Un silence qui dure jusqu'à la fin du fichier a une fin infinie.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-i", path, "-af",
+         f"silencedetect=noise={SILENCE_NOISE_DB}dB:d={min_duration}", "-f", "null", "-"],
+        capture_output=True, text=True, timeout=3600,
+    )
+    silences = []
+    silence_start = None
+    for kind, value in SILENCE_LINE_RE.findall(result.stderr):
+        if kind == "start":
+            silence_start = float(value)
+        elif silence_start is not None:
+            silences.append((silence_start, float(value)))
+            silence_start = None
+    if silence_start is not None:
+        silences.append((silence_start, float("inf")))
+    return silences
+
+
+def plan_chunks(duration, mode="fixed", silences=None):
+    """Découpe [0, durée] en morceaux.
+
+    Chaque morceau a une zone "possédée" [keep_from, keep_until[: un segment n'est gardé
+    que par le morceau qui possède son début, ce qui dédoublonne les chevauchements.
+    """
+    boundaries = []  # (coupure, chevauchement)
+    target = CHUNK_DURATION
+    while target < duration - CHUNK_DURATION / 4:
+        cut, overlap = target, CHUNK_OVERLAP
+        if mode == "silence" and silences:
+            candidates = [
+                (a + b) / 2 for a, b in silences
+                if abs((a + b) / 2 - target) <= SILENCE_SEARCH_WINDOW
+            ]
+            if candidates:
+                # Coupure au milieu d'un silence: pas besoin de chevauchement
+                cut, overlap = min(candidates, key=lambda c: abs(c - target)), 0
+        boundaries.append((cut, overlap))
+        target = cut + CHUNK_DURATION
+
+    chunks = []
+    previous_cut, previous_overlap = 0.0, 0
+    for index, (cut, overlap) in enumerate(boundaries + [(duration, 0)]):
+        chunks.append({
+            "index": index,
+            "start": max(previous_cut - previous_overlap, 0.0),
+            "end": min(cut + overlap, duration),
+            "keep_from": previous_cut,
+            "keep_until": cut if index < len(boundaries) else float("inf"),
+        })
+        previous_cut, previous_overlap = cut, overlap
+    return chunks
+
+
+def extract_chunk(source_path, start, end, output_path):
+    """Extrait un morceau en WAV 16kHz mono (format natif de whisper)"""
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{start:.3f}",
+         "-t", f"{end - start:.3f}", "-i", source_path, "-ar", "16000", "-ac", "1",
+         "-c:a", "pcm_s16le", output_path],
+        check=True, capture_output=True, timeout=3600,
+    )
+
+
+def new_chunk_job(deadline):
+    """Morceaux d'une même tâche: processus whisper-cli en cours, échéance commune et annulation"""
+    return {"processes": set(), "deadline": deadline, "cancelled": False, "lock": threading.Lock()}
+
+
+def cancel_chunk_job(job):
+    """Arrête les whisper-cli en cours des morceaux d'une tâche; les morceaux suivants ne démarrent plus"""
+    with job["lock"]:
+        job["cancelled"] = True
+        processes = list(job["processes"])
+    for process in processes:
+        if process.poll() is None:
+            process.kill()
+    if processes:
+        logger.warning(f"[CHUNK] {len(processes)} processus whisper-cli arrêtés")
+
+
+def transcribe_chunk(chunk, source_path, work_dir, model_path, language,
+                     word_thold, no_speech_thold, prompt, threads, decoding=None, job=None):
+    """Transcrit un morceau avec son propre whisper-cli, segments en temps absolu"""
+    if job and job["cancelled"]:
+        raise Exception(f"Morceau {chunk['index']} annulé")
+    chunk_path = os.path.join(work_dir, f"chunk_{chunk['index']:04d}.wav")
+    extract_chunk(source_path, chunk["start"], chunk["end"], chunk_path)
+    return transcribe_wav_chunk(
+        chunk, chunk_path, work_dir, model_path, language,
+        word_thold, no_speech_thold, prompt, threads, decoding, job,
+    )
+
+
+def transcribe_wav_chunk(chunk, chunk_path, work_dir, model_path, language,
+                         word_thold, no_speech_thold, prompt, threads, decoding=None, job=None):
+    """Lance whisper-cli sur un morceau WAV déjà extrait puis le supprime.
+
+    Les segments (en temps absolu) sont écrits au fil de la sortie dans chunk_NNNN.jsonl du dossier
+    de travail, dont le chemin est renvoyé: rien n'est gardé en mémoire au-delà d'une ligne.
+    job (new_chunk_job) porte l'échéance de toute la tâche et permet d'arrêter le processus.
+    """
+    cmd = build_whisper_cmd(
+        WHISPER_PATH,
+        model_path,
+        chunk_path,
+        language,
+        "txt",
+        word_thold=word_thold,
+        no_speech_thold=no_speech_thold,
+        prompt=prompt,
+        threads=threads,
+        decoding=decoding,
+    )
+    segments_path = os.path.join(work_dir, f"chunk_{chunk['index']:04d}.jsonl")
+    stderr_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    job = job or new_chunk_job(time.time() + MAX_TRANSCRIPTION_TIME)
+    with job["lock"]:
+        if job["cancelled"]:
+            raise Exception(f"Morceau {chunk['index']} annulé")
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=work_dir)
+        job["processes"].add(process)
+    RUNNING_PROCESSES.add(process)
+    try:
+        with open(segments_path, "w", encoding="utf-8") as segments_file:
+            def on_line(stream, line):
+                kind, segment = classify_whisper_line(stream, line)
+                if kind == "segment":
+                    segment["start"] += chunk["start"]
+                    segment["end"] += chunk["start"]
+                    segments_file.write(dump_segment(segment))
+                elif stream == "stderr":
+                    stderr_tail.append(line)
+
+            def check_timeout(now):
+                if now <= job["deadline"]:
+                    return False
+                process.kill()
+                return True
+
+            if not monitor_process(process, on_line, [(min(60, MAX_TRANSCRIPTION_TIME), check_timeout)]):
+                raise TranscriptionTimeoutError(
+                    f"Timeout global dépassé ({MAX_TRANSCRIPTION_TIME/3600:.1f}h) au morceau {chunk['index']}"
+                )
+        process.wait()
+    finally:
+        RUNNING_PROCESSES.discard(process)
+        with job["lock"]:
+            job["processes"].discard(process)
+        if process.poll() is None:
+            process.kill()
+        for path in [chunk_path, f"{chunk_path}.txt"]:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+    if process.returncode != 0:
+        if job["cancelled"]:
+            raise Exception(f"Morceau {chunk['index']} annulé")
+        stderr = "\n".join(stderr_tail)
+        raise Exception(f"Erreur transcription du morceau {chunk['index']}: {stderr[-2000:]}")
+    return segments_path
+
+
+def normalize_segment_text(text):
+    """Texte simplifié pour comparer deux segments"""
+    return re.sub(r"\W+", " ", text).strip().lower()
+
+
+def stitch_chunk_segments(chunk, segments, tail):
+    """Segments d'un morceau gardés à l'assemblage, dans l'ordre.
+
+    Seuls les segments qui commencent dans la zone possédée du morceau sont gardés, sans les doublons
+    des derniers segments assemblés (tail, complété au fil de l'eau) de part et d'autre de la coupure.
+    """
+    # Segments du morceau précédent proches de la coupure, pour repérer les doublons
+    near_cut = [seg for seg in tail if chunk["keep_from"] - seg["start"] <= CHUNK_OVERLAP]
+    for segment in segments:
+        if not chunk["keep_from"] <= segment["start"] < chunk["keep_until"]:
+            continue
+        # Même phrase reconnue des deux côtés d'une coupure, à un léger décalage près
+        text = normalize_segment_text(segment["text"])
+        if any(
+            abs(seg["start"] - segment["start"]) <= STITCH_TIME_TOLERANCE
+            and normalize_segment_text(seg["text"]) == text
+            for seg in near_cut
+        ):
+            continue
+        tail.append(segment)
+        yield segment
+
+
+def resolve_chunking_mode(chunking, duration):
+    """Choisit le mode de découpage effectif selon la requête et la durée"""
+    chunking = (chunking or DEFAULT_CHUNKING).lower()
+    if chunking not in CHUNKING_MODES:
+        raise ValueError(f"chunking doit être l'un de {CHUNKING_MODES}")
+    if chunking == "auto":
+        if duration and duration >= CHUNKED_MIN_DURATION:
+            return "silence"
+        return "none"
+    if chunking != "none" and not duration:
+        logger.warning("[CHUNK] Durée inconnue, transcription en un seul processus")
+        return "none"
+    return chunking
+
+
+def get_segmentation_signature(params):
+    """Découpage demandé (flux, morceaux) qui change les coupures entre segments, donc le texte (clé de cache)"""
+    streaming = params.get("streaming")
+    if streaming if streaming is not None else DEFAULT_STREAMING:
+        return {"streaming": STREAM_CHUNK_DURATION}
+    chunking = str(params.get("chunking") or DEFAULT_CHUNKING).lower()
+    if chunking == "none":
+        return None
+    signature = {"chunking": chunking, "duration": CHUNK_DURATION, "overlap": CHUNK_OVERLAP}
+    if chunking == "auto":
+        signature["min_duration"] = CHUNKED_MIN_DURATION
+    return signature
+
+
+def run_chunked_transcription(source_path, duration, mode, model_path, language, word_thold, no_speech_thold,
+                              prompt, task_id=None, timeline=None, decoding=None, segments_id=None, deadline=None):
+    """Transcrit un fichier long en parallèle sur plusieurs processus whisper-cli.
+
+    Les segments assemblés sont publiés dans le fichier de segments_id (par défaut celui de la tâche);
+    renvoie (nombre de segments, nombre de morceaux, délai du premier segment). deadline borne toute la
+    tâche (défaut: MAX_TRANSCRIPTION_TIME à partir de maintenant). Au premier morceau en échec, les
+    autres sont annulés et leurs whisper-cli arrêtés.
+    """
+    silences = detect_silences(source_path) if mode == "silence" else None
+    chunks = plan_chunks(duration, mode, silences)
+    # Budget de la tâche: les cœurs sont partagés avec les autres transcriptions simultanées
+    cpu_budget = get_task_cpu_budget()
+    threads = max(1, min((decoding or {}).get("threads") or CHUNK_THREADS, cpu_budget))
+    # Morceaux déjà parallèles: un seul décodeur par processus
+    decoding = dict(decoding or {}, threads=None, processors=None)
+    workers = max(1, min(len(chunks), cpu_budget // threads))
+    logger.info(
+        f"[CHUNK] {len(chunks)} morceaux ({mode}) pour {duration/3600:.2f}h d'audio, "
+        f"{workers} processus x {threads} threads"
+    )
+
+    work_dir = tempfile.mkdtemp(prefix="whisper_chunks_")
+    chunk_files = [None] * len(chunks)
+    stitch = new_stitch_state()
+    start_time = time.time()
+    first_segment_time = None
+    job = new_chunk_job(deadline or start_time + MAX_TRANSCRIPTION_TIME)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(
+                transcribe_chunk, chunk, source_path, work_dir, model_path, language,
+                word_thold, no_speech_thold, prompt, threads, decoding, job,
+            ): chunk["index"]
+            for chunk in chunks
+        }
+        done = 0
+        audio_done = 0
+        for future in as_completed(futures):
+            chunk = chunks[futures[future]]
+            chunk_files[chunk["index"]] = future.result()
+            published = publish_chunk_segments(segments_id or task_id, chunks, chunk_files, stitch, timeline)
+            if first_segment_time is None and published:
+                first_segment_time = time.time() - start_time
+            done += 1
+            audio_done += chunk["keep_until"] - chunk["keep_from"]
+            report_audio_progress(task_id, audio_done, duration, start_time)
+            logger.info(f"[CHUNK] Morceau {futures[future]} terminé ({done}/{len(chunks)})")
+    except BaseException:
+        # Tâche déjà en échec: les morceaux restants ne tournent pas pour rien
+        executor.shutdown(wait=False, cancel_futures=True)
+        cancel_chunk_job(job)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return stitch["segments"], len(chunks), first_segment_time
+
+
+# === PIPELINE EN FLUX: TÉLÉCHARGEMENT -> FFMPEG -> WHISPER SANS ATTENDRE LA FIN DU FICHIER ===
+STREAM_CHUNK_DURATION = int(os.environ.get("STREAM_CHUNK_DURATION", "300"))  # Fenêtre PCM envoyée au moteur
+DEFAULT_STREAMING = os.environ.get("DEFAULT_STREAMING", "false").lower() == "true"
+PCM_SAMPLE_RATE = 16000
+PCM_BYTES_PER_SECOND = PCM_SAMPLE_RATE * 2  # s16le mono
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def write_wav(path, pcm):
+    """Écrit des échantillons PCM 16kHz mono s16le dans un fichier WAV"""
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(PCM_SAMPLE_RATE)
+        wav_file.writeframes(pcm)
+
+
+def feed_download_to_decoder(response, decoder_stdin, state):
+    """Thread: copie le corps HTTP dans l'entrée de ffmpeg au fil du téléchargement"""
+    total_size = int(response.headers.get("content-length", 0))
+    try:
+        for data in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            state["bytes"] += len(data)
+            state["sha256"].update(data)
+            if state["bytes"] > MAX_FILE_SIZE:
+                state["error"] = "Fichier trop volumineux (max 150MB)"
+                break
+            decoder_stdin.write(data)
+            if total_size > 0:
+                state["fraction"] = min(state["bytes"] / total_size, 1.0)
+    except Exception as e:
+        state["error"] = f"Erreur de téléchargement: {e}"
+    finally:
+        state["fraction"] = 1.0
+        try:
+            decoder_stdin.close()
+        except Exception:
+            pass
+
+
+def run_streaming_transcription(audio_url, model_path, language, word_thold, no_speech_thold,
+                                prompt, task_id=None, decoding=None, segments_id=None, deadline=None):
+    """Transcrit pendant le téléchargement: le PCM décodé est envoyé au moteur par fenêtres.
+
+    Les segments assemblés sont publiés dans le fichier de segments_id (par défaut celui de la tâche).
+    deadline borne toute la tâche; en cas d'échec, les whisper-cli des fenêtres en cours sont arrêtés.
+    """
+    start_time = time.time()
+    # Requête initiale retentée comme un téléchargement complet (download_audio)
+    response = open_download(audio_url, {"lock": threading.Lock(), "retries": 0})
+
+    decoder_errors = tempfile.TemporaryFile()
+    decoder = subprocess.Popen(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ar", str(PCM_SAMPLE_RATE), "-ac", "1", "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=decoder_errors,
+    )
+    RUNNING_PROCESSES.add(decoder)
+    state = {"bytes": 0, "fraction": 0.0, "error": None, "sha256": hashlib.sha256()}
+    feeder = threading.Thread(
+        target=feed_download_to_decoder, args=(response, decoder.stdin, state)
+    )
+    feeder.daemon = True
+    feeder.start()
+
+    cpu_budget = get_task_cpu_budget()
+    threads = max(1, min((decoding or {}).get("threads") or CHUNK_THREADS, cpu_budget))
+    workers = max(1, cpu_budget // threads)
+    decoding = dict(decoding or {}, threads=None, processors=None)
+    window = STREAM_CHUNK_DURATION * PCM_BYTES_PER_SECOND
+    overlap = CHUNK_OVERLAP * PCM_BYTES_PER_SECOND
+    work_dir = tempfile.mkdtemp(prefix="whisper_stream_")
+    executor = ThreadPoolExecutor(max_workers=workers)
+    job = new_chunk_job(deadline or start_time + MAX_TRANSCRIPTION_TIME)
+    chunks = []
+    futures = {}
+    chunk_files = {}
+    stitch = new_stitch_state()
+    first_segment_time = None
+    # Le tampon contient le PCM à partir de l'octet buffer_start du flux décodé
+    buffer = bytearray()
+    buffer_start = 0
+
+    def dispatch(pcm_end, keep_until):
+        chunk = {
+            "index": len(chunks),
+            "start": buffer_start / PCM_BYTES_PER_SECOND,
+            "end": (buffer_start + pcm_end) / PCM_BYTES_PER_SECOND,
+            "keep_from": len(chunks) * window / PCM_BYTES_PER_SECOND,
+            "keep_until": keep_until,
+        }
+        chunk_path = os.path.join(work_dir, f"chunk_{chunk['index']:04d}.wav")
+        write_wav(chunk_path, bytes(buffer[:pcm_end]))
+        chunks.append(chunk)
+        futures[executor.submit(
+            transcribe_wav_chunk, chunk, chunk_path, work_dir, model_path, language,
+            word_thold, no_speech_thold, prompt, threads, decoding, job,
+        )] = chunk["index"]
+        logger.info(f"[STREAM] Morceau {chunk['index']} envoyé au moteur ({chunk['start']:.0f}s-{chunk['end']:.0f}s)")
+
+    def publish(final=False):
+        nonlocal first_segment_time
+        # Tant que le flux n'est pas terminé, la fin de la dernière fenêtre peut encore changer (keep_until)
+        ready = chunks if final else chunks[:-1]
+        published = publish_chunk_segments(
+            segments_id or task_id, ready, [chunk_files.get(c["index"]) for c in ready], stitch
+        )
+        if first_segment_time is None and published:
+            first_segment_time = time.time() - start_time
+            logger.info(f"[STREAM] Premier segment disponible après {first_segment_time:.1f}s")
+
+    def collect_finished():
+        for future in [f for f in futures if f.done()]:
+            chunk_files[futures.pop(future)] = future.result()
+            publish()
+        # Progression: morceaux terminés rapportés au nombre de morceaux estimé d'après le téléchargement
+        expected = max(len(chunks) / max(state["fraction"], 0.01), len(chunks), 1)
+        update_task_progress(task_id, int(20 + 70 * len(chunk_files) / expected))
+
+    try:
+        update_task_progress(task_id, 10, "transcribing")
+        while True:
+            data = decoder.stdout.read(DOWNLOAD_CHUNK_SIZE)
+            if not data:
+                break
+            buffer += data
+            next_cut = (len(chunks) + 1) * window
+            # Une fenêtre part dès que la marge de chevauchement après la coupure est décodée
+            while buffer_start + len(buffer) >= next_cut + overlap:
+                dispatch(next_cut + overlap - buffer_start, next_cut / PCM_BYTES_PER_SECOND)
+                drop = next_cut - overlap - buffer_start
+                del buffer[:drop]
+                buffer_start += drop
+                next_cut = (len(chunks) + 1) * window
+            collect_finished()
+
+        decoder.wait()
+        feeder.join()
+        if state["error"]:
+            raise Exception(state["error"])
+        if decoder.returncode != 0:
+            decoder_errors.seek(0)
+            raise Exception(f"Erreur de décodage ffmpeg: {decoder_errors.read().decode(errors='replace')[-2000:]}")
+
+        # Dernière fenêtre: l'audio restant après la dernière coupure
+        if buffer_start + len(buffer) > len(chunks) * window or not chunks:
+            dispatch(len(buffer), float("inf"))
+        else:
+            chunks[-1]["keep_until"] = float("inf")
+
+        for future in as_completed(list(futures)):
+            chunk_files[futures.pop(future)] = future.result()
+            publish(final=True)
+            update_task_progress(task_id, int(20 + 70 * len(chunk_files) / len(chunks)))
+        # Dernière fenêtre déjà transcrite avant la fin du flux
+        publish(final=True)
+    finally:
+        RUNNING_PROCESSES.discard(decoder)
+        if decoder.poll() is None:
+            decoder.kill()
+        response.close()
+        # Échec: fenêtres en attente annulées et whisper-cli en cours arrêtés avant de rendre la main
+        executor.shutdown(wait=False, cancel_futures=True)
+        cancel_chunk_job(job)
+        executor.shutdown(wait=True)
+        decoder_errors.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    logger.info(
+        f"[STREAM] {len(chunks)} morceaux transcrits, {state['bytes']} octets téléchargés, "
+        f"durée totale {time.time() - start_time:.0f}s"
+    )
+    return {
+        "segments": stitch["segments"],
+        "chunks": len(chunks),
+        "time_to_first_segment": first_segment_time,
+        "file_size": state["bytes"],
+        "audio_hash": state["sha256"].hexdigest(),
+    }
+
+
+# === PRÉTRAITEMENT AUDIO: WAV 16kHz MONO, SILENCES RETIRÉS, VOLUME NORMALISÉ ===
+# Sur demande (désactivé par défaut: le texte et les horodatages changent). L'audio est décodé une seule fois
+# par ffmpeg au format natif de whisper. Les longs silences sont retirés et notés dans une table de
+# correspondance: les segments sont ramenés aux horodatages du fichier d'origine
+AUDIO_PREPROCESSING = os.environ.get("AUDIO_PREPROCESSING", "false").lower() == "true"
+TRIM_SILENCE = os.environ.get("TRIM_SILENCE", "false").lower() == "true"
+TRIM_SILENCE_MIN_DURATION = float(os.environ.get("TRIM_SILENCE_MIN_DURATION", "2.0"))  # Silences plus courts gardés
+TRIM_SILENCE_PADDING = 0.3  # Marge gardée de part et d'autre de la parole
+LOUDNESS_NORMALIZATION = os.environ.get("LOUDNESS_NORMALIZATION", "false").lower() == "true"
+LOUDNESS_FILTER = "loudnorm=I=-16:TP=-1.5:LRA=11"
+# Détection de parole (VAD) par énergie: optionnelle, retire aussi les fonds musicaux et les jingles
+DEFAULT_VAD = os.environ.get("DEFAULT_VAD", "false").lower() == "true"
+VAD_FRAME_DURATION = 0.03
+VAD_ENERGY_DB = float(os.environ.get("VAD_ENERGY_DB", "12"))  # Au-dessus du bruit de fond (10e percentile)
+VAD_MIN_LEVEL_DB = -55  # Trames plus faibles jamais retenues (dBFS)
+VAD_MODULATION_WINDOW = 1.0  # Fenêtre de mesure de la variation d'énergie (secondes)
+VAD_MODULATION_DB = float(os.environ.get("VAD_MODULATION_DB", "4"))  # Écart-type minimal de l'énergie
+VAD_MIN_SILENCE = 1.0  # Pauses plus courtes gardées dans la zone de parole
+VAD_MIN_SPEECH = 0.6  # Zones plus courtes ignorées
+AUDIO_EXTENSIONS = {".mp3", ".m4a", ".mp4", ".aac", ".ogg", ".oga", ".opus", ".flac", ".wav", ".webm"}
+
+
+def get_preprocessing_signature():
+    """Réglages du prétraitement qui influencent le texte produit (clé de cache)"""
+    if not AUDIO_PREPROCESSING:
+        return None
+    return {
+        "trim_silence": TRIM_SILENCE_MIN_DURATION if TRIM_SILENCE else None,
+        "loudnorm": LOUDNESS_FILTER if LOUDNESS_NORMALIZATION else None,
+    }
+
+
+def guess_audio_suffix(audio_url):
+    """Extension du fichier téléchargé d'après l'URL (.mp3 si inconnue)"""
+    suffix = os.path.splitext(urllib.parse.urlparse(audio_url).path)[1].lower()
+    return suffix if suffix in AUDIO_EXTENSIONS else ".mp3"
+
+
+def plan_speech_intervals(duration, silences):
+    """Intervalles (début, fin) à garder: tout sauf les silences, avec une marge autour de la parole.
+
+    duration peut valoir inf si elle est inconnue: le dernier intervalle va jusqu'à la fin du fichier.
+    """
+    intervals = []
+    position = 0.0
+    for silence_start, silence_end in silences:
+        cut_from = silence_start + TRIM_SILENCE_PADDING if silence_start > TRIM_SILENCE_PADDING else 0.0
+        cut_to = silence_end - TRIM_SILENCE_PADDING if silence_end < duration - TRIM_SILENCE_PADDING else duration
+        if cut_to <= cut_from:
+            continue
+        if cut_from > position:
+            intervals.append((position, cut_from))
+        position = max(position, cut_to)
+    if position < duration:
+        intervals.append((position, duration))
+    return intervals
+
+
+def to_original_time(position, timeline, end=False):
+    """Position dans l'audio prétraité -> position dans le fichier d'origine.
+
+    timeline: liste de [début prétraité, début d'origine, fin d'origine], vide si rien n'a été retiré.
+    Une fin de segment placée exactement sur une coupure reste avant le silence retiré.
+    """
+    if not timeline:
+        return position
+    if end:
+        index = bisect.bisect_left(timeline, [position]) - 1
+    else:
+        index = bisect.bisect_right(timeline, [position, float("inf")]) - 1
+    processed_start, original_start, original_end = timeline[max(index, 0)]
+    return original_start + max(position - processed_start, 0.0)
+
+
+def to_processed_time(position, timeline):
+    """Position dans le fichier d'origine -> position dans l'audio prétraité (reprise)"""
+    if not timeline:
+        return position
+    for processed_start, original_start, original_end in timeline:
+        if position < original_start:
+            return processed_start  # Dans un silence retiré: reprise au début de la parole suivante
+        if position <= original_end:
+            return processed_start + position - original_start
+    processed_start, original_start, original_end = timeline[-1]
+    return processed_start + original_end - original_start
+
+
+def remap_segments(segments, timeline):
+    """Ramène des segments de l'audio prétraité aux horodatages du fichier d'origine"""
+    if not timeline:
+        return segments
+    return [
+        dict(seg, start=to_original_time(seg["start"], timeline), end=to_original_time(seg["end"], timeline, end=True))
+        for seg in segments
+    ]
+
+
+def get_frame_energies(wav_path):
+    """Énergie (dBFS) de chaque trame de VAD_FRAME_DURATION d'un WAV 16kHz mono s16le"""
+    frame_samples = int(PCM_SAMPLE_RATE * VAD_FRAME_DURATION)
+    frame_bytes = frame_samples * 2
+    energies = []
+    with wave.open(wav_path, "rb") as wav_file:
+        while True:
+            block = wav_file.readframes(frame_samples * 1000)
+            if len(block) < frame_bytes:
+                break
+            usable = len(block) - len(block) % frame_bytes
+            if numpy is not None:
+                samples = numpy.frombuffer(block[:usable], dtype="<i2").astype(numpy.float64)
+                levels = numpy.sqrt((samples.reshape(-1, frame_samples) ** 2).mean(axis=1)).tolist()
+            else:
+                samples = array.array("h", block[:usable])
+                if sys.byteorder == "big":
+                    samples.byteswap()
+                levels = [math.sqrt(sum(sample * sample for sample in samples[i:i + frame_samples]) / frame_samples)
+                          for i in range(0, len(samples), frame_samples)]
+            energies.extend(20 * math.log10(max(level, 1.0) / 32768) for level in levels)
+    return energies
+
+
+def detect_speech(wav_path):
+    """Intervalles de parole (début, fin) en secondes d'un WAV 16kHz mono, d'après l'énergie des trames.
+
+    Une trame est retenue si son énergie dépasse le bruit de fond de VAD_ENERGY_DB et si l'énergie
+    varie autour d'elle (syllabes, pauses): un fond musical continu reste presque constant.
+    """
+    energies = get_frame_energies(wav_path)
+    if not energies:
+        return []
+    count = len(energies)
+    threshold = max(sorted(energies)[count // 10] + VAD_ENERGY_DB, VAD_MIN_LEVEL_DB)
+    half_window = max(1, int(VAD_MODULATION_WINDOW / VAD_FRAME_DURATION / 2))
+    sums, squares = [0.0], [0.0]
+    for energy in energies:
+        sums.append(sums[-1] + energy)
+        squares.append(squares[-1] + energy * energy)
+
+    regions = []  # (première trame, dernière trame + 1)
+    max_gap = int(VAD_MIN_SILENCE / VAD_FRAME_DURATION)
+    for index, energy in enumerate(energies):
+        if energy < threshold:
+            continue
+        low, high = max(0, index - half_window), min(count, index + half_window + 1)
+        mean = (sums[high] - sums[low]) / (high - low)
+        if (squares[high] - squares[low]) / (high - low) - mean * mean < VAD_MODULATION_DB ** 2:
+            continue
+        if regions and index - regions[-1][1] <= max_gap:
+            regions[-1][1] = index + 1
+        else:
+            regions.append([index, index + 1])
+
+    duration = count * VAD_FRAME_DURATION
+    intervals = []
+    for first, last in regions:
+        if (last - first) * VAD_FRAME_DURATION < VAD_MIN_SPEECH:
+            continue
+        start = max(first * VAD_FRAME_DURATION - TRIM_SILENCE_PADDING, 0.0)
+        end = min(last * VAD_FRAME_DURATION + TRIM_SILENCE_PADDING, duration)
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+    return intervals
+
+
+def to_pcm_intervals(intervals):
+    """Intervalles en secondes -> intervalles en octets de PCM s16le (fin infinie conservée)"""
+    return [
+        (round(start * PCM_SAMPLE_RATE) * 2, end if end == float("inf") else round(end * PCM_SAMPLE_RATE) * 2)
+        for start, end in intervals
+    ]
+
+
+def write_pcm_intervals(read_block, output_path, kept):
+    """Copie les intervalles kept (en octets) d'un flux PCM dans un WAV, renvoie la taille du flux"""
+    position = 0
+    index = 0
+    with wave.open(output_path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(PCM_SAMPLE_RATE)
+        while True:
+            block = read_block(DOWNLOAD_CHUNK_SIZE)
+            if not block:
+                break
+            block_end = position + len(block)
+            while index < len(kept) and kept[index][0] < block_end:
+                start, end = kept[index]
+                wav_file.writeframes(block[max(start, position) - position:min(end, block_end) - position])
+                if end > block_end:
+                    break
+                index += 1
+            position = block_end
+    return position
+
+
+def decode_to_wav(source_path, output_path, kept):
+    """Décode (et normalise) l'audio avec ffmpeg et n'en garde que les intervalles kept"""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", source_path]
+    if LOUDNESS_NORMALIZATION:
+        cmd += ["-af", LOUDNESS_FILTER]
+    cmd += ["-f", "s16le", "-ar", str(PCM_SAMPLE_RATE), "-ac", "1", "pipe:1"]
+    decoder_errors = tempfile.TemporaryFile()
+    decoder = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=decoder_errors)
+    RUNNING_PROCESSES.add(decoder)
+    try:
+        position = write_pcm_intervals(decoder.stdout.read, output_path, kept)
+        returncode = decoder.wait()
+    finally:
+        RUNNING_PROCESSES.discard(decoder)
+        if decoder.poll() is None:
+            decoder.kill()
+    if returncode != 0:
+        decoder_errors.seek(0)
+        raise Exception(f"Erreur de prétraitement ffmpeg: {decoder_errors.read().decode(errors='replace')[-2000:]}")
+    decoder_errors.close()
+    return position
+
+
+def preprocess_audio(source_path, output_path, duration=None, vad=False):
+    """Convertit l'audio en WAV 16kHz mono, sans les longs silences et au volume normalisé.
+
+    ffmpeg décode (et normalise) vers du PCM brut; les intervalles gardés sont copiés à
+    l'échantillon près dans le WAV, ce qui rend la table de correspondance exacte. Avec vad,
+    seuls les intervalles de parole sont gardés (musique et silences retirés).
+    """
+    if vad:
+        # La détection a besoin de tout le PCM: décodage complet, puis copie des zones de parole
+        decoded_path = f"{output_path}.decoded.wav"
+        try:
+            decode_to_wav(source_path, decoded_path, [(0, float("inf"))])
+            vad_start = time.time()
+            intervals = detect_speech(decoded_path)
+            logger.info(f"[PREPROCESS] VAD: {len(intervals)} zones de parole en {time.time() - vad_start:.1f}s")
+            if not intervals:
+                logger.warning("[PREPROCESS] VAD: aucune parole détectée, audio transmis en entier")
+                intervals = [(0.0, float("inf"))]
+            kept = to_pcm_intervals(intervals)
+            with wave.open(decoded_path, "rb") as decoded:
+                position = write_pcm_intervals(lambda size: decoded.readframes(size // 2), output_path, kept)
+        finally:
+            try:
+                os.unlink(decoded_path)
+            except OSError:
+                pass
+    else:
+        intervals = [(0.0, float("inf"))]
+        if TRIM_SILENCE:
+            silences = detect_silences(source_path, TRIM_SILENCE_MIN_DURATION)
+            intervals = plan_speech_intervals(duration or float("inf"), silences)
+        kept = to_pcm_intervals(intervals)
+        position = decode_to_wav(source_path, output_path, kept)
+
+    timeline = []
+    processed = 0
+    for start, end in kept:
+        end = min(end, position)
+        if end > start:
+            timeline.append([processed / PCM_BYTES_PER_SECOND, start / PCM_BYTES_PER_SECOND, end / PCM_BYTES_PER_SECOND])
+            processed += end - start
+    if len(timeline) == 1 and timeline[0][1] == 0 and processed == position:
+        timeline = []  # Rien n'a été retiré
+    return {
+        "path": output_path,
+        "duration": position / PCM_BYTES_PER_SECOND,
+        "processed_duration": processed / PCM_BYTES_PER_SECOND,
+        "timeline": timeline,
+    }
+
+
+def prepare_whisper_input(audio_path, audio_duration, vad=False):
+    """Prétraitement de l'audio téléchargé (voir preprocess_audio), None si désactivé ou impossible"""
+    if not (AUDIO_PREPROCESSING or vad):
+        return None
+    preprocess_start = time.time()
+    preprocessed_path = f"{os.path.splitext(audio_path)[0]}_16k.wav"
+    try:
+        preprocessed = preprocess_audio(audio_path, preprocessed_path, audio_duration, vad=vad)
+    except Exception as e:
+        logger.warning(f"[PREPROCESS] Prétraitement impossible, audio transmis tel quel à whisper: {e}")
+        try:
+            os.unlink(preprocessed_path)
+        except OSError:
+            pass
+        return None
+    logger.info(
+        f"[PREPROCESS] WAV 16kHz mono en {time.time() - preprocess_start:.1f}s: "
+        f"{preprocessed['duration']:.0f}s -> {preprocessed['processed_duration']:.0f}s d'audio "
+        f"({len(preprocessed['timeline'])} intervalles de parole)"
+    )
+    return preprocessed
+
+
+# === MOTEURS RÉSIDENTS: whisper-server garde les poids des modèles en mémoire ===
+# "cli" (défaut): un whisper-cli par tâche; "server": whisper-server résident; "auto": résident pour les clips courts
+WHISPER_ENGINE = os.environ.get("WHISPER_ENGINE", "cli").lower()
+ENGINE_SERVER_THREADS = int(os.environ.get("ENGINE_SERVER_THREADS", "0"))  # 0 = threads d'une transcription
+ENGINE_SERVER_MAX_DURATION = int(os.environ.get("ENGINE_SERVER_MAX_DURATION", "900"))  # Mode auto: clips < 15 min
+ENGINE_STARTUP_TIMEOUT = 300  # Chargement de large-v3 compris
+# Processus qui chargent chacun leurs modèles: WEB_CONCURRENCY est aussi le nombre de workers par défaut de gunicorn
+SERVER_PROCESSES = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+# Budget mémoire des modèles résidents par processus, défaut: 60% de la mémoire du conteneur partagés entre processus
+MODEL_MEMORY_BUDGET_MB = int(
+    os.environ.get("MODEL_MEMORY_BUDGET_MB", str(int(get_memory_limit_mb() * 0.6 / SERVER_PROCESSES)))
+)
+MODEL_MEMORY_OVERHEAD_MB = 200  # Contexte, buffers de calcul et KV cache au-delà des poids
+PRELOAD_MODELS = [m.strip() for m in os.environ.get("PRELOAD_MODELS", "").split(",") if m.strip()]
+ENGINE_SERVERS = {}  # chemin du modèle -> moteur résident
+ENGINE_SERVERS_LOCK = threading.Lock()
+ENGINE_SESSION = requests.Session()
+
+
+def model_name_from_path(model_path):
+    """ggml-large-v3.bin -> large-v3"""
+    name = os.path.basename(model_path)
+    if name.startswith("ggml-"):
+        name = name[len("ggml-"):]
+    return name[:-len(".bin")] if name.endswith(".bin") else name
+
+
+def get_engine_server_threads():
+    """Threads d'un moteur résident: ENGINE_SERVER_THREADS, sinon le budget d'une transcription, comme whisper-cli"""
+    return ENGINE_SERVER_THREADS or get_task_cpu_budget()
+
+
+def get_engine_server_binary():
+    """Chemin du binaire whisper-server compilé avec whisper.cpp"""
+    return f"{WHISPER_PATH}/build/bin/whisper-server"
+
+
+def find_free_port():
+    """Port TCP libre sur la boucle locale"""
+    import socket
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def estimate_model_memory_mb(model_path):
+    """Mémoire attendue d'un modèle chargé: taille des poids plus une marge fixe"""
+    try:
+        weights_mb = os.path.getsize(model_path) / 1024 / 1024
+    except OSError:
+        weights_mb = 0
+    return int(weights_mb * 1.1 + MODEL_MEMORY_OVERHEAD_MB)
+
+
+def get_engine_memory_mb(engine):
+    """RSS mesurée du processus whisper-server (estimation tant qu'il charge)"""
+    try:
+        return int(psutil.Process(engine["process"].pid).memory_info().rss / 1024 / 1024)
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return engine["estimated_mb"]
+
+
+def start_engine_server(model_path):
+    """Lance un whisper-server pour un modèle et attend la fin du chargement"""
+    port = find_free_port()
+    os.makedirs(STATE_DIR, exist_ok=True)
+    log_path = os.path.join(STATE_DIR, f"engine_{os.path.basename(model_path)}_{os.getpid()}.log")
+    log_file = open(log_path, "w")
+    threads = get_engine_server_threads()
+    cmd = [
+        get_engine_server_binary(),
+        "-m", model_path,
+        "--host", "127.0.0.1",
+        "--port", str(port),
+        "-t", str(threads),
+        "--convert",  # Conversion ffmpeg côté moteur: accepte mp3, m4a, ogg...
+    ]
+    logger.info(f"[ENGINE] Démarrage du moteur résident: {' '.join(cmd)}")
+    process = subprocess.Popen(
+        cmd, stdout=subprocess.DEVNULL, stderr=log_file, cwd=WHISPER_PATH
+    )
+    log_file.close()
+    engine = {
+        "model_path": model_path,
+        "process": process,
+        "port": port,
+        "threads": threads,
+        "url": f"http://127.0.0.1:{port}",
+        "lock": threading.Lock(),  # whisper-server traite une requête à la fois
+        "started_at": time.time(),
+        "last_used": time.time(),
+        "requests": 0,
+        "in_use": 0,
+        "estimated_mb": estimate_model_memory_mb(model_path),
+    }
+
+    deadline = time.time() + ENGINE_STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise Exception(f"whisper-server s'est arrêté au démarrage (code {process.returncode}), voir {log_path}")
+        try:
+            if ENGINE_SESSION.get(f"{engine['url']}/health", timeout=2).status_code == 200:
+                engine["load_time"] = time.time() - engine["started_at"]
+                logger.info(
+                    f"[ENGINE] Modèle {os.path.basename(model_path)} chargé en {engine['load_time']:.1f}s "
+                    f"(PID {process.pid}, port {port}, {get_engine_memory_mb(engine)}MB)"
+                )
+                return engine
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.kill()
+    raise Exception(f"whisper-server n'a pas démarré en {ENGINE_STARTUP_TIMEOUT}s")
+
+
+def stop_engine(engine):
+    """Arrête un moteur résident et attend la libération de sa mémoire"""
+    if engine["process"].poll() is None:
+        engine["process"].terminate()
+        try:
+            engine["process"].wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            engine["process"].kill()
+
+
+def make_room_for_model(model_path):
+    """Évince les moteurs inactifs les moins récemment utilisés pour tenir dans le budget mémoire.
+
+    Appelé avec ENGINE_SERVERS_LOCK. Lève une exception si le modèle ne peut pas être chargé
+    sans dépasser le budget ou la mémoire disponible du système.
+    """
+    needed_mb = estimate_model_memory_mb(model_path)
+    while True:
+        used_mb = sum(get_engine_memory_mb(engine) for engine in ENGINE_SERVERS.values())
+        available_mb = get_memory_headroom_mb()
+        if used_mb + needed_mb <= MODEL_MEMORY_BUDGET_MB and needed_mb <= available_mb:
+            return
+        idle = [engine for engine in ENGINE_SERVERS.values() if engine["in_use"] == 0]
+        if not idle:
+            raise Exception(
+                f"Mémoire insuffisante pour charger {os.path.basename(model_path)} "
+                f"({needed_mb}MB requis, {used_mb}MB utilisés sur {MODEL_MEMORY_BUDGET_MB}MB, "
+                f"{available_mb:.0f}MB disponibles)"
+            )
+        victim = min(idle, key=lambda engine: engine["last_used"])
+        logger.info(
+            f"[ENGINE] Éviction LRU de {os.path.basename(victim['model_path'])} "
+            f"({get_engine_memory_mb(victim)}MB) pour charger {os.path.basename(model_path)}"
+        )
+        stop_engine(victim)
+        del ENGINE_SERVERS[victim["model_path"]]
+
+
+def acquire_engine_server(model_path):
+    """Moteur résident pour ce modèle (chargé au besoin), réservé jusqu'à release_engine_server"""
+    with ENGINE_SERVERS_LOCK:
+        engine = ENGINE_SERVERS.get(model_path)
+        if engine and engine["process"].poll() is not None:
+            logger.warning(f"[ENGINE] Moteur {os.path.basename(model_path)} arrêté (code {engine['process'].returncode}), redémarrage")
+            del ENGINE_SERVERS[model_path]
+            engine = None
+        # Concurrence montée depuis le démarrage: le moteur inactif est relancé avec moins de threads, sans quoi
+        # il prendrait les cœurs des autres transcriptions (un budget plus large ne justifie pas de recharger)
+        if engine and engine["in_use"] == 0 and engine["threads"] > get_engine_server_threads():
+            logger.info(
+                f"[ENGINE] Moteur {os.path.basename(model_path)} relancé: {engine['threads']} -> "
+                f"{get_engine_server_threads()} threads ({CONCURRENCY['target']} transcriptions visées)"
+            )
+            stop_engine(engine)
+            del ENGINE_SERVERS[model_path]
+            engine = None
+        if engine is None:
+            make_room_for_model(model_path)
+            engine = start_engine_server(model_path)
+            ENGINE_SERVERS[model_path] = engine
+        engine["in_use"] += 1
+        engine["last_used"] = time.time()
+        return engine
+
+
+def release_engine_server(engine):
+    """Libère la réservation d'un moteur résident"""
+    with ENGINE_SERVERS_LOCK:
+        engine["in_use"] -= 1
+        engine["last_used"] = time.time()
+
+
+def preload_models():
+    """Charge les modèles de PRELOAD_MODELS au démarrage (dans la limite du budget)"""
+    for model in PRELOAD_MODELS:
+        model_path = f"{WHISPER_PATH}/models/ggml-{model}.bin"
+        if not os.path.exists(model_path):
+            logger.warning(f"[ENGINE] Préchargement ignoré, modèle absent: {model}")
+            continue
+        try:
+            release_engine_server(acquire_engine_server(model_path))
+        except Exception as e:
+            logger.warning(f"[ENGINE] Préchargement de {model} impossible: {e}")
+
+
+def get_engines_status():
+    """Modèles résidents et consommation mémoire, pour /models"""
+    with ENGINE_SERVERS_LOCK:
+        loaded = [
+            {
+                "model": model_name_from_path(engine["model_path"]),
+                "pid": engine["process"].pid,
+                "threads": engine["threads"],
+                "rss_mb": get_engine_memory_mb(engine),
+                "load_time": round(engine.get("load_time", 0), 1),
+                "in_use": engine["in_use"],
+                "requests": engine["requests"],
+                "last_used": datetime.fromtimestamp(engine["last_used"]).isoformat(),
+            }
+            for engine in sorted(ENGINE_SERVERS.values(), key=lambda e: e["last_used"], reverse=True)
+        ]
+    return {
+        "engine_mode": WHISPER_ENGINE,
+        "loaded": loaded,
+        "memory_used_mb": sum(engine["rss_mb"] for engine in loaded),
+        "memory_budget_mb": MODEL_MEMORY_BUDGET_MB,
+    }
+
+
+def stop_engine_servers():
+    """Arrête tous les moteurs résidents de ce processus"""
+    with ENGINE_SERVERS_LOCK:
+        for engine in ENGINE_SERVERS.values():
+            if engine["process"].poll() is None:
+                engine["process"].terminate()
+        ENGINE_SERVERS.clear()
+
+
+def should_use_engine_server(audio_duration):
+    """Choix du moteur résident selon WHISPER_ENGINE et la durée de l'audio"""
+    if WHISPER_ENGINE == "cli" or not os.path.exists(get_engine_server_binary()):
+        return False
+    if WHISPER_ENGINE == "server":
+        return True
+    return audio_duration is not None and audio_duration <= ENGINE_SERVER_MAX_DURATION
+
+
+def transcribe_with_engine_server(audio_path, model_path, language, word_thold,
+                                  no_speech_thold, prompt, timings=None, decoding=None):
+    """Envoie un fichier au moteur résident et renvoie ses segments.
+
+    timings: dictionnaire où noter le chargement du modèle ("model_load", 0 si déjà résident)
+    decoding: options de décodage; threads, processors et flash_attn sont fixés au démarrage du moteur
+    """
+    acquire_start = time.time()
+    engine = acquire_engine_server(model_path)
+    if timings is not None:
+        timings["model_load"] = round(time.time() - acquire_start, 3)
+    data = {
+        "language": language,
+        "word_thold": str(word_thold),
+        "no_speech_thold": str(no_speech_thold),
+        "response_format": "verbose_json",
+    }
+    if prompt:
+        data["prompt"] = prompt
+    for option in ("beam_size", "best_of", "temperature", "temperature_inc", "max_context"):
+        if (decoding or {}).get(option) is not None:
+            data[option] = str(decoding[option])
+    try:
+        with engine["lock"]:
+            engine["requests"] += 1
+            with open(audio_path, "rb") as audio_file:
+                response = ENGINE_SESSION.post(
+                    f"{engine['url']}/inference",
+                    files={"file": (os.path.basename(audio_path), audio_file)},
+                    data=data,
+                    timeout=MAX_TRANSCRIPTION_TIME,
+                )
+    finally:
+        release_engine_server(engine)
+    response.raise_for_status()
+    payload = response.json()
+    if "error" in payload:
+        raise Exception(f"Erreur du moteur résident: {payload['error']}")
+    return [
+        {"start": float(seg["start"]), "end": float(seg["end"]), "text": seg["text"].strip()}
+        for seg in payload.get("segments", [])
+    ]
+
+
+# === FONCTION PRINCIPALE DE TRANSCRIPTION: CACHE PUIS PIPELINE ===
+def run_whisper_transcription(
+    audio_url,
     language,
+    model,
     output_format,
-    no_timestamps=False,
-    word_thold=0.005,
-    no_speech_thold=0.40,
-    prompt=None,
+    word_thold,
+    no_speech_thold,
+    prompt,
+    logger,
+    request=None,
+    task_id=None,
+    chunking=None,
+    streaming=None,
+    vad=None,
+    quality=None,
+    decoding=None,
+    keep_audio=False,
 ):
-    cmd = [
-        f"{whisper_path}/build/bin/whisper-cli",
-        "-m",
-        model_path,
-        "-f",
-        temp_file_path,
-        "-l",
+    vad = DEFAULT_VAD if vad is None else bool(vad)
+    cache_params = {
+        "audio_url": audio_url,
+        "language": language,
+        "model": model,
+        "output_format": output_format,
+        "word_thold": word_thold,
+        "no_speech_thold": no_speech_thold,
+        "prompt": prompt,
+        "chunking": chunking,
+        "streaming": streaming,
+        "vad": vad,
+        "quality": quality,
+        "decoding": decoding,
+    }
+    # URL déjà vue: résultat sans même retélécharger l'audio
+    cached = lookup_cached_result_for_url(cache_params)
+    if cached:
+        return cached
+
+    result = run_whisper_pipeline(
+        audio_url,
         language,
-        f"-o{output_format}",
-        "--word-thold",
-        str(word_thold),
-        "--no-speech-thold",
-        str(no_speech_thold),
-    ]
-    if prompt:
-        cmd.extend(["--prompt", prompt])
-    if no_timestamps and output_format == "txt":
-        cmd.append("--no-timestamps")
-    return cmd
+        model,
+        output_format,
+        word_thold,
+        no_speech_thold,
+        prompt,
+        logger,
+        request=request,
+        task_id=task_id,
+        chunking=chunking,
+        streaming=streaming,
+        vad=vad,
+        cache_params=cache_params,
+        quality=quality or DEFAULT_QUALITY,
+        decoding=resolve_decoding_options(quality, decoding),
+        keep_audio=keep_audio,
+    )
 
+    if result.get("model") and result["model"] != f"whisper-{model}-{language}":
+        # Modèle demandé absent: le résultat indique le modèle réellement utilisé
+        result["requested_model"] = model
 
-# === FONCTION PRINCIPALE DE TRANSCRIPTION AVEC SUIVI DE PROGRESSION LONGUE DUREE ===
-def run_whisper_transcription(
+    if result.get("success") and not result.get("cached"):
+        observe_transcription(result, model, output_format)
+    if result.get("success") and not result.get("cached") and result.get("audio_hash"):
+        try:
+            increment_cache_stat("misses")
+            cache_put(build_cache_key(result["audio_hash"], cache_params), result)
+        except Exception as e:
+            logger.warning(f"[CACHE] Écriture impossible: {e}")
+    return result
+
+
+# === PIPELINE DE TRANSCRIPTION AVEC SUIVI DE PROGRESSION LONGUE DUREE ===
+def run_whisper_pipeline(
     audio_url,
     language,
     model,
@@ -273,63 +3959,289 @@ def run_whisper_transcription(
     logger,
     request=None,
     task_id=None,
+    chunking=None,
+    streaming=None,
+    vad=False,
+    cache_params=None,
+    quality=None,
+    decoding=None,
+    keep_audio=False,
 ):
+    """keep_audio: audio et point de reprise gardés après le succès (brouillon avant l'affinage)"""
     import tempfile, requests, os, subprocess, time, uuid, urllib.parse
 
-    logger.info(f"[WHISPER] Début run_whisper_transcription pour {audio_url}")
+    logger.info(f"[WHISPER] Début run_whisper_pipeline pour {audio_url}")
+    start_time = time.time()
+
+    # Résolution du modèle (repli sur base si absent)
+    model_path = f"{WHISPER_PATH}/models/ggml-{model}.bin"
+    if not os.path.exists(model_path):
+        logger.warning(f"[WHISPER] Modèle {model} introuvable, repli sur {os.path.basename(MODEL_PATH)}")
+        model_path = MODEL_PATH
+        model = model_name_from_path(MODEL_PATH)
+
+    # Fichier des segments: celui de la tâche (flux SSE, reprise) ou un fichier temporaire
+    spill_id = task_id or f"direct_{uuid.uuid4().hex}"
+
+    # Mode flux: téléchargement, décodage ffmpeg et transcription se recouvrent
+    if streaming if streaming is not None else DEFAULT_STREAMING:
+        reset_task_segments(task_id)
+        try:
+            streamed = run_streaming_transcription(
+                audio_url,
+                model_path,
+                language,
+                word_thold,
+                no_speech_thold,
+                prompt,
+                task_id=task_id,
+                decoding=decoding,
+                segments_id=spill_id,
+                deadline=start_time + MAX_TRANSCRIPTION_TIME,
+            )
+        except Exception:
+            if not task_id:
+                reset_task_segments(spill_id)
+            raise
+        remember_audio_hash(audio_url, streamed["audio_hash"])
+        update_task_progress(task_id, 95, "processing_result")
+        result = render_task_transcription(spill_id, output_format, task_id)
+        processing_time = time.time() - start_time
+        logger.info(
+            f"[WHISPER] Fin transcription en flux, durée: {processing_time/3600:.2f}h ({processing_time:.0f}s)"
+        )
+        return {
+            **result,
+            "success": True,
+            "model": f"whisper-{model}-{language}",
+            "processing_time": processing_time,
+            "time_to_first_segment": streamed["time_to_first_segment"],
+            "file_size": streamed["file_size"],
+            "audio_hash": streamed["audio_hash"],
+            "streaming": True,
+            "chunks": streamed["chunks"],
+            "quality": quality,
+            "decoding": decoding,
+        }
+
+    def discard_audio():
+        if keep_audio:
+            return
+        for path in filter(None, [temp_file_path, whisper_input_path]):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        remove_task_work_dir(task_id)
+
+    # Durée de chaque étape (secondes), enregistrée sur la tâche au fil de l'eau et renvoyée dans le résultat
+    timings = {}
+
+    def record_timing(stage, seconds):
+        timings[stage] = round(seconds, 3)
+        update_task(task_id, timings=timings)
 
-    # Détection automatique du mode (Docker vs Local)
-    if os.path.exists("/opt/whisper.cpp"):
-        WHISPER_PATH = "/opt/whisper.cpp"  # Mode Docker
+    whisper_input_path = None
+    stage_start = time.time()
+    wait_for_prefetch(task_id)
+    checkpoint = load_checkpoint(task_id)
+    if checkpoint:
+        # Reprise: l'audio est déjà sur disque et les segments terminés sont conservés
+        temp_file_path = checkpoint["audio_path"]
+        file_size = checkpoint["file_size"]
+        audio_hash = checkpoint["audio_hash"]
+        if checkpoint["segments"]:
+            logger.info(
+                f"[CHECKPOINT] Reprise de la tâche {task_id} à {checkpoint['offset']:.0f}s "
+                f"({checkpoint['segments']} segments conservés), audio déjà téléchargé"
+            )
+        else:
+            logger.info(f"[WHISPER] Audio déjà téléchargé: {temp_file_path} ({file_size} bytes)")
     else:
-        WHISPER_PATH = os.path.expanduser("~/whisper.cpp")  # Mode Local macOS
-    
-    MODEL_PATH = f"{WHISPER_PATH}/models/ggml-base.bin"
-    MAX_FILE_SIZE = 150 * 1024 * 1024
-    start_time = time.time()
+        reset_task_segments(task_id)
+        if is_uploaded_audio(audio_url):
+            raise Exception("Fichier téléversé introuvable, il doit être envoyé de nouveau")
 
-    # Phase 1: Téléchargement (10-20%)
-    update_task_progress(task_id, 10, "downloading")
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-        response = requests.get(audio_url, stream=True, timeout=300)  # Augmenté à 5min
-        response.raise_for_status()
-        file_size = 0
-        total_size = int(response.headers.get("content-length", 0))
+        # Phase 1: Téléchargement (10-20%)
+        update_task_progress(task_id, 10, "downloading")
+        # Tâches de la file: l'audio est gardé dans le dossier de travail jusqu'à la fin (reprise)
+        work_dir = get_task_work_dir(task_id) if task_id else None
+        if work_dir:
+            os.makedirs(work_dir, exist_ok=True)
+        try:
+            temp_file_path, file_size, audio_hash, download_stats = download_audio(audio_url, work_dir, task_id)
+        except Exception:
+            remove_task_work_dir(task_id)
+            raise
 
-        for chunk in response.iter_content(chunk_size=8192):
-            if file_size > MAX_FILE_SIZE:
-                os.unlink(temp_file.name)
-                raise Exception("Fichier trop volumineux (max 150MB)")
-            temp_file.write(chunk)
-            file_size += len(chunk)
+        update_task_progress(task_id, 20, "preparing")
+        update_task(task_id, download=download_stats)
+        logger.info(f"[WHISPER] Fichier téléchargé: {temp_file_path} ({file_size} bytes)")
 
-            # Mise à jour progression téléchargement
-            if total_size > 0 and task_id:
-                download_progress = 10 + (file_size / total_size) * 10  # 10-20%
-                update_task_progress(task_id, int(download_progress))
+        if task_id:
+            save_checkpoint(
+                task_id, audio_url=audio_url, audio_path=temp_file_path,
+                audio_hash=audio_hash, file_size=file_size,
+            )
 
-        temp_file_path = temp_file.name
+    record_timing("download", time.time() - stage_start)
 
-    update_task_progress(task_id, 20, "preparing")
-    logger.info(f"[WHISPER] Fichier téléchargé: {temp_file_path} ({file_size} bytes)")
+    # Même audio déjà transcrit (autre URL signée, resoumission): pas de nouvelle transcription
+    if not is_uploaded_audio(audio_url):
+        remember_audio_hash(audio_url, audio_hash)
+    cached = get_cached_transcription(audio_hash, cache_params) if cache_params else None
+    if cached:
+        discard_audio()
+        cached["file_size"] = file_size
+        return cached
 
-    # Phase 2: Préparation du modèle (20-25%)
-    model_path = f"{WHISPER_PATH}/models/ggml-{model}.bin"
-    if not os.path.exists(model_path):
-        model_path = MODEL_PATH
+    # Seul whisper-cli reprend à une position; morceaux et moteur résident repartent du début
+    resume_offset = checkpoint["offset"] if checkpoint else 0.0
+
+    # Durée de l'audio: base de la progression, de l'ETA et du choix du moteur
+    stage_start = time.time()
+    audio_duration = probe_audio_duration(temp_file_path)
+
+    # Phase 2: Prétraitement (20-25%): WAV 16kHz mono, longs silences retirés, volume normalisé
+    preprocessed = checkpoint.get("preprocessed") if checkpoint else None
+    if preprocessed and not os.path.exists(preprocessed["path"]):
+        preprocessed = None
+    if not preprocessed and (AUDIO_PREPROCESSING or vad):
+        update_task_progress(task_id, 20, "preprocessing")
+        preprocessed = prepare_whisper_input(temp_file_path, audio_duration, vad=vad)
+        if preprocessed and task_id:
+            save_checkpoint(
+                task_id, audio_url=audio_url, audio_path=temp_file_path,
+                audio_hash=audio_hash, file_size=file_size, preprocessed=preprocessed,
+            )
+    if preprocessed:
+        whisper_input_path = preprocessed["path"]
+        timeline = preprocessed["timeline"]
+        audio_duration = audio_duration or preprocessed["duration"]
+        processed_duration = preprocessed["processed_duration"]
+    else:
+        whisper_input_path = temp_file_path
+        timeline = []
+        processed_duration = audio_duration
+    if audio_duration:
+        update_task(task_id, audio_duration=round(audio_duration, 1))
+    record_timing("preprocess", time.time() - stage_start)
 
     cmd = build_whisper_cmd(
         WHISPER_PATH,
         model_path,
-        temp_file_path,
+        whisper_input_path,
         language,
         output_format,
-        no_timestamps=(output_format == "txt"),
         word_thold=word_thold,
         no_speech_thold=no_speech_thold,
         prompt=prompt,
+        # Plusieurs décodeurs (-p) se partagent les threads de la tâche
+        threads=max(1, get_task_cpu_budget() // (decoding or {}).get("processors", 1)),
+        offset=to_processed_time(resume_offset, timeline),
+        decoding=decoding,
     )
 
+    # Fichiers longs: découpage et transcription parallèle sur plusieurs processus
+    transcription_start = time.time()
+    requested_chunking = (chunking or DEFAULT_CHUNKING).lower()
+    try:
+        chunking_mode = resolve_chunking_mode(requested_chunking, processed_duration)
+    except ValueError:
+        discard_audio()
+        raise
+    if chunking_mode != "none":
+        update_task_progress(task_id, 25, "transcribing")
+        reset_task_segments(task_id)
+        try:
+            segment_count, chunk_count, first_segment_time = run_chunked_transcription(
+                whisper_input_path,
+                processed_duration,
+                chunking_mode,
+                model_path,
+                language,
+                word_thold,
+                no_speech_thold,
+                prompt,
+                task_id=task_id,
+                timeline=timeline,
+                decoding=decoding,
+                segments_id=spill_id,
+                deadline=start_time + MAX_TRANSCRIPTION_TIME,
+            )
+        except Exception:
+            if not task_id:
+                reset_task_segments(spill_id)
+            raise
+        finally:
+            discard_audio()
+        record_timing("inference", time.time() - transcription_start)
+        if first_segment_time is not None:
+            record_timing("first_segment", first_segment_time)
+        update_task_progress(task_id, 95, "processing_result")
+        finalize_start = time.time()
+        # Rendu depuis les segments assemblés sur disque, comme pour un seul processus
+        result = render_task_transcription(spill_id, output_format, task_id)
+        record_timing("finalize", time.time() - finalize_start)
+        processing_time = time.time() - start_time
+        logger.info(
+            f"[WHISPER] Fin transcription par morceaux ({segment_count} segments), "
+            f"durée: {processing_time/3600:.2f}h ({processing_time:.0f}s)"
+        )
+        return {
+            **result,
+            "success": True,
+            "model": f"whisper-{model}-{language}",
+            "processing_time": processing_time,
+            "time_to_first_segment": first_segment_time,
+            "file_size": file_size,
+            "audio_hash": audio_hash,
+            "audio_duration": audio_duration,
+            "timings": timings,
+            "chunking": chunking_mode,
+            "chunks": chunk_count,
+            "quality": quality,
+            "decoding": decoding,
+        }
+
+    # Clips courts: moteur résident qui garde le modèle chargé entre les requêtes
+    if not resume_offset and should_use_engine_server(processed_duration):
+        update_task_progress(task_id, 25, "transcribing")
+        try:
+            segments = remap_segments(transcribe_with_engine_server(
+                whisper_input_path, model_path, language, word_thold, no_speech_thold, prompt, timings=timings,
+                decoding=decoding,
+            ), timeline)
+        except Exception as e:
+            logger.warning(f"[ENGINE] Échec du moteur résident, repli sur whisper-cli: {e}")
+            segments = None
+        if segments is not None:
+            discard_audio()
+            # Chargement du modèle (moteur démarré pour cette requête) compté à part
+            record_timing("inference", time.time() - transcription_start - timings.get("model_load", 0))
+            finalize_start = time.time()
+            reset_task_segments(task_id)
+            append_task_segments(task_id, segments)
+            update_task_progress(task_id, 95, "processing_result")
+            transcription = format_segments(segments, output_format)
+            record_timing("finalize", time.time() - finalize_start)
+            processing_time = time.time() - start_time
+            logger.info(f"[WHISPER] Fin transcription par le moteur résident, durée: {processing_time:.1f}s")
+            return {
+                "success": True,
+                "transcription": transcription,
+                "model": f"whisper-{model}-{language}",
+                "processing_time": processing_time,
+                "time_to_first_segment": processing_time if segments else None,
+                "file_size": file_size,
+                "audio_hash": audio_hash,
+                "audio_duration": audio_duration,
+                "timings": timings,
+                "engine": "server",
+                "quality": quality,
+                "decoding": decoding,
+            }
+
     update_task_progress(task_id, 25, "transcribing")
     logger.info(f"[WHISPER] Exécution: {' '.join(cmd)}")
 
@@ -339,159 +4251,138 @@ def run_whisper_transcription(
             cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
             cwd=WHISPER_PATH,
-            bufsize=1,
-            universal_newlines=True,
         )
+        RUNNING_PROCESSES.add(process)
+        transcribe_start = time.time()
 
         # MONITORING PID ET DÉBUT
         logger.info(f"[WHISPER] Processus démarré avec PID: {process.pid}")
         logger.info(f"[WHISPER] Début transcription à {datetime.now().isoformat()}")
         logger.info(f"[WHISPER] Timeout configuré pour: {MAX_TRANSCRIPTION_TIME/3600:.1f}h")
-        
-        stdout_lines = []
-        stderr_lines = []
-        progress_count = 0
-        last_progress_update = time.time()
-        last_activity_time = time.time()
-        last_resource_check = time.time()
-        last_major_log = time.time()  # Pour logger moins souvent
 
-        try:
-            while True:
-                stdout_line = process.stdout.readline() if process.stdout else None
-                stderr_line = process.stderr.readline() if process.stderr else None
-
-                current_time = time.time()
-                
-                # --- Surveillance des ressources système (toutes les 10 min) ---
-                if current_time - last_resource_check > RESOURCE_CHECK_INTERVAL:
-                    log_system_resources()
-                    last_resource_check = current_time
-
-                # --- Log de progression major toutes les heures ---
-                if current_time - last_major_log > 3600:  # 1h
-                    elapsed_hours = (current_time - start_time) / 3600
-                    logger.info(f"[WHISPER] Transcription en cours depuis {elapsed_hours:.1f}h - PID: {process.pid} - Segments: {progress_count}")
-                    last_major_log = current_time
-
-                # --- Vérification de blocage (2h au lieu de 1h) ---
-                if current_time - last_activity_time > ACTIVITY_TIMEOUT:
-                    elapsed_hours = (current_time - start_time) / 3600
-                    logger.warning(f"[WHISPER] Aucune activité depuis {ACTIVITY_TIMEOUT/60:.0f} minutes (durée totale: {elapsed_hours:.1f}h) - PID: {process.pid}")
-                    # On ne fait que logger, on ne tue pas le processus
-                    last_activity_time = current_time
-                    
-                # --- Heartbeat du processus toutes les 3 minutes ---
-                if current_time - last_progress_update > PROCESS_HEARTBEAT_INTERVAL:
-                    elapsed_hours = (current_time - start_time) / 3600
-                    logger.info(f"[WHISPER] Heartbeat - Transcription active depuis {elapsed_hours:.1f}h - PID: {process.pid} - Segments: {progress_count}")
-                    last_progress_update = current_time
-                    
-                # --- Keepalive Coolify toutes les minutes ---
-                if current_time - last_progress_update > COOLIFY_KEEPALIVE_INTERVAL:
-                    # Forcer un log pour maintenir l'activité
-                    logger.debug(f"[COOLIFY] Keepalive - PID: {process.pid} - Segments: {progress_count}")
-                    last_progress_update = current_time
-
-                # --- Timeout global augmenté à 24h ---
-                if current_time - start_time > MAX_TRANSCRIPTION_TIME:
-                    elapsed_hours = (current_time - start_time) / 3600
-                    logger.error(f"[WHISPER] Timeout global dépassé ({elapsed_hours:.1f}h) - PID: {process.pid}")
-                    try:
-                        process.terminate()  # Terminate avant kill
-                        time.sleep(5)
-                        if process.poll() is None:
-                            process.kill()
-                    except:
-                        pass
-                    update_task_progress(task_id, 100, "error")
-                    if task_id in ASYNC_TASKS:
-                        ASYNC_TASKS[task_id]["result"] = f"Timeout global dépassé ({elapsed_hours:.1f}h)"
-                    break
+        # Mémoire bornée: les segments vont sur disque, seules les dernières lignes de log sont gardées
+        stdout_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        stderr_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+        monitor = {
+            "segments": 0,
+            "progress": 25,
+            "last_progress_update": time.time(),
+            "last_activity": time.time(),
+            "first_segment_time": None,  # whisper-cli n'écrit que les segments sur stdout
+            "model_loaded": None,  # Premier "processing" sur stderr: modèle chargé, décodage commencé
+            "timed_out": None,
+        }
 
-                # --- Surveillance active du process ---
-                if process.poll() is not None:
-                    elapsed_hours = (current_time - start_time) / 3600
-                    logger.info(f"[WHISPER] Processus terminé avec code: {process.returncode} après {elapsed_hours:.1f}h (PID: {process.pid})")
-                    if process.returncode != 0:
-                        update_task_progress(task_id, 100, "error")
-                        if task_id in ASYNC_TASKS:
-                            ASYNC_TASKS[task_id]["result"] = f"Processus Whisper terminé anormalement (code {process.returncode})"
-                    else:
-                        update_task_progress(task_id, 90, "finalizing")
-                    break
+        def set_progress(progress):
+            # Mise à jour moins fréquente: tous les 5% et max 1 toutes les 5 secondes
+            progress = int(min(progress, 90))
+            now = time.time()
+            if progress - monitor["progress"] >= 5 and now - monitor["last_progress_update"] > 5.0:
+                update_task_progress(task_id, progress)
+                monitor["progress"] = progress
+                monitor["last_progress_update"] = now
+
+        def on_line(stream, line):
+            now = time.time()
+            monitor["last_activity"] = now
+            kind, value = classify_whisper_line(stream, line)
+            if kind != "segment":
+                (stdout_tail if stream == "stdout" else stderr_tail).append(line)
+            else:
+                # Horodatages de l'audio prétraité -> fichier d'origine
+                value = remap_segments([value], timeline)[0]
+                if value["end"] <= resume_offset:
+                    return  # Déjà conservé par le point de reprise
+            if kind == "segment":
+                if monitor["first_segment_time"] is None:
+                    monitor["first_segment_time"] = now - start_time
+                    record_timing("first_segment", now - transcribe_start)
+                monitor["segments"] += 1
+                append_task_segments(spill_id, [value])
+                # Log tous les 500 segments
+                if monitor["segments"] % 500 == 0:
+                    elapsed_hours = (now - start_time) / 3600
+                    logger.info(f"[WHISPER] Progression: {monitor['segments']} segments traités après {elapsed_hours:.1f}h (PID: {process.pid})")
+                if audio_duration:
+                    # Position atteinte dans l'audio: fin du dernier segment (max 1 écriture / 5s)
+                    if now - monitor["last_progress_update"] > 5.0:
+                        report_audio_progress(task_id, value["end"], audio_duration, transcribe_start, resume_offset)
+                        monitor["progress"] = int(25 + min(value["end"] / audio_duration, 1.0) * 65)
+                        monitor["last_progress_update"] = now
+                else:
+                    # Durée inconnue: estimation basée sur le nombre de segments traités (25-90%)
+                    set_progress(25 + monitor["segments"] * 2)
+            elif kind == "percent" and not audio_duration:
+                # Mapper le pourcentage de Whisper sur notre échelle 25-90%
+                set_progress(25 + value * 65 / 100)
+            elif kind == "error":
+                logger.error(f"[WHISPER] Erreur: {line}")
+            elif kind == "warning":
+                logger.warning(f"[WHISPER] STDERR: {line}")
+            elif kind == "stage":
+                if value == 35 and monitor["model_loaded"] is None:
+                    monitor["model_loaded"] = now
+                    record_timing("model_load", now - transcribe_start)
+                if value > monitor["progress"]:
+                    update_task_progress(task_id, value)
+                    monitor["progress"] = value
+
+        # --- Minuteries indépendantes du débit de sortie ---
+        def check_resources(now):
+            log_system_resources()
+
+        def log_major_progress(now):
+            elapsed_hours = (now - start_time) / 3600
+            logger.info(f"[WHISPER] Transcription en cours depuis {elapsed_hours:.1f}h - PID: {process.pid} - Segments: {monitor['segments']}")
+
+        def heartbeat(now):
+            elapsed_hours = (now - start_time) / 3600
+            logger.info(f"[WHISPER] Heartbeat - Transcription active depuis {elapsed_hours:.1f}h - PID: {process.pid} - Segments: {monitor['segments']}")
+
+        def keepalive(now):
+            # Forcer un log pour maintenir l'activité
+            logger.debug(f"[COOLIFY] Keepalive - PID: {process.pid} - Segments: {monitor['segments']}")
+
+        def check_activity(now):
+            if now - monitor["last_activity"] > ACTIVITY_TIMEOUT:
+                elapsed_hours = (now - start_time) / 3600
+                logger.warning(f"[WHISPER] Aucune activité depuis {ACTIVITY_TIMEOUT/60:.0f} minutes (durée totale: {elapsed_hours:.1f}h) - PID: {process.pid}")
+                # On ne fait que logger, on ne tue pas le processus
+                monitor["last_activity"] = now
+
+        def check_global_timeout(now):
+            if now - start_time <= MAX_TRANSCRIPTION_TIME:
+                return False
+            elapsed_hours = (now - start_time) / 3600
+            logger.error(f"[WHISPER] Timeout global dépassé ({elapsed_hours:.1f}h) - PID: {process.pid}")
+            try:
+                process.terminate()  # Terminate avant kill
+                time.sleep(5)
+                if process.poll() is None:
+                    process.kill()
+            except:
+                pass
+            monitor["timed_out"] = f"Timeout global dépassé ({elapsed_hours:.1f}h)"
+            return True
+
+        try:
+            monitor_process(process, on_line, [
+                (RESOURCE_CHECK_INTERVAL, check_resources),
+                (3600, log_major_progress),  # Log de progression majeur toutes les heures
+                (PROCESS_HEARTBEAT_INTERVAL, heartbeat),
+                (COOLIFY_KEEPALIVE_INTERVAL, keepalive),
+                (60, check_activity),
+                (60, check_global_timeout),
+            ])
 
-                if stdout_line:
-                    last_activity_time = current_time  # Activité détectée
-                    stdout_lines.append(stdout_line.strip())
-                    line_content = stdout_line.strip()
-                    
-                    # Log debug seulement pour les lignes importantes
-                    if any(keyword in line_content.lower() for keyword in ["error", "warning", "progress"]):
-                        logger.debug(f"[WHISPER] STDOUT: {line_content}")
-
-                    # Analyse de la progression basée sur les logs de Whisper
-                    if any(
-                        keyword in line_content.lower()
-                        for keyword in ["progress", "segment", "frame"]
-                    ):
-                        progress_count += 1
-                        # Estimation de progression basée sur le nombre de segments traités
-                        estimated_progress = min(
-                            25 + (progress_count * 2), 90
-                        )  # 25-90%
-
-                        # Log tous les 500 segments au lieu de 100
-                        if progress_count % 500 == 0:
-                            elapsed_hours = (current_time - start_time) / 3600
-                            logger.info(f"[WHISPER] Progression: {progress_count} segments traités après {elapsed_hours:.1f}h (PID: {process.pid})")
-
-                        # Mise à jour moins fréquente: tous les 5% et max 1 toutes les 5 secondes
-                        if (estimated_progress - ASYNC_TASKS.get(task_id, {}).get("progress", 0) >= 5) and (time.time() - last_progress_update > 5.0):
-                            update_task_progress(task_id, int(estimated_progress))
-                            last_progress_update = time.time()
-
-                    # Détecter les pourcentages dans les logs si disponibles
-                    percentage_match = re.search(r"(\d+)%", line_content)
-                    if percentage_match:
-                        whisper_progress = int(percentage_match.group(1))
-                        # Mapper le pourcentage de Whisper sur notre échelle 25-90%
-                        our_progress = 25 + (whisper_progress * 65 / 100)
-                        if time.time() - last_progress_update > 5.0:
-                            update_task_progress(task_id, int(our_progress))
-                            last_progress_update = time.time()
-
-                if stderr_line:
-                    last_activity_time = current_time  # Activité détectée aussi sur stderr
-                    stderr_lines.append(stderr_line.strip())
-                    line_content = stderr_line.strip()
-                    
-                    # Log seulement les erreurs et avertissements importants
-                    if any(keyword in line_content.lower() for keyword in ["error", "warning", "failed"]):
-                        logger.warning(f"[WHISPER] STDERR: {line_content}")
-
-                    # Logs d'erreur et de progression depuis stderr
-                    if "error" in line_content.lower():
-                        logger.error(f"[WHISPER] Erreur: {line_content}")
-                    elif any(
-                        keyword in line_content.lower()
-                        for keyword in ["loading", "processing"]
-                    ):
-                        # Mise à jour progressive pour les étapes de chargement
-                        if "loading" in line_content.lower():
-                            update_task_progress(task_id, 30)
-                        elif "processing" in line_content.lower():
-                            update_task_progress(task_id, 35)
-
-            # Phase finale - SUPPRESSION DU TIMEOUT SUBPROCESS
-            update_task_progress(task_id, 90, "finalizing")
-            
-            # PAS DE TIMEOUT sur communicate() pour permettre transcriptions très longues
-            remaining_stdout, remaining_stderr = process.communicate()  # timeout supprimé!
-            stdout_lines.extend(remaining_stdout.splitlines())
-            stderr_lines.extend(remaining_stderr.splitlines())
+            # Les deux flux sont fermés: le processus se termine
+            returncode = process.wait()
+            elapsed_hours = (time.time() - start_time) / 3600
+            logger.info(f"[WHISPER] Processus terminé avec code: {returncode} après {elapsed_hours:.1f}h (PID: {process.pid})")
+            # Code non nul: l'appelant décide entre reprise et erreur (statut inchangé d'ici là)
+            if returncode == 0:
+                update_task_progress(task_id, 90, "finalizing")
 
         except Exception as e:
             logger.error(f"[WHISPER] Exception dans la boucle de monitoring: {e}")
@@ -503,54 +4394,74 @@ def run_whisper_transcription(
             except:
                 pass
             raise
+        finally:
+            RUNNING_PROCESSES.discard(process)
 
-        stdout = "\n".join(stdout_lines)
-        stderr = "\n".join(stderr_lines)
-        result = subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+        first_segment_time = monitor["first_segment_time"]
+        returncode = process.returncode
+        stderr = "\n".join(stderr_tail)
+        record_timing("inference", time.time() - (monitor["model_loaded"] or transcribe_start))
 
     finally:
+        # Fichier écrit par whisper-cli à côté de l'audio: le rendu est produit depuis les segments
         try:
-            os.unlink(temp_file_path)
-        except:
+            os.unlink(f"{whisper_input_path}.{output_format}")
+        except OSError:
             pass
+        # Avec un dossier de travail, l'audio reste pour une reprise jusqu'au succès
+        if not task_id:
+            for path in [temp_file_path, whisper_input_path]:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
 
-    if result.returncode != 0:
-        logger.error(f"[WHISPER] Erreur Whisper: {result.stderr}")
-        raise Exception(f"Erreur transcription: {result.stderr}")
+    if returncode != 0:
+        if not task_id:
+            reset_task_segments(spill_id)
+        if monitor["timed_out"]:
+            raise TranscriptionTimeoutError(monitor["timed_out"])
+        logger.error(f"[WHISPER] Erreur Whisper (code {returncode}): {stderr}")
+        raise Exception(f"Processus Whisper terminé anormalement (code {returncode}): {stderr}")
 
     # Phase 4: Récupération du résultat (95-100%)
     update_task_progress(task_id, 95, "processing_result")
+    finalize_start = time.time()
 
-    transcription = None
-    base_filename = os.path.basename(temp_file_path)
-    ext = f".{output_format}"
-    output_filename = base_filename.replace(".mp3", ext)
-    output_file = os.path.join(WHISPER_PATH, output_filename)
-
-    logger.info(f"[WHISPER] Recherche du fichier de sortie: {output_file}")
-
-    if os.path.exists(output_file):
-        with open(output_file, "r", encoding="utf-8") as f:
-            transcription = f.read().strip()
-        os.unlink(output_file)
-    elif result.stdout and result.stdout.strip():
-        transcription = result.stdout.strip()
-    else:
-        logger.error(f"[WHISPER] Fichier de sortie non trouvé et STDOUT vide")
-        raise Exception("Fichier de sortie non trouvé et STDOUT vide")
+    # Rendu depuis les segments sur disque (point de reprise compris), segment par segment
+    if monitor["segments"] == 0 and not resume_offset:
+        # Silence ou musique seule: transcription vide, pas une erreur (ni une reprise)
+        logger.warning(f"[WHISPER] Aucun segment produit. STDOUT: {' | '.join(stdout_tail)}")
+    result = render_task_transcription(spill_id, output_format, task_id)
+    if not keep_audio:
+        remove_task_work_dir(task_id)
 
     processing_time = time.time() - start_time
     logger.info(
         f"[WHISPER] Fin run_whisper_transcription, durée: {processing_time/3600:.2f}h ({processing_time:.0f}s)"
     )
 
-    return {
+    result.update({
         "success": True,
-        "transcription": transcription,
         "model": f"whisper-{model}-{language}",
         "processing_time": processing_time,
+        "time_to_first_segment": first_segment_time,
         "file_size": file_size,
-    }
+        "audio_hash": audio_hash,
+        # Reprise: seule la fin de l'audio a été transcrite par cette tentative
+        "audio_duration": audio_duration - resume_offset if audio_duration else None,
+        "quality": quality,
+        "decoding": decoding,
+    })
+    record_timing("finalize", time.time() - finalize_start)
+    result["timings"] = timings
+    return result
+
+
+@app.before_request
+def ensure_background_services():
+    """Sous gunicorn, __main__ n'est pas exécuté: chaque worker démarre ses services à la première requête"""
+    start_background_services()
 
 
 @app.route("/health", methods=["GET"])
@@ -569,168 +4480,374 @@ def health():
 
 @app.route("/models", methods=["GET"])
 def list_models():
-    """Lister les modèles disponibles"""
+    """Lister les modèles disponibles et les modèles chargés en mémoire"""
     models_dir = f"{WHISPER_PATH}/models"
     models = []
+    available = []
 
     if os.path.exists(models_dir):
-        for file in os.listdir(models_dir):
+        for file in sorted(os.listdir(models_dir)):
             if file.endswith(".bin"):
                 models.append(file)
+                model_path = os.path.join(models_dir, file)
+                available.append({
+                    "model": model_name_from_path(file),
+                    "file": file,
+                    "size_mb": int(os.path.getsize(model_path) / 1024 / 1024),
+                    "estimated_memory_mb": estimate_model_memory_mb(model_path),
+                })
+
+    return jsonify({
+        "models": models,
+        "current_model": os.path.basename(MODEL_PATH),
+        "available": available,
+        "resident": get_engines_status(),
+    })
 
-    return jsonify({"models": models, "current_model": os.path.basename(MODEL_PATH)})
+
+def parse_transcription_params(data):
+    """Extrait les paramètres de transcription d'une requête JSON"""
+    return {
+        "audio_url": data.get("audio_url"),
+        "language": data.get("language", "fr"),
+        "model": data.get("model", "base"),
+        "output_format": data.get("output_format", "txt").lower(),
+        "word_thold": data.get("word_thold", 0.005),
+        "no_speech_thold": data.get("no_speech_thold", 0.40),
+        "prompt": data.get("prompt"),
+        "chunking": data.get("chunking"),
+        "streaming": data.get("streaming"),
+        "vad": data.get("vad"),
+        "profile": data.get("profile"),
+        "quality": data.get("quality"),
+        "decoding": data.get("decoding"),
+        "draft": data.get("draft"),
+    }
+
+
+def parse_upload_params(fields, filename):
+    """Paramètres d'un téléversement: champs texte du formulaire ou de l'URL, convertis comme en JSON"""
+    data = dict(fields)
+    for key in ("word_thold", "no_speech_thold"):
+        if data.get(key):
+            data[key] = float(data[key])
+    if data.get("vad") is not None:
+        data["vad"] = data["vad"].lower() in ("1", "true", "yes", "on")
+    if data.get("decoding"):
+        try:
+            data["decoding"] = json.loads(data["decoding"])
+        except ValueError:
+            pass  # Refusé par validate_transcription_params
+    data["audio_url"] = f"{UPLOAD_URL_PREFIX}{filename}"
+    data["streaming"] = False  # L'audio est déjà sur disque
+    return parse_transcription_params(data)
+
+
+def validate_transcription_params(params):
+    """Message d'erreur si un paramètre de transcription est invalide, None sinon"""
+    if not params["audio_url"]:
+        return "audio_url requis"
+    if params["chunking"] and str(params["chunking"]).lower() not in CHUNKING_MODES:
+        return f"chunking invalide, valeurs possibles: {', '.join(CHUNKING_MODES)}"
+    try:
+        resolve_decoding_options(params["quality"], params["decoding"])
+    except ValueError as e:
+        return str(e)
+    return None
 
 
 # === ENDPOINT SYNCHRONE ===
 @app.route("/transcribe", methods=["POST"])
 def transcribe():
-    global ACTIVE_TRANSCRIPTIONS
-    if ACTIVE_TRANSCRIPTIONS >= MAX_CONCURRENT_TRANSCRIPTIONS:
-        return (
-            jsonify(
-                {
-                    "error": "Transcription en cours, veuillez réessayer dans quelques minutes"
-                }
-            ),
-            429,
-        )
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Données JSON requises"}), 400
+    params = parse_transcription_params(data)
+    error = validate_transcription_params(params)
+    if error:
+        return jsonify({"error": error}), 400
     try:
-        ACTIVE_TRANSCRIPTIONS += 1
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "Données JSON requises"}), 400
-        audio_url = data.get("audio_url")
-        language = data.get("language", "fr")
-        model = data.get("model", "base")
-        output_format = data.get("output_format", "txt").lower()
-        word_thold = data.get("word_thold", 0.005)
-        no_speech_thold = data.get("no_speech_thold", 0.40)
-        prompt = data.get("prompt")
-        if not audio_url:
-            return jsonify({"error": "audio_url requis"}), 400
-        result = run_whisper_transcription(
-            audio_url,
-            language,
-            model,
-            output_format,
-            word_thold,
-            no_speech_thold,
-            prompt,
-            logger,
-            request,
-        )
+        priority = parse_priority(data.get("priority"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"priority invalide: {e}"}), 400
+
+    # Transcription déjà en cache pour cette URL: réponse immédiate, sans passer par la file
+    cached = lookup_cached_result_for_url(params)
+    if cached:
+        return transcription_response(cached)
+
+    # La requête passe par la même file que les tâches asynchrones et attend son tour
+    return wait_for_sync_task(create_queued_task(params, priority, sync=True))
+
+
+def iter_json_with_file(result, field, path):
+    """Corps JSON de result avec field lu depuis path par blocs: le texte n'est jamais chargé en entier"""
+    yield json.dumps(result)[:-1] + (", " if result else "") + json.dumps(field) + ': "'
+    with open(path, "r", encoding="utf-8") as f:
+        for block in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), ""):
+            yield json.dumps(block)[1:-1]
+    yield '"}'
+
+
+def transcription_response(result):
+    """Réponse JSON d'un résultat synchrone (tâche terminée ou cache).
+
+    Une transcription rendue sur disque (transcription_path) est envoyée depuis son fichier, supprimé
+    à la fin de la réponse.
+    """
+    path = result.pop("transcription_path", None)
+    if not path:
         return jsonify(result)
-    except Exception as e:
-        logger.error(f"Erreur inattendue: {e}")
-        return jsonify({"error": str(e)}), 500
+    def remove_transcription():
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    response = Response(iter_json_with_file(result, "transcription", path), mimetype="application/json")
+    response.call_on_close(remove_transcription)
+    return response
+
+
+def wait_for_sync_task(task_id):
+    """Attend la fin d'une tâche synchrone et renvoie son résultat (la tâche est ensuite supprimée)"""
+    # La tâche peut être traitée par un autre worker gunicorn: on suit son état dans la base
+    try:
+        task = get_task(task_id)
+        while task and task["status"] not in FINAL_STATUSES:
+            time.sleep(0.5)
+            task = get_task(task_id)
+        if not task:
+            return jsonify({"error": "Tâche supprimée avant la fin de la transcription"}), 500
+        if task["status"] == "error":
+            logger.error(f"Erreur inattendue: {task['result']}")
+            return jsonify({"error": task["result"]}), 500
+        return transcription_response(task["result"])
     finally:
-        ACTIVE_TRANSCRIPTIONS -= 1
+        delete_task(task_id)
+
+
+@app.route("/transcribe/file", methods=["POST"])
+def transcribe_file():
+    # Taille annoncée déjà au-delà de la limite: refus avant de recevoir le fichier
+    if request.content_length and request.content_length > MAX_FILE_SIZE + UPLOAD_FORM_MAX_SIZE:
+        return jsonify({"error": f"Fichier trop volumineux (max {MAX_FILE_SIZE/1024/1024:.0f}MB)"}), 413
+
+    upload_start = time.time()
+    fields = request.args.to_dict()
+    try:
+        if request.mimetype == "multipart/form-data":
+            if not request.mimetype_params.get("boundary"):
+                return jsonify({"error": "boundary multipart manquant"}), 400
+            form, upload = receive_multipart_upload(request.stream, request.mimetype_params["boundary"])
+            fields.update(form)
+        else:
+            # Audio brut dans le corps, paramètres dans l'URL (?language=fr&filename=episode.mp3)
+            upload = receive_raw_upload(request.stream, fields.get("filename"))
+    except FileTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": f"Formulaire invalide: {e}"}), 400
+    if not upload or not upload.size:
+        if upload:
+            upload.discard()
+        return jsonify({"error": f"{UPLOAD_FIELD} requis (formulaire multipart ou corps de la requête)"}), 400
+
+    try:
+        params = parse_upload_params(fields, upload.filename)
+        priority = parse_priority(fields.get("priority"))
+    except (TypeError, ValueError) as e:
+        upload.discard()
+        return jsonify({"error": f"Paramètre invalide: {e}"}), 400
+    error = validate_transcription_params(params)
+    if error:
+        upload.discard()
+        return jsonify({"error": error}), 400
+
+    audio = upload.as_audio()
+    logger.info(
+        f"[UPLOAD] {upload.filename}: {upload.size} bytes reçus en {time.time() - upload_start:.1f}s"
+    )
+
+    # Même audio déjà transcrit avec ces paramètres: réponse immédiate
+    cached = get_cached_transcription(audio["audio_hash"], params) if CACHE_MAX_BYTES > 0 else None
+    if cached:
+        upload.discard()
+        cached["file_size"] = upload.size
+        return transcription_response(cached)
+
+    return wait_for_sync_task(create_queued_task(params, priority, sync=True, audio=audio))
 
 
 @app.route("/transcribe-async", methods=["POST"])
 def transcribe_async():
-    global ACTIVE_TRANSCRIPTIONS
-
-    # Vérifier si une transcription est déjà en cours
-    if ACTIVE_TRANSCRIPTIONS >= MAX_CONCURRENT_TRANSCRIPTIONS:
-        return (
-            jsonify(
-                {
-                    "error": "Transcription en cours, veuillez réessayer dans quelques minutes"
-                }
-            ),
-            429,
-        )
-
     data = request.get_json()
     if not data:
         return jsonify({"error": "Données JSON requises"}), 400
 
-    audio_url = data.get("audio_url")
-    language = data.get("language", "fr")
-    model = data.get("model", "base")
-    output_format = data.get("output_format", "txt").lower()
-    word_thold = data.get("word_thold", 0.005)
-    no_speech_thold = data.get("no_speech_thold", 0.40)
-    prompt = data.get("prompt")
+    params = parse_transcription_params(data)
+    error = validate_transcription_params(params)
+    if error:
+        return jsonify({"error": error}), 400
+    try:
+        priority = parse_priority(data.get("priority"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"priority invalide: {e}"}), 400
+
+    # Transcription déjà en cache pour cette URL: tâche terminée immédiatement
+    cached = lookup_cached_result_for_url(params)
+    if cached:
+        task_id = create_completed_task(params, priority, cached)
+        return jsonify({
+            "task_id": task_id,
+            "status_url": f"/transcription-status/{task_id}",
+            "status": "completed",
+            "priority": priority,
+            "result": get_task(task_id)["result"],
+        })
 
-    if not audio_url:
-        return jsonify({"error": "audio_url requis"}), 400
+    # Créer une nouvelle tâche et la placer dans la file (plus de refus 429)
+    task_id = create_queued_task(params, priority)
+    queue_position = get_queue_position(task_id)
 
-    # Créer une nouvelle tâche
-    task_id = str(uuid.uuid4())
-    ASYNC_TASKS[task_id] = {
+    response = {
+        "task_id": task_id,
+        "status_url": f"/transcription-status/{task_id}",
         "status": "pending",
-        "result": None,
-        "progress": 0,
-        "created_at": datetime.now().isoformat(),
+        "priority": priority,
+        "max_duration_hours": MAX_TRANSCRIPTION_TIME / 3600,
     }
+    if queue_position is not None:
+        response["queue_position"] = queue_position
+        response["eta_seconds"] = estimate_queue_eta(queue_position)
+    return jsonify(response)
 
-    ACTIVE_TRANSCRIPTIONS += 1
 
-    # Lancer le thread de transcription
-    thread = threading.Thread(
-        target=async_transcription_worker,
-        args=(
-            task_id,
-            audio_url,
-            language,
-            model,
-            output_format,
-            word_thold,
-            no_speech_thold,
-            prompt,
-        ),
-    )
-    thread.daemon = True  # Thread daemon pour éviter les blocages
-    thread.start()
+# === ENDPOINT PAR LOTS ===
+@app.route("/transcribe-batch", methods=["POST"])
+def transcribe_batch():
+    data = request.get_json()
+    if not data or not isinstance(data.get("jobs"), list) or not data["jobs"]:
+        return jsonify({"error": "jobs requis: liste d'URLs ou de transcriptions"}), 400
+    if len(data["jobs"]) > BATCH_MAX_JOBS:
+        return jsonify({"error": f"Trop de transcriptions dans le lot (max {BATCH_MAX_JOBS})"}), 400
 
-    return jsonify(
-        {
-            "task_id": task_id,
-            "status_url": f"/transcription-status/{task_id}",
-            "status": "pending",
-            "max_duration_hours": MAX_TRANSCRIPTION_TIME / 3600,
-        }
+    # Les paramètres au niveau du lot s'appliquent à chaque transcription, qui peut les surcharger
+    defaults = {key: value for key, value in data.items() if key != "jobs"}
+    jobs = []
+    for index, job in enumerate(data["jobs"]):
+        if isinstance(job, str):
+            job = {"audio_url": job}
+        if not isinstance(job, dict):
+            return jsonify({"error": f"jobs[{index}]: URL ou objet attendu"}), 400
+        job = dict(defaults, **job)
+        params = parse_transcription_params(job)
+        error = validate_transcription_params(params)
+        if error:
+            return jsonify({"error": f"jobs[{index}]: {error}"}), 400
+        try:
+            priority = parse_priority(job.get("priority"))
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"jobs[{index}]: priority invalide: {e}"}), 400
+        jobs.append((params, priority))
+
+    # Tâches en file tout de suite, dans l'ordre de la requête; les tailles (une requête HEAD par URL) sont
+    # sondées en arrière-plan pour réordonner celles qui attendent encore. Un job identique à un précédent
+    # (même URL, mêmes paramètres) partage sa tâche: un seul téléchargement et une seule transcription
+    batch_id = str(uuid.uuid4())
+    queued_at = time.time()
+    task_ids = []
+    queued = []
+    cached_count = 0
+    tasks_by_job = {}
+    for params, priority in jobs:
+        job_key = json.dumps(params, sort_keys=True)
+        if job_key in tasks_by_job:
+            task_ids.append(tasks_by_job[job_key])
+            continue
+        cached = lookup_cached_result_for_url(params)
+        if cached:
+            task_ids.append(create_completed_task(params, priority, cached, batch_id=batch_id))
+            cached_count += 1
+        else:
+            task_ids.append(create_queued_task(params, priority, batch_id=batch_id, notify=False))
+            queued.append((task_ids[-1], params["audio_url"]))
+        tasks_by_job[job_key] = task_ids[-1]
+    logger.info(
+        f"[BATCH] Lot {batch_id}: {len(queued)} transcriptions en file, {cached_count} en cache, "
+        f"{len(jobs) - len(tasks_by_job)} doublon(s)"
     )
+    if queued:
+        notify_queue_workers()
+        prefetch_queue()
+        threading.Thread(
+            target=schedule_batch, args=(batch_id, queued, queued_at), name=f"batch-{batch_id[:8]}", daemon=True
+        ).start()
+
+    status = get_batch_status(batch_id)
+    return jsonify({
+        "batch_id": batch_id,
+        "status_url": f"/batch-status/{batch_id}",
+        "status": status["status"],
+        "total": status["total"],
+        "counts": status["counts"],
+        "duplicates": len(jobs) - len(tasks_by_job),
+        # Dans l'ordre des jobs de la requête (un doublon reprend la tâche du premier job identique)
+        "tasks": [
+            {
+                "task_id": task_id,
+                "audio_url": params["audio_url"],
+                "status_url": f"/transcription-status/{task_id}",
+            }
+            for task_id, (params, _) in zip(task_ids, jobs)
+        ],
+    })
+
+
+@app.route("/batch-status/<batch_id>", methods=["GET"])
+def batch_status(batch_id):
+    status = get_batch_status(batch_id)
+    if not status:
+        return jsonify({"error": "Lot inconnu"}), 404
+    return jsonify(status)
 
 
 @app.route("/reset-transcriptions", methods=["POST"])
 def reset_transcriptions():
-    """Réinitialiser le compteur de transcriptions actives (debug)"""
-    global ACTIVE_TRANSCRIPTIONS, ASYNC_TASKS
-    
+    """Nettoyer les tâches fantômes et remettre en file les tâches orphelines (debug)"""
+    # Tâches dont le processus propriétaire a disparu: remises en file
+    requeued = requeue_interrupted_tasks()
+
     # Nettoyer les tâches fantômes (plus de 25h pour laisser marge aux longues transcriptions)
     current_time = time.time()
     tasks_to_remove = []
     
-    for task_id, task in ASYNC_TASKS.items():
-        if task.get("status") == "processing":
+    for task in list_tasks_in_store():
+        if task.get("status") not in FINAL_STATUSES + ["pending"]:
             created_time = datetime.fromisoformat(task.get("created_at", "2020-01-01T00:00:00"))
             if (current_time - created_time.timestamp()) > 90000:  # 25h
-                tasks_to_remove.append(task_id)
+                tasks_to_remove.append(task["task_id"])
     
     for task_id in tasks_to_remove:
-        del ASYNC_TASKS[task_id]
+        delete_task(task_id)
         logger.info(f"[RESET] Tâche fantôme supprimée: {task_id}")
     
-    # Réinitialiser le compteur
-    old_count = ACTIVE_TRANSCRIPTIONS
-    ACTIVE_TRANSCRIPTIONS = 0
-    
-    logger.info(f"[RESET] Transcriptions actives: {old_count} → 0")
+    active_transcriptions = get_active_transcriptions()
+    logger.info(f"[RESET] Transcriptions actives: {active_transcriptions}, tâches remises en file: {len(requeued)}")
     
     return jsonify({
         "success": True,
-        "message": f"Compteur réinitialisé: {old_count} → 0",
+        "message": f"{len(requeued)} tâche(s) remise(s) en file, {len(tasks_to_remove)} supprimée(s)",
         "tasks_removed": len(tasks_to_remove),
-        "active_transcriptions": ACTIVE_TRANSCRIPTIONS
+        "tasks_requeued": len(requeued),
+        "active_transcriptions": active_transcriptions,
+        "queued_transcriptions": get_queue_length(),
     })
 
 
 @app.route("/transcription-status/<task_id>", methods=["GET"])
 def transcription_status(task_id):
-    task = ASYNC_TASKS.get(task_id)
+    task = get_task(task_id)
     if not task:
         return jsonify({"error": "Tâche inconnue"}), 404
 
@@ -752,7 +4869,16 @@ def transcription_status(task_id):
         "created_at": created_at,
         "elapsed_time": elapsed_time,
         "max_duration_hours": MAX_TRANSCRIPTION_TIME / 3600,
+        "priority": task.get("priority", DEFAULT_PRIORITY),
     }
+    # Avancement mesuré dans l'audio: pourcentage, facteur temps réel et heure de fin prévue
+    for field in ["audio_duration", "audio_processed", "percent_done", "realtime_factor", "download", "timings",
+                  "profile", "phase", "draft"]:
+        if task.get(field) is not None:
+            response[field] = task[field]
+    if task["status"] == "completed" and "percent_done" in response:
+        response["percent_done"] = 100.0
+    response.update(get_queue_info(task_id, task))
 
     # Ajouter le résultat si la tâche est terminée
     if task["status"] in ["completed", "error"]:
@@ -761,29 +4887,166 @@ def transcription_status(task_id):
     return jsonify(response)
 
 
+def format_sse_event(event, data, event_id=None):
+    """Message Server-Sent Events"""
+    message = f"id: {event_id}\n" if event_id is not None else ""
+    return message + f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.route("/transcription-stream/<task_id>", methods=["GET"])
+def transcription_stream(task_id):
+    """Segments d'une transcription en Server-Sent Events, au fur et à mesure de leur production.
+
+    Chaque segment porte "<génération>:<index>" comme id d'événement: un client reconnecté reprend après
+    Last-Event-ID, ou à partir de ?from=<index>. Quand les segments sont remis à zéro (reprise d'une
+    exécution, affinage après le brouillon), un événement "reset" annonce la nouvelle génération et les
+    index repartent de 0. Un événement "done" clôt le flux.
+    """
+    task = get_task(task_id)
+    if not task:
+        return jsonify({"error": "Tâche inconnue"}), 404
+    try:
+        last_event_id = request.headers.get("Last-Event-ID")
+        if last_event_id is not None:
+            # Ancien format (index seul): génération courante
+            seen_generation, _, seen_index = last_event_id.rpartition(":")
+            seen_generation = int(seen_generation) if seen_generation else task.get("segments_generation", 0)
+            resume_from = int(seen_index) + 1
+        else:
+            seen_generation = None
+            resume_from = int(request.args.get("from", 0))
+    except ValueError:
+        return jsonify({"error": "Position de reprise invalide"}), 400
+
+    def generate():
+        nonlocal resume_from
+        generation = seen_generation
+        position = 0
+        index = 0
+        last_sent = time.time()
+        yield "retry: 5000\n\n"
+        while True:
+            # Statut lu avant les segments: rien n'est publié après le passage à un statut final
+            task = get_task(task_id)
+            current = (task or {}).get("segments_generation", 0)
+            if generation is not None and current != generation:
+                # Fichier remplacé: ce que le client a reçu ne vaut plus, lecture depuis le début
+                yield format_sse_event("reset", {"generation": current, "phase": (task or {}).get("phase")})
+                position = index = resume_from = 0
+            generation = current
+            while True:
+                segments, next_position = read_task_segments(task_id, position)
+                # Remise à zéro pendant la lecture: segments ignorés, "reset" au tour suivant
+                if not segments or get_segments_generation(task_id) != generation:
+                    break
+                position = next_position
+                for segment in segments:
+                    if index >= resume_from:
+                        yield format_sse_event(
+                            "segment", dict(segment, index=index), event_id=f"{generation}:{index}"
+                        )
+                        last_sent = time.time()
+                    index += 1
+
+            if not task or task["status"] in FINAL_STATUSES:
+                yield format_sse_event("done", {
+                    "status": task["status"] if task else "unknown",
+                    "segments": index,
+                    "result": task.get("result") if task else None,
+                })
+                return
+            if time.time() - last_sent > STREAM_KEEPALIVE_INTERVAL:
+                yield ": keepalive\n\n"
+                last_sent = time.time()
+            time.sleep(STREAM_POLL_INTERVAL)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Nginx: pas de mise en tampon de la réponse
+        },
+    )
+
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Compteurs succès/échecs et occupation du cache des transcriptions"""
+    return jsonify(get_cache_stats())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/transcription-profile/<task_id>", methods=["GET"])
+def transcription_profile(task_id):
+    """Profil cProfile d'une tâche: rapport texte, ou fichier pstats brut avec ?format=pstats"""
+    path = get_profile_path(task_id)
+    if not os.path.exists(path):
+        return jsonify({"error": "Aucun profil pour cette tâche (demander \"profile\": true)"}), 404
+    if request.args.get("format") == "pstats":
+        return send_from_directory(PROFILE_DIR, os.path.basename(path), as_attachment=True)
+    sort = request.args.get("sort", "cumulative")
+    if sort not in ("cumulative", "tottime", "calls", "ncalls"):
+        return jsonify({"error": "sort invalide, valeurs possibles: cumulative, tottime, calls, ncalls"}), 400
+    report = io.StringIO()
+    pstats.Stats(path, stream=report).sort_stats(sort).print_stats(request.args.get("limit", 50, type=int))
+    return Response(report.getvalue(), mimetype="text/plain")
+
+
 @app.route("/transcriptions/<filename>", methods=["GET"])
 def download_transcription(filename):
-    """Télécharger un fichier de transcription"""
-    output_dir = "/var/log/whisper"
+    """Télécharger un fichier de transcription.
+
+    ETag, Last-Modified, requêtes conditionnelles (304) et Range (206) sont gérés par send_file, qui transmet le
+    fichier sans le copier (sendfile sous gunicorn). Derrière nginx (en-tête X-Accel-Mapping), la réponse est
+    un simple X-Accel-Redirect: nginx envoie le fichier, variante .gz comprise, sans occuper de thread Python.
+    """
+    output_dir = OUTPUT_DIR
+    if filename != os.path.basename(filename) or filename.startswith("."):
+        return jsonify({"error": "Fichier non trouvé"}), 404
     file_path = os.path.join(output_dir, filename)
-    
-    if not os.path.exists(file_path):
+
+    if not os.path.isfile(file_path):
         return jsonify({"error": "Fichier non trouvé"}), 404
-    
-    return send_from_directory(output_dir, filename, as_attachment=True)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    # X-Accel-Mapping: "<dossier>=<location interne>", envoyé par nginx (voir nginx/nginx.conf)
+    directory, _, location = request.headers.get("X-Accel-Mapping", "").partition("=")
+    if location and os.path.normpath(directory.strip()) == os.path.normpath(output_dir):
+        response = Response(status=200, mimetype=mimetype)
+        response.headers["X-Accel-Redirect"] = location.strip().rstrip("/") + "/" + urllib.parse.quote(filename)
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    # Une plage d'octets porte sur l'original: pas de variante compressée
+    encoding, served_path = None, file_path
+    if "Range" not in request.headers:
+        encoding, served_path = select_transcription_variant(file_path, request.headers.get("Accept-Encoding", ""))
+    response = send_file(served_path, mimetype=mimetype, as_attachment=True, download_name=filename, conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
 
 
 @app.route("/tasks", methods=["GET"])
 def list_tasks():
     """Lister toutes les tâches asynchrones"""
     tasks = []
-    for task_id, task in ASYNC_TASKS.items():
+    for task in list_tasks_in_store():
+        task_id = task["task_id"]
         task_info = {
             "task_id": task_id,
             "status": task["status"],
             "progress": task.get("progress", 0),
             "created_at": task.get("created_at"),
+            "priority": task.get("priority", DEFAULT_PRIORITY),
         }
+        task_info.update(get_queue_info(task_id, task))
         
         # Calculer la durée écoulée
         created_at = task.get("created_at")
@@ -804,20 +5067,30 @@ def list_tasks():
     return jsonify({
         "tasks": tasks,
         "total": len(tasks),
-        "active_transcriptions": ACTIVE_TRANSCRIPTIONS
+        "active_transcriptions": get_active_transcriptions(),
+        "queued_transcriptions": get_queue_length(),
+        "max_concurrent_transcriptions": MAX_CONCURRENT_TRANSCRIPTIONS,
+        "concurrency": get_concurrency_status(),
     })
 
 
 if __name__ == "__main__":
-    # Nettoyer les anciennes transcriptions au démarrage
+    # Nettoyer les anciennes transcriptions et segments publiés au démarrage
     cleanup_old_transcriptions()
+    cleanup_old_transcriptions(SEGMENTS_DIR)
     
     print("🚀 Démarrage du service Whisper - La Boîte de Chocolat")
     print(f"📁 Whisper path: {WHISPER_PATH}")
     print(f"🤖 Modèle: {os.path.basename(MODEL_PATH)}")
     print(f"⏱️  Timeout max: {MAX_TRANSCRIPTION_TIME/3600:.1f}h")
-    print(f"🔄 Transcriptions concurrentes max: {MAX_CONCURRENT_TRANSCRIPTIONS}")
+    print(
+        f"🔄 Transcriptions concurrentes max: {MAX_CONCURRENT_TRANSCRIPTIONS}"
+        f"{' (adaptatif)' if ADAPTIVE_CONCURRENCY else ''}, {EFFECTIVE_CPU_COUNT} cœurs effectifs"
+    )
     print("=" * 60)
+
+    # Reprendre les tâches interrompues et démarrer le pool de workers de la file d'attente
+    start_background_services()
     
     # Démarrer le serveur Flask
     app.run(
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test des lots (/transcribe-batch): réponse sans attendre les requêtes HEAD, ordre de passage (longs et
+courts alternés) appliqué ensuite aux tâches encore en attente, jobs identiques regroupés
+"""
+
+import sys
+import threading
+import time
+
+import pytest
+
+import server
+
+SIZES = [10, 500, 40, 300]
+
+
+@pytest.fixture
+def drained(settings):
+    """URLs injoignables: une tâche prise par un worker échoue sans nouvelle tentative; les workers
+    ont fini avec les tâches du lot avant le test suivant"""
+    settings(PREFETCH_AHEAD=0, DOWNLOAD_RETRIES=0)
+    yield
+    deadline = time.time() + 10
+    while server.CONCURRENCY["active"] and time.time() < deadline:
+        time.sleep(0.05)
+    assert not server.CONCURRENCY["active"], "Worker encore occupé par une tâche du lot"
+
+
+def test_batch_queued_before_probe(client, drained, monkeypatch):
+    """Sondes bloquées: le lot est déjà en file; une fois les tailles connues, la file suit order_batch_jobs"""
+    probing = threading.Event()
+    release = threading.Event()
+
+    def slow_probe(audio_urls):
+        probing.set()
+        release.wait(10)
+        return [SIZES[int(url.rsplit("-", 1)[1].split(".")[0])] for url in audio_urls]
+
+    monkeypatch.setattr(server, "probe_audio_sizes", slow_probe)
+    urls = [f"http://127.0.0.1:9/episode-{index}.mp3" for index in range(len(SIZES))]
+    # Workers tenus à l'écart: les tâches restent en attente pendant le test
+    with server.CONCURRENCY_CONDITION:
+        started = time.time()
+        response = client.post("/transcribe-batch", json={"jobs": urls})
+        assert response.status_code == 200, response.get_json()
+        assert time.time() - started < 5, "Réponse renvoyée après les sondes"
+        assert probing.wait(5)
+        batch = response.get_json()
+        task_ids = [task["task_id"] for task in batch["tasks"]]
+        assert batch["total"] == len(urls)
+
+        release.set()
+        expected = [task_ids[index] for index in server.order_batch_jobs(SIZES)]
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            rows = server.get_db().execute(
+                "SELECT task_id FROM tasks WHERE status = 'pending' ORDER BY priority, queued_at, rowid"
+            ).fetchall()
+            pending = [row["task_id"] for row in rows]
+            # Une tâche prise par un worker juste avant le verrou sort de la file, pas de l'ordre
+            if pending == [task_id for task_id in expected if task_id in pending]:
+                break
+            time.sleep(0.05)
+        else:
+            raise AssertionError(f"Ordre de passage non appliqué: {pending}")
+        for task_id in task_ids:
+            server.delete_task(task_id)
+
+
+def test_batch_duplicates(client, drained, monkeypatch):
+    """Jobs identiques: une seule tâche (un téléchargement), reprise par chaque job; autres paramètres à part"""
+    monkeypatch.setattr(server, "probe_audio_sizes", lambda audio_urls: [None] * len(audio_urls))
+    url = "http://127.0.0.1:9/episode.mp3"
+    with server.CONCURRENCY_CONDITION:
+        response = client.post("/transcribe-batch", json={"jobs": [url, {"audio_url": url, "model": "tiny"}, url]})
+        assert response.status_code == 200, response.get_json()
+        batch = response.get_json()
+        task_ids = [task["task_id"] for task in batch["tasks"]]
+        assert task_ids[0] == task_ids[2] and task_ids[1] != task_ids[0]
+        assert batch["total"] == 2 and batch["duplicates"] == 1
+        for task_id in set(task_ids):
+            server.delete_task(task_id)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
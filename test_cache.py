@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Tests du cache des transcriptions: succès et échecs comptés dans /cache/stats, résultat servi depuis une
+copie du fichier en cache, clé distincte selon le découpage (morceaux, flux), éviction LRU au-delà de
+CACHE_MAX_BYTES
+"""
+
+import hashlib
+import os
+import sys
+
+import pytest
+
+import server
+from conftest import make_wav
+
+AUDIO_URL = "http://audio.invalid/episode.mp3"
+
+
+@pytest.fixture
+def engine(fake_whisper, settings):
+    """Faux whisper-cli, cache actif"""
+    settings(CACHE_MAX_BYTES=64 * 1024 * 1024)
+    return fake_whisper
+
+
+def upload(client, body, **params):
+    query = "&".join(f"{name}={value}" for name, value in {"filename": "episode.wav", **params}.items())
+    response = client.post(f"/transcribe/file?{query}", data=body, content_type="audio/wav")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    result = response.get_json()
+    response.close()
+    return result
+
+
+def rendered_files():
+    return [name for name in os.listdir(server.STATE_DIR) if name.startswith("transcription_")]
+
+
+def test_hit_and_miss(client, engine):
+    """Même audio et mêmes paramètres: servi par le cache; autre découpage: nouvelle transcription"""
+    body = make_wav(20)
+    first = upload(client, body, output_format="srt")
+    assert "cached" not in first
+    assert client.get("/cache/stats").get_json() | {"max_size_bytes": None} == {
+        "hits": 0, "misses": 1, "evictions": 0, "hit_rate": 0.0, "entries": 1,
+        "size_bytes": len(first["transcription"].encode("utf-8")), "max_size_bytes": None,
+    }
+
+    second = upload(client, body, output_format="srt", filename="copie.wav")
+    assert second["cached"] is True and second["transcription"] == first["transcription"]
+    assert len(open(engine).read().splitlines()) == 1, "Succès du cache retranscrit"
+    assert not rendered_files(), "Copie du fichier en cache non supprimée après la réponse"
+
+    # Le découpage en morceaux change les coupures entre segments: autre entrée
+    upload(client, body, output_format="srt", chunking="fixed")
+    stats = client.get("/cache/stats").get_json()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["hit_rate"]) == (1, 2, 2, 0.333)
+    print(f"✅ Cache: {stats}")
+
+
+def test_async_hit_keeps_entry(client, engine):
+    """URL déjà vue: tâche terminée immédiatement, fichier écrit depuis une copie de l'entrée en cache"""
+    body = make_wav(20)
+    transcription = upload(client, body, vad="false")["transcription"]
+    server.remember_audio_hash(AUDIO_URL, hashlib.sha256(body).hexdigest())
+
+    for _ in range(2):
+        response = client.post("/transcribe-async", json={"audio_url": AUDIO_URL, "vad": False})
+        assert response.get_json()["status"] == "completed", response.get_json()
+        output_file = response.get_json()["result"]["transcription_file"]
+        with open(os.path.join(server.OUTPUT_DIR, output_file), encoding="utf-8") as f:
+            assert f.read() == transcription
+    assert server.get_cache_stats()["hits"] == 2 and not rendered_files()
+    print("✅ Tâches servies par le cache, entrée conservée")
+
+
+def test_eviction(settings):
+    """Au-delà de CACHE_MAX_BYTES, l'entrée la moins récemment lue est supprimée"""
+    settings(CACHE_MAX_BYTES=250)
+    server.cache_put("a", {"success": True, "transcription": "a" * 100})
+    server.cache_put("b", {"success": True, "transcription": "b" * 100})
+    # Lecture de "a": "b" devient la moins récemment utilisée
+    os.unlink(server.cache_get("a")["transcription_path"])
+    server.cache_put("c", {"success": True, "transcription": "c" * 100})
+
+    assert server.cache_get("b") is None
+    assert sorted(os.listdir(server.CACHE_DIR)) == ["a.txt", "c.txt"]
+    stats = server.get_cache_stats()
+    assert (stats["evictions"], stats["entries"], stats["size_bytes"]) == (1, 2, 200)
+
+    # Cache désactivé: ni lecture ni écriture
+    settings(CACHE_MAX_BYTES=0)
+    assert server.cache_get("a") is None and not server.cache_contains("a")
+    print("✅ Éviction LRU")
+
+
+def test_key_includes_segmentation():
+    """Mode flux et découpage en morceaux font partie de la clé de cache"""
+    params = {"model": "base", "language": "fr", "output_format": "txt"}
+    keys = {
+        server.build_cache_key("0" * 64, dict(params, **extra))
+        for extra in [{}, {"chunking": "fixed"}, {"chunking": "silence"}, {"streaming": True}]
+    }
+    assert len(keys) == 4
+    assert server.build_cache_key("0" * 64, params) == server.build_cache_key(
+        "0" * 64, dict(params, chunking="none", streaming=False)
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test d'injection de panne pour la reprise des transcriptions longues
+Lance server.py avec un faux whisper-cli (fake_whisper_cli.py), tue le moteur en cours de route
+et vérifie que la tâche reprend au point de reprise avec une transcription identique
+"""
+
+import functools
+import http.server
+import os
+import sys
+import threading
+import time
+import wave
+
+import pytest
+
+import server
+from conftest import wait_for
+
+AUDIO_SECONDS = 120
+
+
+class CountingHandler(http.server.SimpleHTTPRequestHandler):
+    """Sert l'audio de test et compte les téléchargements"""
+    downloads = 0
+
+    def do_GET(self):
+        CountingHandler.downloads += 1
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def audio_url(tmp_path):
+    """Serveur HTTP local avec un WAV 16kHz mono de AUDIO_SECONDS secondes"""
+    www = tmp_path / "www"
+    www.mkdir()
+    with wave.open(str(www / "episode.wav"), "wb") as audio:
+        audio.setnchannels(1)
+        audio.setsampwidth(2)
+        audio.setframerate(16000)
+        audio.writeframes(b"\x00\x00" * 16000 * AUDIO_SECONDS)
+    handler = functools.partial(CountingHandler, directory=str(www))
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/episode.wav"
+    httpd.shutdown()
+
+
+def submit(audio_url):
+    """Tâche synchrone en file, comme /transcribe"""
+    params = {
+        "audio_url": audio_url,
+        "language": "fr",
+        "model": "base",
+        "output_format": "srt",
+        "word_thold": 0.005,
+        "no_speech_thold": 0.40,
+        "prompt": None,
+        "chunking": "none",
+        "streaming": False,
+    }
+    return server.create_queued_task(params, server.DEFAULT_PRIORITY, sync=True)
+
+
+def test_checkpoint_resume(fake_whisper, audio_url, monkeypatch):
+    """Le moteur est tué à mi-parcours: la tâche reprend sans retélécharger ni retranscrire"""
+    # Transcription de référence, d'un seul tenant
+    monkeypatch.setenv("FAKE_WHISPER_DELAY", "0.01")
+    reference = wait_for(submit(audio_url))
+    assert reference["status"] == "completed", reference.get("result")
+    expected = server.take_transcription(reference["result"])
+    print(f"📝 Référence: {expected.count('-->')} segments")
+
+    # Transcription interrompue: le faux moteur est tué après quelques segments
+    monkeypatch.setenv("FAKE_WHISPER_DELAY", "0.1")
+    CountingHandler.downloads = 0
+    open(fake_whisper, "w").close()
+    task_id = submit(audio_url)
+    segments_path = server.get_segments_path(task_id)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if os.path.exists(segments_path) and sum(1 for _ in open(segments_path)) >= 8:
+            break
+        time.sleep(0.05)
+    killed = [process for process in list(server.RUNNING_PROCESSES) if process.poll() is None]
+    assert killed, "Aucun processus whisper-cli à interrompre"
+    for process in killed:
+        process.kill()
+    print(f"💥 whisper-cli tué après {sum(1 for _ in open(segments_path))} segments")
+
+    task = wait_for(task_id)
+    assert task["status"] == "completed", task.get("result")
+    assert task["attempts"] == 2, f"{task['attempts']} tentatives au lieu de 2"
+    assert CountingHandler.downloads == 1, f"Audio téléchargé {CountingHandler.downloads} fois"
+
+    calls = open(fake_whisper).read().splitlines()
+    assert len(calls) == 2 and "--offset-t" not in calls[0] and "--offset-t" in calls[1], calls
+    offset = int(calls[1].split("--offset-t ")[1].split()[0]) / 1000
+    assert 0 < offset < AUDIO_SECONDS, offset
+    print(f"🔁 Reprise à {offset:.0f}s")
+
+    # Segments conservés + segments repris == transcription d'un seul tenant, sans doublon
+    assert server.take_transcription(task["result"]) == expected
+    assert not os.path.exists(server.get_task_work_dir(task_id)), "Dossier de travail non supprimé"
+    print("✅ Transcription reprise identique à la référence")
+
+
+def test_crash_retry_with_sync_waiter(fake_whisper, audio_url, client, tmp_path, monkeypatch):
+    """whisper-cli s'arrête en erreur une fois: la requête /transcribe en attente reçoit la transcription
+    reprise, sans que la tâche passe par "error" entre l'échec et la reprise"""
+    monkeypatch.setenv("FAKE_WHISPER_CRASH_ONCE", str(tmp_path / "crashed"))
+    monkeypatch.setenv("FAKE_WHISPER_CRASH_AFTER", "8")
+    statuses = []
+    update_task = server.update_task
+
+    def recording_update_task(task_id, **fields):
+        if "status" in fields:
+            statuses.append(fields["status"])
+        update_task(task_id, **fields)
+
+    monkeypatch.setattr(server, "update_task", recording_update_task)
+    response = client.post("/transcribe", json={"audio_url": audio_url, "output_format": "srt"})
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["transcription"].count("-->") == AUDIO_SECONDS // 5
+    assert "error" not in statuses, statuses
+    calls = open(fake_whisper).read().splitlines()
+    assert len(calls) == 2 and "--offset-t" in calls[1], calls
+    print(f"✅ Reprise après l'arrêt de whisper-cli, statuts: {' -> '.join(statuses)}")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
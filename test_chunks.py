@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test de la transcription par morceaux: chaque whisper-cli écrit ses segments sur disque au fil de la sortie,
+puis les morceaux terminés sont assemblés dans l'ordre dans le fichier de segments de la tâche; un morceau
+en échec arrête les autres, sous une échéance commune
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import server
+from conftest import make_wav
+
+
+def write_chunk(work_dir, chunk):
+    """WAV de silence de la durée du morceau, dans le dossier de travail"""
+    chunk_path = os.path.join(work_dir, f"chunk_{chunk['index']:04d}.wav")
+    with open(chunk_path, "wb") as f:
+        f.write(make_wav(int(chunk["end"] - chunk["start"])))
+    return chunk_path
+
+
+def test_chunks_stitched_from_disk(fake_whisper, tmp_path):
+    """Deux morceaux chevauchants terminés dans le désordre: un segment toutes les 5s, sans doublon"""
+    work_dir = str(tmp_path / "chunks")
+    os.makedirs(work_dir)
+    chunks = [
+        {"index": 0, "start": 0.0, "end": 35.0, "keep_from": 0.0, "keep_until": 30.0},
+        {"index": 1, "start": 25.0, "end": 60.0, "keep_from": 30.0, "keep_until": float("inf")},
+    ]
+    chunk_files = [None, None]
+    stitch = server.new_stitch_state()
+    for chunk in reversed(chunks):
+        chunk_path = write_chunk(work_dir, chunk)
+        chunk_files[chunk["index"]] = server.transcribe_wav_chunk(
+            chunk, chunk_path, work_dir, server.MODEL_PATH, "fr", 0.005, 0.40, None, threads=1,
+        )
+        assert not os.path.exists(chunk_path)
+        server.publish_chunk_segments("chunks", chunks, chunk_files, stitch)
+        if chunk["index"] == 1:
+            # Le premier morceau manque encore: rien n'est publié
+            assert stitch["segments"] == 0 and not os.path.exists(server.get_segments_path("chunks"))
+
+    segments = list(server.iter_task_segments("chunks"))
+    assert [seg["start"] for seg in segments] == [5.0 * index for index in range(12)]
+    assert stitch["chunks"] == 2 and stitch["segments"] == 12
+    assert not os.listdir(work_dir), "Fichiers des morceaux non supprimés"
+
+    server.render_task_transcription("chunks", "srt")
+    assert not os.path.exists(server.get_segments_path("chunks"))
+    print(f"✅ {len(segments)} segments assemblés depuis le disque")
+
+
+def test_chunk_job_cancel_and_deadline(fake_whisper, tmp_path, settings, monkeypatch):
+    """Morceau en échec: les whisper-cli en cours sont arrêtés; échéance commune à tous les morceaux"""
+    monkeypatch.setenv("FAKE_WHISPER_DELAY", "0.5")
+    work_dir = str(tmp_path / "chunks")
+    os.makedirs(work_dir)
+    chunk = {"index": 0, "start": 0.0, "end": 60.0, "keep_from": 0.0, "keep_until": float("inf")}
+    job = server.new_chunk_job(time.time() + 3600)
+    errors = []
+
+    def run():
+        try:
+            server.transcribe_wav_chunk(chunk, write_chunk(work_dir, chunk), work_dir, server.MODEL_PATH, "fr",
+                                        0.005, 0.40, None, threads=1, job=job)
+        except Exception as e:
+            errors.append(str(e))
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    deadline = time.time() + 10
+    while not job["processes"] and time.time() < deadline:
+        time.sleep(0.05)
+    started = time.time()
+    server.cancel_chunk_job(job)
+    worker.join(5)
+    assert not worker.is_alive() and time.time() - started < 2, "whisper-cli non arrêté"
+    assert errors and "annulé" in errors[0], errors
+    # Morceau suivant d'une tâche annulée: pas de nouveau processus
+    with pytest.raises(Exception, match="annulé"):
+        server.transcribe_chunk(chunk, "absent.wav", work_dir, server.MODEL_PATH, "fr", 0.005, 0.40, None, 1,
+                                job=job)
+
+    # Échéance de la tâche déjà dépassée pour ce morceau: timeout, pas de reprise
+    settings(MAX_TRANSCRIPTION_TIME=1)
+    late_job = server.new_chunk_job(time.time() + 0.5)
+    with pytest.raises(server.TranscriptionTimeoutError):
+        server.transcribe_wav_chunk(chunk, write_chunk(work_dir, chunk), work_dir, server.MODEL_PATH, "fr",
+                                    0.005, 0.40, None, threads=1, job=late_job)
+    assert not late_job["processes"]
+    print("✅ Morceaux annulés et échéance commune respectée")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Tests du contrôleur de concurrence adaptative: montée quand le CPU a de la marge, recul sous pression
+mémoire ou quand le débit baisse, garde mémoire à l'admission et limites du conteneur (cgroup), threads
+des moteurs résidents; position et ETA dans la file, remise en file des tâches d'un processus arrêté
+"""
+
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+import server
+from conftest import held_queue
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def controller(settings):
+    """Quatre transcriptions et 16 threads au plus; état du contrôleur restauré après le test"""
+    settings(MAX_CONCURRENT_TRANSCRIPTIONS=4, CPU_THREADS_BUDGET=16, MEMORY_RESERVE_MB=512)
+    with server.CONCURRENCY_CONDITION:
+        saved_state = {key: server.CONCURRENCY[key] for key in ("target", "rtf", "last_model", "reservations")}
+    yield
+    with server.CONCURRENCY_CONDITION:
+        server.CONCURRENCY.update(saved_state)
+
+
+@pytest.fixture
+def measures(monkeypatch):
+    """measures(...): mesures imposées au contrôleur pour la durée du test"""
+    def replace(cpu=40.0, headroom_mb=8000, pending=5, task_mb=1000):
+        monkeypatch.setattr(server, "get_cpu_saturation", lambda: cpu)
+        monkeypatch.setattr(server, "get_memory_headroom_mb", lambda: headroom_mb)
+        monkeypatch.setattr(server, "get_queue_length", lambda: pending)
+        monkeypatch.setattr(server, "estimate_task_memory_mb", lambda task: task_mb)
+    return replace
+
+
+def set_state(target, active, rtf=None, last_model=None):
+    """Appelé avec CONCURRENCY_CONDITION: les workers d'autres tests ne modifient rien entre-temps"""
+    server.CONCURRENCY.update(target=target, active=active, rtf=rtf or {}, last_model=last_model, reservations={})
+
+
+def test_scale_up_then_back_off_on_memory(measures):
+    """CPU à 40% et file non vide: une transcription de plus; marge mémoire sous la réserve: une de moins"""
+    with server.CONCURRENCY_CONDITION:
+        active = server.CONCURRENCY["active"]
+        try:
+            measures()
+            set_state(target=1, active=1)
+            server.adjust_concurrency()
+            assert server.CONCURRENCY["target"] == 2, server.CONCURRENCY["reason"]
+            assert server.get_task_cpu_budget() == 8
+
+            server.CONCURRENCY["active"] = 2
+            measures(cpu=99.0)
+            server.adjust_concurrency()
+            assert server.CONCURRENCY["target"] == 2, "CPU saturé: pas de transcription de plus"
+
+            measures(headroom_mb=300)
+            server.adjust_concurrency()
+            assert server.CONCURRENCY["target"] == 1
+            assert "mémoire" in server.CONCURRENCY["reason"]
+            print(f"✅ 1 -> 2 -> 1 transcriptions ({server.CONCURRENCY['reason']})")
+        finally:
+            server.CONCURRENCY["active"] = active
+
+
+def test_back_off_on_throughput(measures):
+    """Deux transcriptions plus lentes qu'une seule (RTF 0.5 contre 0.2): retour à une, sans remonter"""
+    now = time.time()
+    rtf = {("base", 1): (0.2, now), ("base", 2): (0.5, now)}
+    with server.CONCURRENCY_CONDITION:
+        active = server.CONCURRENCY["active"]
+        try:
+            measures()
+            set_state(target=2, active=2, rtf=rtf, last_model="base")
+            server.adjust_concurrency()
+            assert server.CONCURRENCY["target"] == 1, server.CONCURRENCY["reason"]
+
+            server.CONCURRENCY["active"] = 1
+            server.adjust_concurrency()
+            assert server.CONCURRENCY["target"] == 1, "Niveau déjà mesuré moins rapide: pas de nouvel essai"
+
+            # Mesure périmée: le niveau supérieur peut être réessayé
+            server.CONCURRENCY["rtf"][("base", 2)] = (0.5, now - server.RTF_MAX_AGE - 1)
+            server.adjust_concurrency()
+            assert server.CONCURRENCY["target"] == 2
+        finally:
+            server.CONCURRENCY["active"] = active
+
+
+def test_memory_admission(measures):
+    """Modèle de 1000MB, 1500MB de marge et 512MB de réserve: refusé à côté d'une autre transcription"""
+    with server.CONCURRENCY_CONDITION:
+        active = server.CONCURRENCY["active"]
+        try:
+            measures(headroom_mb=1500)
+            set_state(target=2, active=2)
+            assert not server.admit_task_memory("concurrency-a")
+
+            # Seule transcription en cours: toujours admise, son modèle est réservé
+            server.CONCURRENCY["active"] = 1
+            assert server.admit_task_memory("concurrency-a")
+            assert "concurrency-a" in server.CONCURRENCY["reservations"]
+
+            measures(headroom_mb=2000)
+            server.CONCURRENCY["active"] = 2
+            assert not server.admit_task_memory("concurrency-b"), "Réservation de la première tâche ignorée"
+            server.CONCURRENCY["reservations"]["concurrency-a"] = (1000, time.time() - server.MEMORY_RESERVATION_TTL - 1)
+            assert server.admit_task_memory("concurrency-b")
+        finally:
+            server.CONCURRENCY["active"] = active
+
+
+def test_cgroup_limits(tmp_path, settings):
+    """Quota de 2 cœurs et limite mémoire du conteneur lus dans les fichiers cgroup v2"""
+    cgroup = str(tmp_path / "cgroup")
+    os.makedirs(cgroup)
+    files = {
+        "cpu.max": "200000 100000",
+        "memory.max": str(4096 * MB),
+        "memory.current": str(3500 * MB),
+        "memory.stat": f"anon {3000 * MB}\ninactive_file {400 * MB}\n",
+    }
+    for name, content in files.items():
+        with open(os.path.join(cgroup, name), "w") as f:
+            f.write(content + "\n")
+    settings(CGROUP_ROOT=cgroup)
+    assert server.get_effective_cpu_count() <= 2
+    assert server.get_memory_limit_mb() <= 4096
+    headroom_mb = server.get_memory_headroom_mb()
+    assert headroom_mb <= 4096 - 3500 + 400
+    print(f"✅ {server.get_effective_cpu_count()} cœur(s), {headroom_mb:.0f}MB de marge")
+
+
+def test_concurrency_setting(caplog):
+    """Nombre fixe, auto (cœurs / MIN_ENGINE_THREADS) et valeur invalide remplacée par 1"""
+    assert server.parse_concurrency_setting("3", 8) == (False, 3)
+    assert server.parse_concurrency_setting("auto", 8) == (True, 8 // server.MIN_ENGINE_THREADS)
+    for value in ("2x", "0", ""):
+        assert server.parse_concurrency_setting(value, 8) == (False, 1)
+    assert "MAX_CONCURRENT_TRANSCRIPTIONS invalide" in caplog.text
+
+
+def queued(priority, audio_url="http://127.0.0.1:9/episode.mp3"):
+    """Tâche en attente; appelé dans held_queue(), aucun worker ne la prend"""
+    params = server.parse_transcription_params({"audio_url": audio_url})
+    return server.create_queued_task(params, priority, notify=False)
+
+
+def interrupted(sync=False, pid=None, started=None):
+    """Tâche arrivée il y a une minute, laissée en cours par un processus (pid, date de démarrage)"""
+    task_id = str(uuid.uuid4())
+    server.store_create_task({
+        "task_id": task_id, "status": "processing", "progress": 40, "sync": int(sync),
+        "created_at": server.datetime.now().isoformat(), "queued_at": time.time() - 60,
+        "priority": server.DEFAULT_PRIORITY, "params": {"audio_url": "http://127.0.0.1:9/episode.mp3"},
+        "worker_pid": pid, "worker_started": started,
+    })
+    return task_id
+
+
+def test_queue_position_and_eta(client, monkeypatch):
+    """Priorité puis ordre d'arrivée; ETA par vagues de CONCURRENCY["target"] tâches d'une durée moyenne"""
+    monkeypatch.setattr(server, "get_average_task_duration", lambda: 100)
+    with held_queue():
+        task_ids = [queued(5), queued(5), queued(1)]
+        try:
+            server.CONCURRENCY["target"] = 2
+            statuses = [client.get(f"/transcription-status/{task_id}").get_json() for task_id in task_ids]
+            assert [status["queue_position"] for status in statuses] == [2, 3, 1]
+            assert [status["eta_seconds"] for status in statuses] == [100, 200, 100]
+            assert all("estimated_completion" in status for status in statuses)
+
+            # Tâche sortie de la file: les suivantes avancent
+            server.delete_task(task_ids[2])
+            assert [server.get_queue_position(task_id) for task_id in task_ids] == [1, 2, None]
+            print(f"✅ Positions {[status['queue_position'] for status in statuses]}")
+        finally:
+            for task_id in task_ids:
+                server.delete_task(task_id)
+
+
+def test_restart_requeue():
+    """Processus disparu ou PID réutilisé: tâche asynchrone remise en file à sa place, synchrone en erreur"""
+    pid, started = server.get_process_identity()
+    with held_queue():
+        first = queued(5)
+        reused_pid = interrupted(pid=pid, started=started - 1)
+        sync_task = interrupted(sync=True, pid=pid, started=started - 1)
+        running = interrupted(pid=pid, started=started)
+        task_ids = [first, reused_pid, sync_task, running]
+        try:
+            assert server.requeue_interrupted_tasks() == [reused_pid]
+            task = server.get_task(reused_pid)
+            assert (task["status"], task["progress"], task["worker_pid"]) == ("pending", 0, None)
+            assert server.get_queue_position(reused_pid) == 1, "Heure d'arrivée d'origine perdue"
+            assert server.get_task(sync_task)["status"] == "error"
+            assert server.get_task(running)["status"] == "processing", "Tâche d'un processus vivant reprise"
+
+            # Arrêt gracieux de ce processus: ses tâches en cours repartent en file
+            assert server.requeue_tasks_of_worker(pid) == [running]
+            assert server.get_task(running)["status"] == "pending"
+            print("✅ Tâches interrompues remises en file")
+        finally:
+            for task_id in task_ids:
+                server.delete_task(task_id)
+
+
+def test_engine_threads(settings, monkeypatch):
+    """Moteur résident lancé avec le budget d'une transcription, relancé à l'arrêt si la concurrence monte"""
+    settings(ENGINE_SERVERS={}, ENGINE_SERVER_THREADS=0)
+    started = []
+
+    def start_engine_server(model_path):
+        # whisper-server remplacé par un processus inerte: seuls les threads demandés comptent ici
+        started.append(server.get_engine_server_threads())
+        return {"model_path": model_path, "process": subprocess.Popen(["sleep", "60"]), "threads": started[-1],
+                "in_use": 0, "last_used": time.time(), "estimated_mb": 0}
+
+    monkeypatch.setattr(server, "start_engine_server", start_engine_server)
+    monkeypatch.setattr(server, "make_room_for_model", lambda model_path: None)
+    with server.CONCURRENCY_CONDITION:
+        active = server.CONCURRENCY["active"]
+        try:
+            set_state(target=1, active=0)
+            engine = server.acquire_engine_server("ggml-base.bin")
+            server.CONCURRENCY["target"] = 4
+            assert server.acquire_engine_server("ggml-base.bin") is engine, "Moteur en cours relancé"
+            server.release_engine_server(engine)
+            server.release_engine_server(engine)
+
+            # Moteur inactif: relancé avec 16 / 4 threads, pas de nouveau chargement quand le budget s'élargit
+            engine = server.acquire_engine_server("ggml-base.bin")
+            server.release_engine_server(engine)
+            server.CONCURRENCY["target"] = 2
+            assert server.acquire_engine_server("ggml-base.bin") is engine
+            server.release_engine_server(engine)
+            assert started == [16, 4]
+        finally:
+            server.CONCURRENCY["active"] = active
+            for engine in server.ENGINE_SERVERS.values():
+                server.stop_engine(engine)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
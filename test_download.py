@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Tests du téléchargeur (parties parallèles, reprise après coupure) contre un serveur HTTP local
+qui accepte ou non les requêtes Range et peut couper les connexions en cours de route; préparation
+anticipée des tâches en attente (spool) et sa limite de taille
+"""
+
+import hashlib
+import http.server
+import os
+import re
+import sys
+import threading
+
+import pytest
+
+import server
+from conftest import held_queue, make_wav, wait_for
+
+AUDIO = os.urandom(20 * 1024 * 1024)
+RANGE_RE = re.compile(r"bytes=(\d+)-(\d*)")
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Sert AUDIO; répond 503 aux unavailable premières requêtes, coupe les drop_connections premières
+    réponses après drop_after octets"""
+    accept_ranges = True
+    drop_connections = 0
+    drop_after = 0
+    unavailable = 0
+    requests = []
+
+    def do_GET(self):
+        if StandInHandler.unavailable > 0:
+            StandInHandler.unavailable -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = 0, len(AUDIO) - 1
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if match and self.accept_ranges:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(AUDIO)}")
+        else:
+            self.send_response(200)
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end + 1 - start))
+        StandInHandler.requests.append(self.headers.get("Range"))
+        self.end_headers()
+
+        body = AUDIO[start:end + 1]
+        try:
+            if StandInHandler.drop_connections > 0:
+                StandInHandler.drop_connections -= 1
+                self.wfile.write(body[:self.drop_after])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Réponse abandonnée par le client (sonde avant les parties parallèles)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(settings):
+    settings(DOWNLOAD_RETRY_DELAY=0.01)
+
+
+def serve(accept_ranges=True, drop_connections=0, drop_after=0, unavailable=0):
+    StandInHandler.accept_ranges = accept_ranges
+    StandInHandler.drop_connections = drop_connections
+    StandInHandler.drop_after = drop_after
+    StandInHandler.unavailable = unavailable
+    StandInHandler.requests = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd, f"http://127.0.0.1:{httpd.server_address[1]}/episode.mp3"
+
+
+def download(audio_url, directory):
+    path, size, audio_hash, stats = server.download_audio(audio_url, str(directory))
+    with open(path, "rb") as f:
+        assert f.read() == AUDIO, "Contenu téléchargé différent de l'original"
+    os.unlink(path)
+    assert size == len(AUDIO)
+    assert audio_hash == hashlib.sha256(AUDIO).hexdigest()
+    return stats
+
+
+def test_parallel_ranges(tmp_path):
+    """Serveur compatible Range: parties téléchargées en parallèle"""
+    httpd, audio_url = serve()
+    try:
+        stats = download(audio_url, tmp_path)
+        assert stats["parts"] > 1, stats
+        assert len([r for r in StandInHandler.requests if r]) == stats["parts"]
+        print(f"✅ {stats['parts']} parties, {stats['throughput_mbps']} Mbit/s")
+    finally:
+        httpd.shutdown()
+
+
+def test_resume_after_drop(tmp_path):
+    """Connexions coupées: chaque partie reprend à l'octet où elle s'est arrêtée"""
+    httpd, audio_url = serve(drop_connections=3, drop_after=1024 * 1024)
+    try:
+        stats = download(audio_url, tmp_path)
+        assert stats["retries"] == 2, stats  # La première réponse, coupée, n'est pas lue (parties)
+        assert stats["transferred_bytes"] <= len(AUDIO) + 2 * 1024 * 1024, stats
+        print(f"✅ Reprise après {stats['retries']} coupures, {stats['transferred_bytes']} octets reçus")
+    finally:
+        httpd.shutdown()
+
+
+def test_without_ranges(tmp_path):
+    """Serveur sans Range: un seul flux, recommencé depuis le début après une coupure"""
+    httpd, audio_url = serve(accept_ranges=False, drop_connections=1, drop_after=5 * 1024 * 1024)
+    try:
+        stats = download(audio_url, tmp_path)
+        assert stats["parts"] == 1 and stats["retries"] == 1, stats
+        assert not any(StandInHandler.requests), StandInHandler.requests
+    finally:
+        httpd.shutdown()
+
+
+def test_open_download_retries():
+    """Requête initiale (aussi celle du mode flux) retentée après des réponses 503"""
+    httpd, audio_url = serve(unavailable=2)
+    try:
+        state = {"lock": threading.Lock(), "retries": 0}
+        response = server.open_download(audio_url, state)
+        try:
+            assert response.status_code == 200 and state["retries"] == 2, state
+        finally:
+            response.close()
+        # Au-delà de DOWNLOAD_RETRIES, l'erreur remonte
+        StandInHandler.unavailable = server.DOWNLOAD_RETRIES + 1
+        with pytest.raises(Exception, match="503"):
+            server.open_download(audio_url, {"lock": threading.Lock(), "retries": 0})
+    finally:
+        httpd.shutdown()
+
+
+def test_too_large(tmp_path, settings):
+    """Fichier annoncé au-delà de MAX_FILE_SIZE: refusé sans être téléchargé ni retenté"""
+    httpd, audio_url = serve()
+    settings(MAX_FILE_SIZE=len(AUDIO) - 1)
+    try:
+        with pytest.raises(server.FileTooLargeError):
+            server.download_audio(audio_url, str(tmp_path))
+        assert len(StandInHandler.requests) == 1
+    finally:
+        httpd.shutdown()
+
+
+def queued(audio_url="http://127.0.0.1:9/episode.mp3"):
+    """Tâche en attente; appelé dans held_queue(), aucun worker ne la prend"""
+    params = server.parse_transcription_params({"audio_url": audio_url, "vad": False})
+    return server.create_queued_task(params, server.DEFAULT_PRIORITY, notify=False)
+
+
+def spool_audio(task_id, size):
+    """Audio préparé d'avance, dans le dossier de travail de la tâche"""
+    os.makedirs(server.get_task_work_dir(task_id), exist_ok=True)
+    with open(os.path.join(server.get_task_work_dir(task_id), "audio.mp3"), "wb") as f:
+        f.write(b"\0" * size)
+
+
+def test_prefetch_reused(fake_whisper, settings, monkeypatch):
+    """Audio préparé pendant l'attente: la tâche démarre sans le retélécharger"""
+    settings(PREFETCH_AHEAD=0)
+    monkeypatch.setattr(sys.modules[__name__], "AUDIO", make_wav(30))
+    httpd, audio_url = serve()
+    try:
+        with held_queue():
+            task_id = queued(audio_url.replace(".mp3", ".wav"))
+            server.prefetch_task_audio(task_id)
+            checkpoint = server.load_checkpoint(task_id)
+            assert os.path.dirname(checkpoint["audio_path"]) == server.get_task_work_dir(task_id)
+            with open(checkpoint["audio_path"], "rb") as f:
+                assert f.read() == AUDIO
+            assert not os.path.exists(os.path.join(server.get_task_work_dir(task_id), server.PREFETCH_LOCK_NAME))
+            downloads = len(StandInHandler.requests)
+            assert server.get_task(task_id)["status"] == "pending"
+
+        task = wait_for(task_id)
+        assert task["status"] == "completed", task["result"]
+        assert len(StandInHandler.requests) == downloads, "Audio préparé retéléchargé"
+        assert not os.path.exists(server.get_task_work_dir(task_id))
+        print(f"✅ Audio préparé réutilisé ({downloads} requête(s) HTTP)")
+    finally:
+        httpd.shutdown()
+
+
+def test_spool_eviction(settings):
+    """Spool au-delà de SPOOL_MAX_BYTES: les tâches les plus loin dans la file perdent leur audio, sauf
+    préparation en cours ou audio non retéléchargeable (reprise); spool plein: plus de préparation"""
+    settings(SPOOL_MAX_BYTES=350 * 1024, PREFETCH_AHEAD=10, DOWNLOAD_RETRIES=0)
+    with held_queue():
+        task_ids = [queued() for _ in range(4)]
+        try:
+            for task_id in task_ids:
+                spool_audio(task_id, 100 * 1024)
+            server.update_task(task_ids[2], attempts=1)
+            open(os.path.join(server.get_task_work_dir(task_ids[3]), server.PREFETCH_LOCK_NAME), "w").close()
+
+            server.enforce_spool_budget()
+            assert [os.path.isdir(server.get_task_work_dir(task_id)) for task_id in task_ids] == [
+                True, False, True, True
+            ]
+
+            # Spool plein: la tâche suivante attend son tour sans être préparée
+            settings(SPOOL_MAX_BYTES=300 * 1024)
+            task_ids.append(queued())
+            server.prefetch_queue()
+            assert task_ids[-1] not in server._prefetch_submitted
+            assert not os.path.exists(server.get_task_work_dir(task_ids[-1]))
+            print("✅ Spool limité à SPOOL_MAX_BYTES")
+        finally:
+            for task_id in task_ids:
+                server.delete_task(task_id)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
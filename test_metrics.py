@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests de l'endpoint /metrics: histogrammes cumulatifs partagés par la base SQLite et jauges de la file,
+au format texte Prometheus
+"""
+
+import sys
+
+import pytest
+
+import server
+
+
+def scrape(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    samples = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_histograms(client):
+    """Observations cumulées par borne, par modèle, avec somme et nombre"""
+    before = scrape(client)
+    key = 'whisper_transcription_realtime_factor_count{model="metrics-test"}'
+    assert key not in before
+
+    server.observe_transcription(
+        {"audio_duration": 100.0, "timings": {"inference": 25.0}, "transcription": "é" * 600}, "metrics-test", "txt"
+    )
+    server.observe_transcription(
+        {"audio_duration": 100.0, "timings": {"inference": 150.0}, "transcription": ""}, "metrics-test", "txt"
+    )
+    samples = scrape(client)
+    assert samples[key] == 2
+    assert samples['whisper_transcription_realtime_factor_sum{model="metrics-test"}'] == 1.75
+    assert samples['whisper_transcription_realtime_factor_bucket{model="metrics-test",le="0.2"}'] == 0
+    assert samples['whisper_transcription_realtime_factor_bucket{model="metrics-test",le="0.3"}'] == 1
+    assert samples['whisper_transcription_realtime_factor_bucket{model="metrics-test",le="1.5"}'] == 2
+    assert samples['whisper_transcription_realtime_factor_bucket{model="metrics-test",le="+Inf"}'] == 2
+    # Taille en octets (UTF-8), pas en caractères
+    assert samples['whisper_output_bytes_bucket{format="txt",le="1024"}'] - \
+        before.get('whisper_output_bytes_bucket{format="txt",le="1024"}', 0) == 1
+    print("✅ Histogrammes cumulatifs")
+
+
+def test_queue_gauges(client):
+    """Tâches en cours comptées dans whisper_jobs (pas en attente: un worker la prendrait)"""
+    params = {"audio_url": "http://127.0.0.1:9/absent.mp3", "language": "fr", "model": "base",
+              "output_format": "txt", "word_thold": 0.005, "no_speech_thold": 0.40, "prompt": None}
+    task_id = str(server.uuid.uuid4())
+    server.store_create_task({"task_id": task_id, "status": "transcribing", "created_at": "2024-01-01T00:00:00",
+                              "queued_at": server.time.time(), "priority": 9, "params": params})
+    try:
+        assert scrape(client)['whisper_jobs{state="active"}'] >= 1
+        assert 'whisper_engine_rss_bytes{process="whisper-cli"}' in scrape(client)
+    finally:
+        server.delete_task(task_id)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
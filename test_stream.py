@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test du flux /transcription-stream: ids "<génération>:<index>", événement "reset" quand les segments sont
+remis à zéro (reprise, affinage) pendant la lecture ou entre deux connexions (Last-Event-ID)
+"""
+
+import json
+import sys
+import uuid
+
+import pytest
+
+import server
+
+
+def create_task(status="processing"):
+    task_id = str(uuid.uuid4())
+    server.store_create_task({
+        "task_id": task_id, "status": status, "progress": 0,
+        "created_at": server.datetime.now().isoformat(), "params": {},
+    })
+    return task_id
+
+
+def publish(task_id, texts):
+    server.append_task_segments(
+        task_id, [{"start": index * 5.0, "end": index * 5.0 + 5, "text": text} for index, text in enumerate(texts)]
+    )
+
+
+def parse_events(chunks):
+    """(événement, id, données) de chaque message SSE"""
+    events = []
+    for message in "".join(chunks).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if ": " in line)
+        if "event" in fields:
+            events.append((fields["event"], fields.get("id"), json.loads(fields["data"])))
+    return events
+
+
+def read_stream(client, task_id, **headers):
+    response = client.get(f"/transcription-stream/{task_id}", headers=headers)
+    return parse_events([response.get_data(as_text=True)])
+
+
+def test_reconnect_across_retry(client):
+    """Reconnexion avec Last-Event-ID d'une génération remplacée par une reprise: "reset" puis nouveaux ids"""
+    task_id = create_task("completed")
+    publish(task_id, ["un", "deux", "trois"])
+    events = read_stream(client, task_id)
+    assert [event_id for _, event_id, _ in events if event_id] == ["0:0", "0:1", "0:2"]
+
+    # Reprise: fichier de segments remplacé, plus court que la position déjà lue
+    server.reset_task_segments(task_id)
+    publish(task_id, ["nouveau"])
+    events = read_stream(client, task_id, **{"Last-Event-ID": "0:1"})
+    assert [(name, event_id) for name, event_id, _ in events] == [("reset", None), ("segment", "1:0"), ("done", None)]
+    assert events[1][2]["text"] == "nouveau"
+
+    # Même génération: reprise au segment suivant, ancien format d'id compris
+    publish(task_id, ["suite"])
+    assert [event_id for _, event_id, _ in read_stream(client, task_id, **{"Last-Event-ID": "1:0"}) if event_id] == ["1:1"]
+    assert [event_id for _, event_id, _ in read_stream(client, task_id, **{"Last-Event-ID": "0"}) if event_id] == ["1:1"]
+    print("✅ Reconnexion après reprise: reset puis segments de la nouvelle génération")
+
+
+def test_reset_while_streaming(client, settings):
+    """Segments remis à zéro pendant la lecture: "reset" puis lecture du nouveau fichier depuis le début"""
+    settings(STREAM_POLL_INTERVAL=0.01)
+    task_id = create_task()
+    publish(task_id, ["brouillon un", "brouillon deux", "brouillon trois"])
+    response = client.get(f"/transcription-stream/{task_id}", buffered=False)
+    chunks = (chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in response.response)
+    received = []
+    while len([event for event in parse_events(received) if event[0] == "segment"]) < 3:
+        received.append(next(chunks))
+
+    server.reset_task_segments(task_id)
+    server.update_task(task_id, phase="refine")
+    publish(task_id, ["affiné"])
+    server.update_task(task_id, status="completed")
+    received += list(chunks)
+    response.close()
+
+    events = parse_events(received)
+    names = [name for name, _, _ in events]
+    assert names == ["segment"] * 3 + ["reset", "segment", "done"], names
+    assert events[3][2] == {"generation": 1, "phase": "refine"}
+    assert events[4][1] == "1:0" and events[4][2]["text"] == "affiné"
+    assert events[5][2]["segments"] == 1
+    print("✅ Remise à zéro signalée pendant la lecture")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
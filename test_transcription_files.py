@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests du téléchargement des transcriptions: ETag et requêtes conditionnelles, plages d'octets, variantes
+précompressées écrites une fois et X-Accel-Redirect derrière nginx
+"""
+
+import gzip
+import os
+import sys
+
+import pytest
+
+import server
+
+SRT = "".join(
+    f"{i}\n00:00:{i:02d},000 --> 00:00:{i + 1:02d},000\nSegment numéro {i}, on parle du film.\n\n" for i in range(50)
+)
+
+
+def save(task_id, text):
+    result = {"transcription": text}
+    server.save_transcription_file(task_id, "https://example.com/episode.mp3?sig=1", "srt", result)
+    return result["transcription_file"]
+
+
+def test_conditional_and_range(client):
+    filename = save("files-a", SRT)
+    response = client.get(f"/transcriptions/{filename}")
+    assert response.status_code == 200 and response.get_data(as_text=True) == SRT
+    assert "attachment" in response.headers["Content-Disposition"]
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+    assert client.get(f"/transcriptions/{filename}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/transcriptions/{filename}", headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # Plage d'octets: toujours sur l'original, même si le client accepte gzip
+    response = client.get(f"/transcriptions/{filename}", headers={"Range": "bytes=0-9", "Accept-Encoding": "gzip"})
+    assert response.status_code == 206 and response.get_data() == SRT.encode()[:10]
+    assert "Content-Encoding" not in response.headers
+    print(f"✅ ETag {etag}, 304 et 206")
+
+
+def test_precompressed_variants(client):
+    filename = save("files-b", SRT)
+    path = os.path.join(server.OUTPUT_DIR, filename)
+    assert os.path.exists(path + ".gz")
+    assert os.path.exists(path + ".zst") == (server.zstandard is not None)
+
+    identity = client.get(f"/transcriptions/{filename}")
+    response = client.get(f"/transcriptions/{filename}", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["Content-Type"] == identity.headers["Content-Type"]
+    assert response.headers["ETag"] != identity.headers["ETag"], "Même ETag pour deux représentations"
+    assert gzip.decompress(response.get_data()).decode() == SRT
+
+    refused = client.get(f"/transcriptions/{filename}", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in refused.headers
+
+    # Trop petit pour être compressé
+    small = save("files-c", "1\n00:00:00,000 --> 00:00:01,000\nBonjour.\n")
+    assert not os.path.exists(os.path.join(server.OUTPUT_DIR, small + ".gz"))
+    print(f"✅ {os.path.getsize(path)} octets -> {os.path.getsize(path + '.gz')} en gzip")
+
+
+def test_accel_redirect(client):
+    filename = save("files-d", SRT)
+    mapping = f"{server.OUTPUT_DIR}/=/internal-transcriptions/"
+    response = client.get(f"/transcriptions/{filename}", headers={"X-Accel-Mapping": mapping})
+    assert response.status_code == 200 and response.get_data() == b""
+    assert response.headers["X-Accel-Redirect"] == f"/internal-transcriptions/{filename}"
+    assert filename in response.headers["Content-Disposition"]
+
+    # Mapping d'un autre dossier: fichier envoyé par l'API
+    response = client.get(f"/transcriptions/{filename}", headers={"X-Accel-Mapping": "/srv/=/internal/"})
+    assert "X-Accel-Redirect" not in response.headers and response.get_data(as_text=True) == SRT
+
+    assert client.get("/transcriptions/..").status_code == 404
+    assert client.get("/transcriptions/absent.srt").status_code == 404
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test de la transcription en deux passes: brouillon avec un petit modèle visible dans le statut, puis
+affinage par le modèle demandé qui le remplace, sur un fichier téléversé (audio gardé entre les passes)
+"""
+
+import os
+import sys
+
+import pytest
+
+import server
+from conftest import upload_wav, wait_for
+
+
+def test_draft_then_refine(fake_whisper, client, monkeypatch):
+    """Brouillon tiny (profil rapide) puis passe base, audio téléversé réutilisé, les deux visibles"""
+    # Statut de la tâche à chaque enregistrement de sa durée (base de l'ETA)
+    recorded = []
+    update_task = server.update_task
+
+    def recording_update_task(task_id, **fields):
+        if "duration" in fields:
+            recorded.append(server.get_task(task_id)["status"])
+        update_task(task_id, **fields)
+
+    monkeypatch.setattr(server, "update_task", recording_update_task)
+    params = server.parse_upload_params({"output_format": "srt", "draft": "tiny"}, "episode.wav")
+    task_id = server.create_queued_task(params, server.DEFAULT_PRIORITY, audio=upload_wav(30))
+    task = wait_for(task_id)
+    assert task["status"] == "completed", task.get("result")
+    assert recorded == ["completed"], f"Durée enregistrée pour le brouillon: {recorded}"
+    assert server.get_segments_generation(task_id) == 1, "Segments du brouillon non remis à zéro"
+
+    status = client.get(f"/transcription-status/{task_id}").get_json()
+    assert status["phase"] == "refine"
+    assert status["draft"]["model"] == "whisper-tiny-fr" and status["draft"]["quality"] == "fast-preview"
+    assert status["result"]["model"] == "whisper-base-fr"
+    assert status["draft"]["transcription_file"] != status["result"]["transcription_file"]
+    for name in (status["draft"]["transcription_file"], status["result"]["transcription_file"]):
+        assert open(os.path.join(server.OUTPUT_DIR, name)).read().count("-->") == 6
+
+    calls = open(fake_whisper).read().splitlines()
+    assert len(calls) == 2 and "ggml-tiny.bin" in calls[0] and "ggml-base.bin" in calls[1], calls
+    assert "-bs 1" in calls[0] and "-bs" not in calls[1], "Affinage avec le profil par défaut"
+    assert "--offset-t" not in calls[1], "Affinage repris à la fin du brouillon"
+    assert not os.path.exists(server.get_task_work_dir(task_id)), "Dossier de travail non supprimé"
+    print(f"✅ Brouillon {status['draft']['model']} puis {status['result']['model']}")
+
+
+def test_draft_resolution():
+    assert server.resolve_draft_model(None, "large-v3") is None
+    assert server.resolve_draft_model("false", "large-v3") is None
+    assert server.resolve_draft_model(True, "large-v3") == server.DEFAULT_DRAFT_MODEL
+    assert server.resolve_draft_model("tiny", "large-v3") == "tiny"
+    assert server.resolve_draft_model("base", "base") is None, "Brouillon inutile avec le même modèle"
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests du téléversement direct (/transcribe/file): formulaire multipart et corps brut écrits dans le
+spool pendant la réception, limite MAX_FILE_SIZE, puis transcription par le faux whisper-cli
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+import server
+from conftest import make_wav
+
+
+@pytest.fixture(autouse=True)
+def engine(fake_whisper, settings):
+    """Faux whisper-cli; cache actif pour test_raw_upload_and_cache"""
+    settings(CACHE_MAX_BYTES=64 * 1024 * 1024)
+    return fake_whisper
+
+
+def spooled_files():
+    return os.listdir(server.UPLOAD_DIR) if os.path.exists(server.UPLOAD_DIR) else []
+
+
+def test_multipart_upload(client):
+    """Formulaire multipart: transcription identique à celle d'une URL, spool vidé ensuite"""
+    response = client.post(
+        "/transcribe/file",
+        data={"audio_file": (io.BytesIO(make_wav(30)), "episode 12.wav"), "language": "fr", "output_format": "srt"},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200, response.get_json()
+    result = response.get_json()
+    assert result["transcription"].count("-->") == 6, result["transcription"]
+    assert not spooled_files() and not os.listdir(server.WORK_DIR)
+    # Réponse lue depuis le rendu sur disque, supprimé une fois envoyée (fermeture par le serveur WSGI)
+    response.close()
+    assert not [name for name in os.listdir(server.STATE_DIR) if name.startswith("transcription_")]
+    print(f"✅ Multipart: {result['transcription'].count('-->')} segments")
+
+
+def test_raw_upload_and_cache(client):
+    """Corps brut, paramètres dans l'URL; le même audio renvoyé est servi par le cache"""
+    body = make_wav(20)
+    response = client.post("/transcribe/file?filename=brut.wav&output_format=txt&vad=false", data=body,
+                           content_type="audio/wav")
+    assert response.status_code == 200, response.get_json()
+    result = response.get_json()
+    assert "Segment numéro 3" in result["transcription"]
+    assert {"download", "preprocess", "model_load", "first_segment", "inference", "finalize"} <= set(result["timings"])
+    assert "profile" not in result
+
+    hits = server.get_cache_stats()["hits"]
+    response = client.post("/transcribe/file?filename=copie.wav&output_format=txt&vad=false", data=body,
+                           content_type="audio/wav")
+    assert response.status_code == 200
+    assert server.get_cache_stats()["hits"] == hits + 1
+    assert not spooled_files()
+
+
+def test_silent_audio(client, engine, monkeypatch):
+    """Aucun segment (silence, musique): transcription vide au premier essai, pas d'erreur"""
+    monkeypatch.setenv("FAKE_WHISPER_DURATION", "0")
+    response = client.post("/transcribe/file?filename=silence.wav&output_format=srt", data=make_wav(10),
+                           content_type="audio/wav")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.get_json()["transcription"] == ""
+    response.close()
+    assert len(open(engine).read().splitlines()) == 1, "whisper-cli relancé pour rien"
+
+
+def test_profile(client):
+    """profile=true: résumé cProfile dans le résultat, rapport complet tant que la tâche existe"""
+    response = client.post("/transcribe/file?filename=profil.wav&output_format=vtt&profile=true", data=make_wav(10),
+                           content_type="audio/wav")
+    assert response.status_code == 200, response.get_json()
+    profile = response.get_json()["profile"]
+    assert profile["top"] and profile["url"].startswith("/transcription-profile/")
+    assert any("run_whisper_pipeline" in entry["function"] for entry in profile["top"])
+    # Tâche synchrone supprimée après la réponse: son profil aussi
+    assert client.get(profile["url"]).status_code == 404
+
+
+def test_profile_unavailable(client, monkeypatch):
+    """Profileur déjà pris (Python 3.12+, autre tâche profilée): transcription sans profil, pas d'erreur"""
+    class BusyProfile(server.cProfile.Profile):
+        def enable(self, *args, **kwargs):
+            raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(server.cProfile, "Profile", BusyProfile)
+    response = client.post("/transcribe/file?filename=profil.wav&output_format=txt&profile=true", data=make_wav(10),
+                           content_type="audio/wav")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    result = response.get_json()
+    response.close()
+    assert "Segment numéro 1" in result["transcription"] and "profile" not in result
+
+
+def test_quality_profile(client, engine):
+    """quality et decoding: options passées à whisper-cli, rappelées dans le résultat, valeurs invalides refusées"""
+    response = client.post(
+        "/transcribe/file",
+        data={"audio_file": (io.BytesIO(make_wav(10)), "apercu.wav"), "quality": "fast-preview",
+              "decoding": '{"best_of": 2}'},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200, response.get_json()
+    result = response.get_json()
+    assert result["quality"] == "fast-preview" and result["decoding"]["best_of"] == 2
+    args = open(engine).read().split()
+    for flag, value in (("-bs", "1"), ("-bo", "2"), ("-p", "2"), ("-tpi", "0.0"), ("-mc", "0")):
+        assert args[args.index(flag) + 1] == value, (flag, args)
+    assert "-fa" in args and "-t" in args
+
+    # Profil par défaut: ligne de commande de whisper-cli inchangée
+    default_cmd = server.build_whisper_cmd("/opt/whisper.cpp", "m.bin", "a.wav", "fr", "txt",
+                                           decoding=server.resolve_decoding_options())
+    assert not {"-bs", "-bo", "-p", "-fa"} & set(default_cmd), default_cmd
+
+    # Les options qui changent le texte font partie de la clé de cache, pas les threads
+    params = {"model": "base", "language": "fr", "quality": "archival"}
+    assert server.build_cache_key("0" * 64, params) != server.build_cache_key("0" * 64, dict(params, quality=None))
+    assert server.build_cache_key("0" * 64, params) == server.build_cache_key(
+        "0" * 64, dict(params, decoding={"threads": 3}))
+
+    for query in ("quality=ultra", "decoding=%7B%22beam_size%22%3A0%7D", "decoding=%7B%22speed%22%3A1%7D"):
+        response = client.post(f"/transcribe/file?{query}", data=make_wav(1), content_type="audio/wav")
+        assert response.status_code == 400, query
+    assert not spooled_files()
+
+
+def test_too_large(client, settings):
+    """Au-delà de MAX_FILE_SIZE: 413, avant réception si la taille est annoncée, sinon en cours d'écriture"""
+    settings(MAX_FILE_SIZE=100 * 1024)
+    response = client.post("/transcribe/file", data=make_wav(10), content_type="audio/wav")
+    assert response.status_code == 413, response.status_code
+
+    # Sans Content-Length fiable (corps multipart dont le fichier dépasse seul la limite)
+    settings(MAX_FILE_SIZE=200 * 1024)
+    response = client.post(
+        "/transcribe/file",
+        data={"audio_file": (io.BytesIO(make_wav(8)), "long.wav")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 413, response.status_code
+    assert not spooled_files()
+
+
+def test_missing_file(client):
+    response = client.post("/transcribe/file", data={"language": "fr"}, content_type="multipart/form-data")
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-s"]))